@@ -0,0 +1,232 @@
+import os
+import json
+import time
+from datetime import datetime, timedelta
+
+from metricas import agenda_corridas
+
+# ==========================
+#   AGENDA PERSISTENTE
+# ==========================
+#
+# Jobs de calendario (warm-up diario, descuento del día 1) encima del
+# job_queue de PTB. run_daily no guarda nada: si el bot se reinicia a las
+# 00:01 del día 1 el descuento de ese mes no sale nunca, y si hay dos
+# procesos con jobs sale dos veces. Acá cada turno es un archivo en
+# AGENDA_DIR/<job>/ creado con O_EXCL: el que lo crea corre el turno, el
+# resto lo saltea. Al arrancar se recupera lo que quedó sin correr dentro
+# de la gracia del job, de a uno y escalonado.
+#
+# Es "como mucho una vez": el turno se anota antes de correr. Lo que
+# manden los jobs va por Difusion, que ya retoma un envío cortado.
+
+# Nombre del archivo de cada turno; ordena igual que las fechas
+FORMATO_CLAVE = "%Y%m%dT%H%M"
+
+
+class Diario:
+    def __init__(self, hora: int = 0, minuto: int = 0):
+        self.hora = hora
+        self.minuto = minuto
+
+    def anterior(self, ahora: datetime) -> datetime:
+        """El último turno que ya empezó (<= ahora)."""
+        t = ahora.replace(hour=self.hora, minute=self.minuto, second=0, microsecond=0)
+        return t if t <= ahora else t - timedelta(days=1)
+
+    def siguiente(self, ahora: datetime) -> datetime:
+        """El primer turno que todavía no empezó (> ahora)."""
+        return self.anterior(ahora) + timedelta(days=1)
+
+
+class Mensual:
+    def __init__(self, dia: int = 1, hora: int = 0, minuto: int = 0):
+        if not 1 <= dia <= 28:
+            raise ValueError("el día tiene que estar entre 1 y 28 (los que tienen todos los meses)")
+        self.dia = dia
+        self.hora = hora
+        self.minuto = minuto
+
+    def _en(self, anio, mes):
+        return datetime(anio, mes, self.dia, self.hora, self.minuto)
+
+    def anterior(self, ahora: datetime) -> datetime:
+        t = self._en(ahora.year, ahora.month)
+        if t > ahora:
+            t = self._en(ahora.year, ahora.month - 1) if ahora.month > 1 else self._en(ahora.year - 1, 12)
+        return t
+
+    def siguiente(self, ahora: datetime) -> datetime:
+        t = self.anterior(ahora)
+        return self._en(t.year, t.month + 1) if t.month < 12 else self._en(t.year + 1, 1)
+
+
+class Agenda:
+    """
+    Registro de jobs con estado en disco. `agregar` los declara e
+    `instalar` los programa en un job_queue: recupera lo atrasado y deja
+    armado el próximo período. Un job con `tandas` > 1 se parte en turnos
+    repartidos en `ventana` segundos; cada tanda se anota por separado, así
+    un reinicio en medio del envío sigue desde la que faltaba.
+    """
+
+    def __init__(self, directorio, escalon: float = 60.0, primero: float = 15.0, retencion_dias: int = 40, reloj=datetime.now):
+        self.directorio = directorio
+        # Lo atrasado arranca a los `primero` segundos, uno cada `escalon`
+        self.escalon = escalon
+        self.primero = primero
+        self.retencion = timedelta(days=retencion_dias)
+        self.reloj = reloj
+        self.trabajos = {}
+
+    def agregar(self, nombre, callback, cuando, gracia: float, tandas: int = 1, ventana: float = 0.0, data=None):
+        """
+        Declara (o reemplaza) un job. `cuando` es un Diario o un Mensual;
+        `gracia` es cuántos segundos tarde todavía vale la pena correr un
+        turno perdido. El callback recibe el context de PTB con
+        context.job.data = {"base", "tanda", "tandas", ...data}.
+        """
+        self.trabajos[nombre] = {
+            "callback": callback,
+            "cuando": cuando,
+            "gracia": gracia,
+            "tandas": max(1, tandas),
+            "ventana": ventana,
+            "data": data or {},
+        }
+
+    def turnos(self, nombre, base: datetime):
+        """[(clave, hora, tanda)] del período que empieza en `base`."""
+        t = self.trabajos[nombre]
+        paso = t["ventana"] / t["tandas"]
+        res = []
+        for i in range(t["tandas"]):
+            clave = base.strftime(FORMATO_CLAVE)
+            if t["tandas"] > 1:
+                clave += f".{i:02d}"
+            res.append((clave, base + timedelta(seconds=i * paso), i))
+        return res
+
+    # --- estado en disco ---
+
+    def _carpeta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def corrido(self, nombre, clave) -> bool:
+        return os.path.exists(os.path.join(self._carpeta(nombre), clave))
+
+    def reclamar(self, nombre, clave, base: datetime, tanda: int = 0) -> bool:
+        """
+        Anota el turno si nadie lo anotó antes. O_EXCL es atómico también
+        entre procesos: de dos workers que llegan juntos gana uno solo.
+        """
+        carpeta = self._carpeta(nombre)
+        os.makedirs(carpeta, exist_ok=True)
+        try:
+            fd = os.open(os.path.join(carpeta, clave), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"base": base.isoformat(), "tanda": tanda, "inicio": time.time(), "pid": os.getpid()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._purgar(carpeta)
+        return True
+
+    def ultima(self, nombre):
+        """El turno más reciente que se anotó ({"base", "tanda", "inicio", "pid"}) o None."""
+        try:
+            claves = sorted(os.listdir(self._carpeta(nombre)))
+        except FileNotFoundError:
+            return None
+        if not claves:
+            return None
+        path = os.path.join(self._carpeta(nombre), claves[-1])
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Un corte justo después de crearlo lo deja vacío: vale la hora del archivo
+            return {"base": None, "tanda": 0, "inicio": os.path.getmtime(path), "pid": None}
+
+    def _purgar(self, carpeta):
+        limite = (self.reloj() - self.retencion).strftime(FORMATO_CLAVE)
+        for clave in os.listdir(carpeta):
+            if clave < limite:
+                try:
+                    os.remove(os.path.join(carpeta, clave))
+                except OSError:
+                    pass
+
+    # --- job_queue ---
+
+    def instalar(self, job_queue) -> int:
+        """
+        Programa todos los jobs. Lo que tocaba en el período actual y no
+        se anotó se corre ahora si está dentro de la gracia (en el orden en
+        que tocaba, escalonado); lo que queda del período y el período
+        siguiente se programan a su hora. Devuelve cuántos turnos recupera.
+        """
+        ahora = self.reloj()
+        atrasados = []
+        for nombre, t in self.trabajos.items():
+            base = t["cuando"].anterior(ahora)
+            vencidos = 0
+            for clave, hora, tanda in self.turnos(nombre, base):
+                if hora > ahora:
+                    self._programar(job_queue, nombre, clave, base, tanda, hora.astimezone())
+                elif self.corrido(nombre, clave):
+                    continue
+                elif (ahora - hora).total_seconds() <= t["gracia"]:
+                    atrasados.append((hora, nombre, clave, base, tanda))
+                else:
+                    vencidos += 1
+            if vencidos:
+                agenda_corridas.sumar(nombre, "vencido", n=vencidos)
+                print(f"⏰ {nombre}: {vencidos} turno(s) del {base:%d/%m %H:%M} pasaron la gracia, no se recuperan")
+            self._armar(job_queue, nombre, t["cuando"].siguiente(ahora))
+
+        atrasados.sort()
+        for k, (hora, nombre, clave, base, tanda) in enumerate(atrasados):
+            espera = self.primero + k * self.escalon
+            print(f"⏰ {nombre} {clave} no corrió (tocaba {hora:%d/%m %H:%M}), se recupera en {espera:.0f}s")
+            self._programar(job_queue, nombre, clave, base, tanda, espera)
+        return len(atrasados)
+
+    def _programar(self, job_queue, nombre, clave, base, tanda, when):
+        t = self.trabajos[nombre]
+        data = dict(t["data"], nombre=nombre, clave=clave, base=base, tanda=tanda, tandas=t["tandas"])
+        job_queue.run_once(self._correr, when=when, data=data, name=f"agenda:{nombre}:{clave}")
+
+    def _armar(self, job_queue, nombre, base):
+        # Horas con zona (la local): un run_once a un mes no se corre con el cambio de horario
+        for clave, hora, tanda in self.turnos(nombre, base):
+            self._programar(job_queue, nombre, clave, base, tanda, hora.astimezone())
+        job_queue.run_once(
+            self._rearmar, when=base.astimezone(), data={"nombre": nombre, "base": base}, name=f"agenda:{nombre}:siguiente"
+        )
+
+    async def _rearmar(self, context):
+        d = context.job.data
+        t = self.trabajos.get(d["nombre"])
+        if t is not None:
+            self._armar(context.job_queue, d["nombre"], t["cuando"].siguiente(d["base"]))
+
+    async def _correr(self, context):
+        d = context.job.data
+        nombre, clave = d["nombre"], d["clave"]
+        t = self.trabajos.get(nombre)
+        if t is None:
+            return
+        if not self.reclamar(nombre, clave, d["base"], d["tanda"]):
+            print(f"⏰ {nombre} {clave} ya corrió (antes de un reinicio u otro proceso), se saltea")
+            agenda_corridas.sumar(nombre, "duplicado")
+            return
+        try:
+            await t["callback"](context)
+        except Exception as e:
+            # Queda anotado igual: reintentar podría mandar dos veces lo mismo
+            print(f"⚠️ {nombre} {clave} falló: {e}")
+            agenda_corridas.sumar(nombre, "error")
+        else:
+            agenda_corridas.sumar(nombre, "ok")
@@ -0,0 +1,951 @@
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import threading
+import argparse
+from contextlib import contextmanager
+
+from metricas import archivo_segundos
+
+try:
+    import msgpack
+except ImportError:  # opcional: sin msgpack se usa JSON compacto
+    msgpack = None
+
+# "json" (compacto, sin indentar) o "msgpack" (si está instalado)
+FORMATO_SNAPSHOT = os.getenv("SNAPSHOT_FORMAT", "json")
+
+# Cabecera de los snapshots nuevos: "#fcs1 <formato> <crc32>\n" + contenido.
+# Los archivos viejos (JSON puro, sin cabecera) se siguen leyendo igual.
+MAGIC = b"#fcs1 "
+
+# ==========================
+#   HELPERS JSON
+# ==========================
+
+
+class SnapshotCorrupto(Exception):
+    pass
+
+
+def _decodificar(raw: bytes):
+    if not raw.startswith(MAGIC):
+        return json.loads(raw.decode("utf-8"))
+
+    fin = raw.index(b"\n")
+    formato, crc = raw[len(MAGIC):fin].decode("ascii").split()
+    payload = raw[fin + 1:]
+    if zlib.crc32(payload) != int(crc, 16):
+        raise SnapshotCorrupto("checksum inválido")
+
+    if formato == "msgpack":
+        if msgpack is None:
+            raise SnapshotCorrupto("snapshot en msgpack pero msgpack no está instalado")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    return json.loads(payload.decode("utf-8"))
+
+
+def _codificar(data, formato):
+    if formato == "msgpack" and msgpack is not None:
+        return "msgpack", msgpack.packb(data, use_bin_type=True)
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return "json", payload
+
+
+# Los archivos de cada worker llevan ".w<N>" (ia_cache.w2.json)
+_SUFIJO_WORKER = re.compile(r"\.w\d+(?=\.json$)")
+
+
+def _etiqueta_archivo(path) -> str:
+    """
+    Valor de la etiqueta "archivo" en bot_archivo_segundos. Tiene que salir
+    de un conjunto fijo: un archivo por worker sería una serie nueva cada
+    vez (los checkpoints de Difusion, uno por envío, pasan "difusion").
+    """
+    return _SUFIJO_WORKER.sub("", os.path.basename(path))
+
+
+def cargar_json(path, default, etiqueta=None):
+    t0 = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            return _decodificar(f.read())
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        # Snapshot dañado: probar con el anterior antes de rendirse
+        print(f"⚠️ No se pudo leer {path} ({e}), probando {path}.bak")
+        try:
+            with open(path + ".bak", "rb") as f:
+                return _decodificar(f.read())
+        except Exception:
+            return default
+    finally:
+        archivo_segundos.observar(time.perf_counter() - t0, "cargar", etiqueta or _etiqueta_archivo(path))
+
+
+def guardar_json(path, data, formato=None, etiqueta=None):
+    """
+    Escribe a un temporal, fsync y rename atómico: un crash deja el archivo
+    viejo o el nuevo, nunca uno cortado. La versión anterior queda en .bak.
+    `etiqueta` agrupa el archivo en las métricas (default: su nombre).
+    """
+    t0 = time.perf_counter()
+    try:
+        _guardar_json(path, data, formato)
+    finally:
+        archivo_segundos.observar(time.perf_counter() - t0, "guardar", etiqueta or _etiqueta_archivo(path))
+
+
+def _guardar_json(path, data, formato):
+    formato, payload = _codificar(data, formato or FORMATO_SNAPSHOT)
+    cabecera = MAGIC + f"{formato} {zlib.crc32(payload):08x}\n".encode("ascii")
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(cabecera)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if os.path.exists(path):
+        try:
+            if os.path.exists(path + ".bak"):
+                os.remove(path + ".bak")
+            os.link(path, path + ".bak")
+        except OSError:
+            pass  # sin hard links (algunos FS): seguimos sin backup
+
+    os.replace(tmp, path)
+
+    # Que el rename también sobreviva a un corte de luz (no existe en Windows)
+    try:
+        directorio = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directorio)
+    finally:
+        os.close(directorio)
+
+
+def _ref_vacio():
+    return {"ref_by": None, "referred": [], "premios": []}
+
+
+# ==========================
+#   BACKEND JSON (el de siempre)
+# ==========================
+
+
+class AlmacenJSON:
+    """
+    Un archivo .json por colección. Cada cambio lee y reescribe el archivo
+    entero, igual que antes; sirve como default y como referencia.
+    Las transacciones van por un diario aparte (transaccion.journal).
+    """
+
+    def __init__(self, premium_file, users_file, xp_file, ref_file):
+        self.premium_file = premium_file
+        self.users_file = users_file
+        # Altas nuevas: una línea por usuario, se compacta al .json cada tanto
+        self.users_log = os.path.splitext(users_file)[0] + ".log"
+        self.xp_file = xp_file
+        self.ref_file = ref_file
+        # Diario de la transacción en curso (ver transaccion())
+        self.journal = os.path.join(os.path.dirname(os.path.abspath(ref_file)), "transaccion.journal")
+        self._pendientes = None
+        self._recuperar_journal()
+
+    @contextmanager
+    def transaccion(self):
+        """
+        Redo log: adentro de la transacción las escrituras quedan en memoria
+        (y las lecturas las ven). Al salir se escribe un diario con todas
+        juntas, se aplican archivo por archivo y se borra el diario. Si el
+        proceso se corta a mitad, el próximo arranque vuelve a aplicar el
+        diario: nunca queda un archivo escrito y el otro no. Una excepción
+        adentro descarta todo (rollback).
+        """
+        if self._pendientes is not None:
+            yield  # anidada: la de afuera confirma
+            return
+        self._pendientes = {}
+        try:
+            yield
+            pendientes = self._pendientes
+        finally:
+            self._pendientes = None
+        if pendientes:
+            guardar_json(self.journal, pendientes)
+            self._aplicar(pendientes)
+
+    def _aplicar(self, pendientes):
+        for path, data in pendientes.items():
+            guardar_json(path, data)
+        for path in (self.journal, self.journal + ".bak"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _recuperar_journal(self):
+        pendientes = cargar_json(self.journal, None)
+        if pendientes:
+            print(f"⚠️ Transacción a medias en {self.journal}: se vuelve a aplicar")
+            self._aplicar(pendientes)
+
+    def _leer(self, path, default):
+        if self._pendientes is not None and path in self._pendientes:
+            return self._pendientes[path]
+        return cargar_json(path, default)
+
+    def _escribir(self, path, data):
+        if self._pendientes is not None:
+            self._pendientes[path] = data
+        else:
+            guardar_json(path, data)
+
+    # --- usuarios ---
+
+    def _leer_log_usuarios(self):
+        try:
+            with open(self.users_log, "r", encoding="utf-8") as f:
+                lineas = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        ids = []
+        for linea in lineas:
+            # Una línea cortada por un crash se ignora
+            try:
+                ids.append(int(linea))
+            except ValueError:
+                continue
+        return ids
+
+    def cargar_usuarios(self):
+        usuarios = cargar_json(self.users_file, [])
+        vistos = set(usuarios)
+        for uid in self._leer_log_usuarios():
+            if uid not in vistos:
+                vistos.add(uid)
+                usuarios.append(uid)
+        return usuarios
+
+    def guardar_usuarios(self, lista):
+        guardar_json(self.users_file, lista)
+        # El .json ya contiene todo: el log queda vacío
+        open(self.users_log, "w", encoding="utf-8").close()
+
+    def agregar_usuario(self, user_id: int) -> bool:
+        """
+        Agrega una línea al log sin leer nada. El que llama (RegistroUsuarios)
+        ya sabe que el usuario es nuevo; duplicados se descartan al cargar.
+        """
+        with open(self.users_log, "a", encoding="utf-8") as f:
+            f.write(f"{user_id}\n")
+        return True
+
+    def compactar_usuarios(self):
+        self.guardar_usuarios(self.cargar_usuarios())
+
+    # --- xp ---
+
+    def cargar_xp(self):
+        return self._leer(self.xp_file, {})
+
+    def guardar_xp(self, data):
+        self._escribir(self.xp_file, data)
+
+    def get_xp(self, user_id: int) -> int:
+        return self.cargar_xp().get(str(user_id), 0)
+
+    def sumar_xp(self, user_id: int, amount: int) -> int:
+        data = self.cargar_xp()
+        uid = str(user_id)
+        data[uid] = data.get(uid, 0) + amount
+        self.guardar_xp(data)
+        return data[uid]
+
+    def sumar_xp_lote(self, deltas: dict):
+        """deltas: {user_id: xp_a_sumar}, una sola lectura y escritura."""
+        data = self.cargar_xp()
+        for user_id, amount in deltas.items():
+            uid = str(user_id)
+            data[uid] = data.get(uid, 0) + amount
+        self.guardar_xp(data)
+
+    # --- premium ---
+
+    def cargar_premium(self):
+        return self._leer(self.premium_file, {})
+
+    def guardar_premium(self, data):
+        self._escribir(self.premium_file, data)
+
+    def get_premium(self, user_id: int):
+        return self.cargar_premium().get(str(user_id))
+
+    def set_premium(self, user_id: int, entry):
+        data = self.cargar_premium()
+        data[str(user_id)] = entry
+        self.guardar_premium(data)
+
+    # --- referidos ---
+
+    def cargar_ref(self):
+        return self._leer(self.ref_file, {})
+
+    def guardar_ref(self, data):
+        self._escribir(self.ref_file, data)
+
+    def get_ref(self, user_id):
+        return self.cargar_ref().get(str(user_id))
+
+    def set_refs(self, cambios: dict):
+        """cambios: {uid_str: info} a guardar de una sola vez."""
+        refs = self.cargar_ref()
+        refs.update(cambios)
+        self.guardar_ref(refs)
+
+    def cerrar(self):
+        pass
+
+
+# ==========================
+#   BACKEND SQLITE (WAL)
+# ==========================
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    user_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS xp (
+    user_id INTEGER PRIMARY KEY,
+    xp      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_xp_xp ON xp (xp);
+CREATE TABLE IF NOT EXISTS premium (
+    user_id  INTEGER PRIMARY KEY,
+    plan     TEXT,
+    lifetime INTEGER NOT NULL DEFAULT 0,
+    exp      TEXT,
+    legacy   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_premium_exp ON premium (exp);
+CREATE TABLE IF NOT EXISTS referidos (
+    user_id INTEGER PRIMARY KEY,
+    ref_by  INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_referidos_ref_by ON referidos (ref_by);
+CREATE TABLE IF NOT EXISTS premios_ref (
+    referrer INTEGER NOT NULL,
+    referido INTEGER NOT NULL,
+    PRIMARY KEY (referrer, referido)
+);
+CREATE TABLE IF NOT EXISTS entregas (
+    user_id INTEGER PRIMARY KEY,
+    motivo  TEXT NOT NULL,
+    desde   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contadores_entregas (
+    nombre TEXT PRIMARY KEY,
+    n      INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cambios (
+    n       INTEGER PRIMARY KEY AUTOINCREMENT,
+    area    TEXT NOT NULL,
+    user_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versiones (
+    area TEXT PRIMARY KEY,
+    n    INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Cada escritura a una tabla suma 1 a la versión de su área (con triggers,
+# así cuenta cualquier proceso y cualquier método). Con varios workers
+# (trabajadores.py) cada uno mira estas versiones para saber qué recargar.
+AREAS_VERSIONADAS = {
+    "premium": ("premium",),
+    "referidos": ("referidos", "premios_ref"),
+    "entregas": ("entregas", "contadores_entregas"),
+}
+
+
+def _esquema_versiones():
+    sql = []
+    for area, tablas in AREAS_VERSIONADAS.items():
+        sql.append(f"INSERT OR IGNORE INTO versiones (area, n) VALUES ('{area}', 0);")
+        for tabla in tablas:
+            for evento in ("INSERT", "UPDATE", "DELETE"):
+                sql.append(
+                    f"CREATE TRIGGER IF NOT EXISTS v_{tabla}_{evento.lower()} "
+                    f"AFTER {evento} ON {tabla} BEGIN "
+                    f"UPDATE versiones SET n = n + 1 WHERE area = '{area}'; END;"
+                )
+    return "\n".join(sql)
+
+
+# Usuarios y XP son tablas de un millón de filas que cambian todo el tiempo:
+# en vez de una versión, cada fila escrita deja su user_id en `cambios` y
+# los workers aplican sólo lo nuevo (ver cambios_desde)
+TABLAS_CON_CAMBIOS = ("usuarios", "xp")
+
+
+def _esquema_cambios():
+    sql = []
+    for tabla in TABLAS_CON_CAMBIOS:
+        for evento, fila in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            sql.append(
+                f"CREATE TRIGGER IF NOT EXISTS c_{tabla}_{evento.lower()} "
+                f"AFTER {evento} ON {tabla} BEGIN "
+                f"INSERT INTO cambios (area, user_id) VALUES ('{tabla}', {fila}.user_id); END;"
+            )
+    return "\n".join(sql)
+
+
+def _fila_a_entry(plan, lifetime, exp, legacy):
+    # Formato viejo: el valor era directamente la fecha
+    if legacy:
+        return exp
+    return {"lifetime": bool(lifetime), "exp": exp, "plan": plan}
+
+
+def _entry_a_fila(entry):
+    if isinstance(entry, str):
+        return (None, 0, entry, 1)
+    return (
+        entry.get("plan"),
+        1 if entry.get("lifetime") else 0,
+        entry.get("exp"),
+        0,
+    )
+
+
+class AlmacenSQLite:
+    """
+    Una sola base SQLite en modo WAL. Cada operación toca una fila por
+    índice, así que el costo por mensaje no depende de la cantidad de usuarios.
+    Los cargar_*/guardar_* siguen existiendo para los comandos de admin.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(ESQUEMA)
+        self._conn.executescript(_esquema_versiones())
+        self._conn.executescript(_esquema_cambios())
+        self._en_tx = 0
+
+    @contextmanager
+    def transaccion(self):
+        """Agrupa varias operaciones en un único commit (anidable)."""
+        with self._lock:
+            if self._en_tx == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._en_tx += 1
+            try:
+                yield
+            except BaseException:
+                self._en_tx -= 1
+                if self._en_tx == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._en_tx -= 1
+                if self._en_tx == 0:
+                    self._conn.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # --- cambios de otros procesos ---
+
+    def data_version(self) -> int:
+        """Cambia cuando otra conexión hizo commit (las propias no cuentan)."""
+        return self._query("PRAGMA data_version")[0][0]
+
+    def versiones(self) -> dict:
+        """{área: número de escrituras}, ver AREAS_VERSIONADAS."""
+        return dict(self._query("SELECT area, n FROM versiones"))
+
+    def ultimo_cambio(self) -> int:
+        return self._query("SELECT COALESCE(MAX(n), 0) FROM cambios")[0][0]
+
+    def cambios_desde(self, desde: int, limite: int = 50_000):
+        """
+        Lo que se escribió en TABLAS_CON_CAMBIOS después del cambio `desde`:
+        (último, {"usuarios": {uid: está}, "xp": {uid: xp o None}}), con el
+        valor actual de cada fila tocada. None si son más de `limite` o si
+        ya se purgaron (hay que recargar todo).
+        """
+        with self._lock:
+            # Una sola lectura, así `ultimo` y los valores son del mismo momento
+            propia = not self._en_tx
+            if propia:
+                self._conn.execute("BEGIN")
+            try:
+                primero, ultimo, cuantos = self._conn.execute(
+                    "SELECT MIN(n), MAX(n), COUNT(*) FROM cambios WHERE n > ?", (desde,)
+                ).fetchone()
+                if not cuantos:
+                    return desde, {}
+                purgado = self._conn.execute("SELECT MIN(n) FROM cambios").fetchone()[0]
+                if cuantos > limite or purgado > desde + 1:
+                    return None
+                usuarios = self._conn.execute(
+                    "SELECT c.user_id, u.user_id IS NOT NULL FROM "
+                    "(SELECT DISTINCT user_id FROM cambios WHERE area = 'usuarios' AND n BETWEEN ? AND ?) c "
+                    "LEFT JOIN usuarios u ON u.user_id = c.user_id",
+                    (primero, ultimo),
+                ).fetchall()
+                xp = self._conn.execute(
+                    "SELECT c.user_id, x.xp FROM "
+                    "(SELECT DISTINCT user_id FROM cambios WHERE area = 'xp' AND n BETWEEN ? AND ?) c "
+                    "LEFT JOIN xp x ON x.user_id = c.user_id",
+                    (primero, ultimo),
+                ).fetchall()
+            finally:
+                if propia:
+                    self._conn.execute("COMMIT")
+        return ultimo, {"usuarios": {u: bool(e) for u, e in usuarios}, "xp": dict(xp)}
+
+    def purgar_cambios(self, conservar: int = 200_000):
+        """Deja los últimos `conservar`; un worker más atrasado recarga todo."""
+        with self.transaccion():
+            self._conn.execute(
+                "DELETE FROM cambios WHERE n <= (SELECT MAX(n) FROM cambios) - ?", (conservar,)
+            )
+
+    # --- usuarios ---
+
+    def cargar_usuarios(self):
+        return [r[0] for r in self._query("SELECT user_id FROM usuarios ORDER BY rowid")]
+
+    def guardar_usuarios(self, lista):
+        with self.transaccion():
+            self._conn.execute("DELETE FROM usuarios")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO usuarios (user_id) VALUES (?)",
+                ((int(u),) for u in lista),
+            )
+
+    def agregar_usuario(self, user_id: int) -> bool:
+        with self.transaccion():
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO usuarios (user_id) VALUES (?)", (user_id,)
+            )
+            return cur.rowcount > 0
+
+    def compactar_usuarios(self):
+        # En SQLite cada alta ya es un INSERT: no hay log que compactar
+        pass
+
+    # --- xp ---
+
+    def cargar_xp(self):
+        return {str(u): x for u, x in self._query("SELECT user_id, xp FROM xp")}
+
+    def guardar_xp(self, data):
+        with self.transaccion():
+            self._conn.execute("DELETE FROM xp")
+            self._conn.executemany(
+                "INSERT INTO xp (user_id, xp) VALUES (?, ?)",
+                ((int(u), int(x)) for u, x in data.items()),
+            )
+
+    def get_xp(self, user_id: int) -> int:
+        filas = self._query("SELECT xp FROM xp WHERE user_id = ?", (user_id,))
+        return filas[0][0] if filas else 0
+
+    def sumar_xp(self, user_id: int, amount: int) -> int:
+        with self.transaccion():
+            self._conn.execute(
+                "INSERT INTO xp (user_id, xp) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET xp = xp + excluded.xp",
+                (user_id, amount),
+            )
+            return self.get_xp(user_id)
+
+    def sumar_xp_lote(self, deltas: dict):
+        with self.transaccion():
+            self._conn.executemany(
+                "INSERT INTO xp (user_id, xp) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET xp = xp + excluded.xp",
+                ((int(u), a) for u, a in deltas.items()),
+            )
+
+    # --- premium ---
+
+    def cargar_premium(self):
+        filas = self._query("SELECT user_id, plan, lifetime, exp, legacy FROM premium")
+        return {str(u): _fila_a_entry(p, l, e, g) for u, p, l, e, g in filas}
+
+    def guardar_premium(self, data):
+        with self.transaccion():
+            self._conn.execute("DELETE FROM premium")
+            self._conn.executemany(
+                "INSERT INTO premium (user_id, plan, lifetime, exp, legacy) VALUES (?, ?, ?, ?, ?)",
+                ((int(u), *_entry_a_fila(e)) for u, e in data.items()),
+            )
+
+    def get_premium(self, user_id: int):
+        filas = self._query(
+            "SELECT plan, lifetime, exp, legacy FROM premium WHERE user_id = ?",
+            (int(user_id),),
+        )
+        return _fila_a_entry(*filas[0]) if filas else None
+
+    def set_premium(self, user_id: int, entry):
+        with self.transaccion():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO premium (user_id, plan, lifetime, exp, legacy) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (int(user_id), *_entry_a_fila(entry)),
+            )
+
+    # --- referidos ---
+
+    def cargar_ref(self):
+        refs = {}
+        with self._lock:
+            for u, ref_by in self._conn.execute("SELECT user_id, ref_by FROM referidos"):
+                info = refs.setdefault(str(u), _ref_vacio())
+                if ref_by is not None:
+                    info["ref_by"] = str(ref_by)
+                    refs.setdefault(str(ref_by), _ref_vacio())["referred"].append(str(u))
+            for r, u in self._conn.execute("SELECT referrer, referido FROM premios_ref"):
+                refs.setdefault(str(r), _ref_vacio())["premios"].append(str(u))
+        return refs
+
+    def guardar_ref(self, data):
+        with self.transaccion():
+            self._conn.execute("DELETE FROM referidos")
+            self._conn.execute("DELETE FROM premios_ref")
+            self.set_refs(data)
+
+    def get_ref(self, user_id):
+        uid = int(user_id)
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT ref_by FROM referidos WHERE user_id = ?", (uid,)
+            ).fetchone()
+            referred = [
+                str(r[0])
+                for r in self._conn.execute(
+                    "SELECT user_id FROM referidos WHERE ref_by = ?", (uid,)
+                )
+            ]
+            premios = [
+                str(r[0])
+                for r in self._conn.execute(
+                    "SELECT referido FROM premios_ref WHERE referrer = ?", (uid,)
+                )
+            ]
+        if fila is None and not referred and not premios:
+            return None
+        ref_by = fila[0] if fila else None
+        return {
+            "ref_by": str(ref_by) if ref_by is not None else None,
+            "referred": referred,
+            "premios": premios,
+        }
+
+    def set_refs(self, cambios: dict):
+        """
+        cambios: {uid_str: info}. La lista "referred" se deriva del índice
+        ref_by, así que sólo se guardan ref_by y premios.
+        """
+        with self.transaccion():
+            for uid, info in cambios.items():
+                u = int(uid)
+                ref_by = info.get("ref_by")
+                self._conn.execute(
+                    "INSERT INTO referidos (user_id, ref_by) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET ref_by = excluded.ref_by",
+                    (u, int(ref_by) if ref_by else None),
+                )
+                # Referidos que sólo figuran en la lista del referrer
+                for hijo in info.get("referred", []):
+                    self._conn.execute(
+                        "INSERT INTO referidos (user_id, ref_by) VALUES (?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET ref_by = "
+                        "COALESCE(referidos.ref_by, excluded.ref_by)",
+                        (int(hijo), u),
+                    )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO premios_ref (referrer, referido) VALUES (?, ?)",
+                    ((u, int(p)) for p in info.get("premios", [])),
+                )
+
+    # --- entregas (ver difusion.EstadoEntregas) ---
+
+    def cargar_entregas(self):
+        """Mismo formato que el snapshot entregas.json."""
+        with self._lock:
+            usuarios = {
+                str(u): {"motivo": m, "desde": d}
+                for u, m, d in self._conn.execute("SELECT user_id, motivo, desde FROM entregas")
+            }
+            contadores = dict(self._conn.execute("SELECT nombre, n FROM contadores_entregas"))
+        return {
+            "usuarios": usuarios,
+            "evitados": contadores.get("evitados", 0),
+            "reactivados": contadores.get("reactivados", 0),
+        }
+
+    def guardar_entregas(self, data):
+        with self.transaccion():
+            self._conn.execute("DELETE FROM entregas")
+            self._conn.executemany(
+                "INSERT INTO entregas (user_id, motivo, desde) VALUES (?, ?, ?)",
+                ((int(u), e["motivo"], int(e["desde"])) for u, e in data.get("usuarios", {}).items()),
+            )
+            self._conn.execute("DELETE FROM contadores_entregas")
+            self._conn.executemany(
+                "INSERT INTO contadores_entregas (nombre, n) VALUES (?, ?)",
+                ((k, int(data.get(k, 0))) for k in ("evitados", "reactivados")),
+            )
+
+    def marcar_inalcanzable(self, user_id: int, motivo: str, desde: int):
+        with self.transaccion():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entregas (user_id, motivo, desde) VALUES (?, ?, ?)",
+                (int(user_id), motivo, int(desde)),
+            )
+
+    def reactivar_entrega(self, user_id: int) -> bool:
+        """Lo saca de la lista; True (y suma a reactivados) si estaba."""
+        with self.transaccion():
+            cur = self._conn.execute("DELETE FROM entregas WHERE user_id = ?", (int(user_id),))
+            if cur.rowcount == 0:
+                return False
+            self.sumar_contador_entregas("reactivados", 1)
+            return True
+
+    def sumar_contador_entregas(self, nombre: str, n: int):
+        with self.transaccion():
+            self._conn.execute(
+                "INSERT INTO contadores_entregas (nombre, n) VALUES (?, ?) "
+                "ON CONFLICT(nombre) DO UPDATE SET n = n + excluded.n",
+                (nombre, n),
+            )
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ==========================
+#   REGISTRO DE USUARIOS EN MEMORIA
+# ==========================
+
+
+class RegistroUsuarios:
+    """
+    Set residente con todos los user_id, cargado una vez al arrancar.
+    Un usuario conocido no toca el disco; uno nuevo se agrega al log del
+    almacén, que se compacta cada `compactar_cada` altas (o a mano).
+    """
+
+    def __init__(self, store, compactar_cada: int = 1000):
+        self.store = store
+        self.compactar_cada = compactar_cada
+        self._ids = set(store.cargar_usuarios())
+        self._pendientes = 0
+
+    def __contains__(self, user_id):
+        return user_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def registrar(self, user_id: int) -> bool:
+        if user_id in self._ids:
+            return False
+        self._ids.add(user_id)
+        self.store.agregar_usuario(user_id)
+        self._pendientes += 1
+        if self.compactar_cada and self._pendientes >= self.compactar_cada:
+            self.compactar()
+        return True
+
+    def reemplazar(self, lista):
+        self.store.guardar_usuarios(lista)
+        self._ids = set(lista)
+        self._pendientes = 0
+
+    def recargar(self, ids=None):
+        """Relee el almacén (altas hechas por otro proceso)."""
+        self._ids = set(self.store.cargar_usuarios() if ids is None else ids)
+
+    def sincronizar(self, cambios: dict):
+        """{user_id: está en la base}, de AlmacenSQLite.cambios_desde."""
+        for user_id, esta in cambios.items():
+            if esta:
+                self._ids.add(user_id)
+            else:
+                self._ids.discard(user_id)
+
+    def compactar(self):
+        if not self._pendientes:
+            return
+        self.store.compactar_usuarios()
+        self._pendientes = 0
+
+
+# ==========================
+#   XP CON ESCRITURA DIFERIDA
+# ==========================
+
+
+class AcumuladorXP:
+    """
+    Junta los incrementos de XP en memoria y los escribe en un solo lote.
+    Se vacía al llegar a `max_eventos` sumas (por eso un crash pierde como
+    mucho max_eventos - 1 eventos), cuando lo llama el timer y al apagar.
+    Las lecturas suman lo pendiente, así que nadie ve XP "atrasado".
+    """
+
+    def __init__(self, store, max_eventos: int = 50):
+        self.store = store
+        self.max_eventos = max(1, max_eventos)
+        self._pendientes = {}
+        self._eventos = 0
+
+    @property
+    def eventos_pendientes(self) -> int:
+        return self._eventos
+
+    def sumar(self, user_id: int, amount: int):
+        self._pendientes[user_id] = self._pendientes.get(user_id, 0) + amount
+        self._eventos += 1
+        if self._eventos >= self.max_eventos:
+            self.flush()
+
+    def get(self, user_id: int) -> int:
+        return self.store.get_xp(user_id) + self._pendientes.get(user_id, 0)
+
+    def pendientes(self) -> dict:
+        """{user_id: XP sumado que todavía no se escribió}."""
+        return dict(self._pendientes)
+
+    def cargar(self) -> dict:
+        data = self.store.cargar_xp()
+        for user_id, amount in self._pendientes.items():
+            uid = str(user_id)
+            data[uid] = data.get(uid, 0) + amount
+        return data
+
+    def reemplazar(self, data: dict):
+        # data ya viene de cargar(), o sea que incluye lo pendiente
+        self._pendientes = {}
+        self._eventos = 0
+        self.store.guardar_xp(data)
+
+    def flush(self):
+        if not self._pendientes:
+            return
+        lote = self._pendientes
+        self._pendientes = {}
+        self._eventos = 0
+        try:
+            self.store.sumar_xp_lote(lote)
+        except Exception:
+            # No perder nada: devolver el lote a la cola y que reintente el próximo flush
+            for user_id, amount in lote.items():
+                self._pendientes[user_id] = self._pendientes.get(user_id, 0) + amount
+            self._eventos += len(lote)
+            raise
+
+
+def crear_almacen(backend, db_file, premium_file, users_file, xp_file, ref_file):
+    if backend == "sqlite":
+        return AlmacenSQLite(db_file)
+    if backend == "json":
+        return AlmacenJSON(premium_file, users_file, xp_file, ref_file)
+    raise ValueError(f"STORAGE_BACKEND desconocido: {backend}")
+
+
+# ==========================
+#   IMPORTADOR JSON → SQLITE
+# ==========================
+
+
+def importar_json(db_file, premium_file, users_file, xp_file, ref_file, entregas_file=None):
+    """Copia los .json actuales a la base SQLite en una sola transacción."""
+    origen = AlmacenJSON(premium_file, users_file, xp_file, ref_file)
+    destino = AlmacenSQLite(db_file)
+
+    usuarios = origen.cargar_usuarios()
+    xp = origen.cargar_xp()
+    premium = origen.cargar_premium()
+    refs = origen.cargar_ref()
+    entregas = cargar_json(entregas_file, None) if entregas_file else None
+
+    with destino.transaccion():
+        destino.guardar_usuarios(usuarios)
+        destino.guardar_xp(xp)
+        destino.guardar_premium(premium)
+        destino.guardar_ref(refs)
+        if entregas:
+            destino.guardar_entregas(entregas)
+
+    destino.cerrar()
+    return {
+        "usuarios": len(usuarios),
+        "xp": len(xp),
+        "premium": len(premium),
+        "referidos": len(refs),
+        "inalcanzables": len(entregas.get("usuarios", {})) if entregas else 0,
+    }
+
+
+def importar_si_falta(db_file, premium_file, users_file, xp_file, ref_file, entregas_file=None):
+    """
+    Primer arranque con SQLite: si la base no existe y hay .json, los
+    importa antes de que nadie la abra (si no, el bot arrancaría vacío y
+    los .json quedarían ignorados). Devuelve lo importado o None.
+    """
+    if os.path.exists(db_file):
+        return None
+    archivos = (premium_file, users_file, os.path.splitext(users_file)[0] + ".log", xp_file, ref_file)
+    if not any(os.path.exists(f) for f in archivos):
+        return None
+    # A un temporal y rename: un corte a mitad no deja una base a medias
+    # que el próximo arranque tomaría por buena
+    tmp = db_file + ".importando"
+    for path in (tmp, tmp + "-wal", tmp + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    res = importar_json(tmp, premium_file, users_file, xp_file, ref_file, entregas_file)
+    os.replace(tmp, db_file)
+    print(f"✅ {db_file} no existía: importados los .json ({', '.join(f'{k}={v}' for k, v in res.items())})")
+    return res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Herramientas de almacenamiento del bot")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("importar", help="Importa los .json a SQLite (una sola vez)")
+    imp.add_argument("--db", default=os.getenv("DB_FILE", "bot.db"))
+    imp.add_argument("--premium", default="premium_users.json")
+    imp.add_argument("--usuarios", default="usuarios.json")
+    imp.add_argument("--xp", default="xp_users.json")
+    imp.add_argument("--ref", default="referrals.json")
+    imp.add_argument("--entregas", default="entregas.json")
+    args = parser.parse_args()
+
+    if args.cmd == "importar":
+        res = importar_json(args.db, args.premium, args.usuarios, args.xp, args.ref, args.entregas)
+        print(f"✅ Importado a {args.db}: " + ", ".join(f"{k}={v}" for k, v in res.items()))
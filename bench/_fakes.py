@@ -0,0 +1,122 @@
+"""
+Objetos falsos mínimos para correr los handlers de bot.py sin Telegram
+ni OpenAI. Los usan los scripts de bench/.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+from types import SimpleNamespace
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_FALSO = 1
+
+
+def preparar_entorno(premium=None, usuarios=None, xp=None):
+    """
+    Deja el cwd en un directorio temporal con los .json de prueba y las
+    variables que bot.py necesita al importarse. Devuelve el directorio.
+    """
+    d = tempfile.mkdtemp(prefix="bench_bot_")
+    os.chdir(d)
+    with open("premium_users.json", "w", encoding="utf-8") as f:
+        json.dump(premium or {}, f)
+    with open("usuarios.json", "w", encoding="utf-8") as f:
+        json.dump(usuarios or [], f)
+    with open("xp_users.json", "w", encoding="utf-8") as f:
+        json.dump(xp or {}, f)
+
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123:falso")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-falso")
+    os.environ.setdefault("ADMIN_ID", str(ADMIN_FALSO))
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    return d
+
+
+class MensajeFalso:
+    def __init__(self, chat_id, texto="", enviados=None):
+        self.chat_id = chat_id
+        self.text = texto
+        self.photo = []
+        self.message_id = 1
+        self.enviados = enviados if enviados is not None else []
+
+    async def reply_text(self, texto, **kwargs):
+        self.enviados.append((time.perf_counter(), self.chat_id, texto))
+        return MensajeFalso(self.chat_id, texto, self.enviados)
+
+    async def edit_text(self, texto, **kwargs):
+        self.enviados.append((time.perf_counter(), self.chat_id, texto))
+        return self
+
+
+def update_texto(uid, texto, enviados=None):
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=uid),
+        effective_chat=SimpleNamespace(id=uid),
+        message=MensajeFalso(uid, texto, enviados),
+        callback_query=None,
+    )
+
+
+class BotFalso:
+    """Registra todo lo que el bot manda en vez de llamar a Telegram."""
+
+    def __init__(self):
+        self.enviados = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.enviados.append((time.perf_counter(), chat_id, text))
+        return MensajeFalso(chat_id, text, self.enviados)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.enviados.append((time.perf_counter(), chat_id, photo))
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        return True
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.enviados.append((time.perf_counter(), chat_id, text))
+
+
+def contexto(bot, args=None):
+    return SimpleNamespace(bot=bot, args=args or [])
+
+
+class OpenAIFalso:
+    """
+    Reemplazo de AsyncOpenAI: chat.completions.create con `latencia` hasta
+    el primer token y después `tokens_por_seg` (también con stream=True).
+    """
+
+    def __init__(self, latencia=1.0, respuesta="Respuesta de prueba del coach.", tokens_por_seg=None):
+        self.latencia = latencia
+        self.respuesta = respuesta
+        self.tokens_por_seg = tokens_por_seg
+        self.llamadas = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _tokens(self):
+        # ~4 caracteres por token, como el tokenizer real
+        return [self.respuesta[i:i + 4] for i in range(0, len(self.respuesta), 4)]
+
+    async def _create(self, model, messages, stream=False, **kwargs):
+        self.llamadas += 1
+        await asyncio.sleep(self.latencia)
+        if stream:
+            return self._stream()
+        if self.tokens_por_seg:
+            await asyncio.sleep(len(self._tokens()) / self.tokens_por_seg)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.respuesta))],
+            usage=SimpleNamespace(prompt_tokens=60, completion_tokens=40, total_tokens=100),
+        )
+
+    async def _stream(self):
+        for tok in self._tokens():
+            if self.tokens_por_seg:
+                await asyncio.sleep(1 / self.tokens_por_seg)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=tok))])
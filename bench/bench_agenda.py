@@ -0,0 +1,159 @@
+"""
+Agenda persistente (agenda.py) contra run_daily/run_monthly sin estado,
+con un reloj falso: los días pasan en milisegundos.
+
+    python bench/bench_agenda.py
+
+Escenarios:
+  reinicio 00:01 del 1   el bot se cae a las 23:59 del 31 y vuelve a las
+                         00:01: ¿sale el descuento del mes?
+  dos procesos           dos agendas sobre el mismo directorio (dos
+                         workers con jobs, o el deploy nuevo con el viejo
+                         todavía vivo): ¿cuántas veces sale?
+  reinicio en el warm-up se cae a las 15:35 con 12 tandas en 2 h y vuelve
+                         a las 16:10: ¿cuántas tandas salen y cuántas dos veces?
+  caída larga            vuelve a las 20:00 del día 1: fuera de la gracia
+                         no se manda un descuento que ya no sirve
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agenda import Agenda, Diario, Mensual  # noqa: E402
+
+
+class Reloj:
+    def __init__(self, ahora):
+        self.ahora = ahora
+
+    def __call__(self):
+        return self.ahora
+
+
+class JobQueueFalsa:
+    """run_once a secas, con el reloj falso. `correr_hasta` avanza el tiempo."""
+
+    def __init__(self, reloj):
+        self.reloj = reloj
+        self.programados = []
+
+    def run_once(self, callback, when, data=None, name=None):
+        if isinstance(when, datetime):
+            instante = when.astimezone().replace(tzinfo=None)
+        else:
+            instante = self.reloj() + timedelta(seconds=when)
+        self.programados.append((instante, len(self.programados), callback, data))
+
+    async def correr_hasta(self, limite):
+        while True:
+            listos = [p for p in self.programados if p[0] <= limite]
+            if not listos:
+                break
+            p = min(listos)
+            self.programados.remove(p)
+            self.reloj.ahora = max(self.reloj.ahora, p[0])
+            await p[2](SimpleNamespace(job=SimpleNamespace(data=p[3]), job_queue=self))
+        self.reloj.ahora = limite
+
+
+def agenda_de(directorio, reloj, enviados):
+    async def descuento(context):
+        enviados.append(("descuento", context.job.data["base"], reloj()))
+
+    async def warmup(context):
+        enviados.append(("warmup", context.job.data["tanda"], reloj()))
+
+    agenda = Agenda(directorio, escalon=60, reloj=reloj)
+    agenda.agregar("descuento_mensual", descuento, Mensual(dia=1), gracia=12 * 3600)
+    agenda.agregar("warmup", warmup, Diario(hora=15), gracia=2 * 3600, tandas=12, ventana=2 * 3600)
+    return agenda
+
+
+async def proceso(directorio, desde, hasta, enviados, con_agenda=True):
+    """Un bot vivo entre `desde` y `hasta` (instalar + dejar correr el reloj)."""
+    reloj = Reloj(desde)
+    jq = JobQueueFalsa(reloj)
+    if con_agenda:
+        agenda_de(directorio, reloj, enviados).instalar(jq)
+    else:
+        # Lo de antes: run_daily/run_monthly en memoria, siempre al próximo turno
+        for nombre, cuando in (("descuento", Mensual(dia=1)), ("warmup", Diario(hora=15))):
+            async def correr(context, nombre=nombre):
+                enviados.append((nombre, None, reloj()))
+
+            jq.run_once(correr, when=cuando.siguiente(desde).astimezone())
+    await jq.correr_hasta(hasta)
+
+
+def contar(enviados, nombre):
+    return sum(1 for e in enviados if e[0] == nombre)
+
+
+async def main():
+    d = tempfile.mkdtemp(prefix="bench_agenda_")
+    try:
+        t = datetime(2026, 10, 31, 12, 0)
+
+        print("reinicio 00:01 del 1")
+        for con_agenda in (False, True):
+            dir_caso = os.path.join(d, f"reinicio{int(con_agenda)}")
+            enviados = []
+            await proceso(dir_caso, t, datetime(2026, 10, 31, 23, 59), enviados, con_agenda)
+            await proceso(dir_caso, datetime(2026, 11, 1, 0, 1), datetime(2026, 11, 1, 12, 0), enviados, con_agenda)
+            cuando = [f"{e[2]:%d/%m %H:%M}" for e in enviados if e[0] == "descuento"]
+            print(f"  {'agenda' if con_agenda else 'sin estado':<12} descuentos: {contar(enviados, 'descuento')} {cuando}")
+
+        print("dos procesos")
+        for con_agenda in (False, True):
+            dir_caso = os.path.join(d, f"dos{int(con_agenda)}")
+            enviados = []
+            desde, hasta = datetime(2026, 10, 31, 12, 0), datetime(2026, 11, 1, 18, 0)
+            await asyncio.gather(
+                proceso(dir_caso, desde, hasta, enviados, con_agenda),
+                proceso(dir_caso, desde, hasta, enviados, con_agenda),
+            )
+            print(
+                f"  {'agenda' if con_agenda else 'sin estado':<12} descuentos: {contar(enviados, 'descuento')}, "
+                f"warm-up: {contar(enviados, 'warmup')} envíos"
+            )
+
+        print("reinicio en el warm-up (12 tandas, 15:00-17:00)")
+        dir_caso = os.path.join(d, "warmup")
+        enviados = []
+        await proceso(dir_caso, datetime(2026, 11, 2, 14, 0), datetime(2026, 11, 2, 15, 35), enviados)
+        antes = contar(enviados, "warmup")
+        await proceso(dir_caso, datetime(2026, 11, 2, 16, 10), datetime(2026, 11, 2, 18, 0), enviados)
+        tandas = [e[1] for e in enviados if e[0] == "warmup"]
+        print(
+            f"  antes de caerse: {antes} tandas; después: {len(tandas) - antes} "
+            f"(recuperadas de 16:10 a {max(e[2] for e in enviados if e[0] == 'warmup'):%H:%M}); "
+            f"distintas: {len(set(tandas))}/12, repetidas: {len(tandas) - len(set(tandas))}"
+        )
+
+        print("caída larga (vuelve 20:00 del 1, gracia 12 h)")
+        dir_caso = os.path.join(d, "larga")
+        enviados = []
+        await proceso(dir_caso, datetime(2026, 11, 1, 20, 0), datetime(2026, 11, 2, 0, 0), enviados)
+        print(f"  descuentos: {contar(enviados, 'descuento')}")
+
+        # Costo de anotar un turno (un archivo nuevo con fsync)
+        agenda = Agenda(os.path.join(d, "costo"))
+        base = datetime(2026, 11, 1)
+        n = 200
+        t0 = time.perf_counter()
+        for i in range(n):
+            agenda.reclamar("costo", f"{base:%Y%m%dT%H%M}.{i:03d}", base, i)
+        print(f"reclamar un turno: {(time.perf_counter() - t0) / n * 1e6:.0f} µs")
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Latencia por mensaje: backend JSON vs SQLite.
+
+Un "mensaje" = registrar_usuario + add_xp + chequeo premium, que es lo que
+hace un usuario premium que chatea con la IA.
+
+    python bench/bench_almacenamiento.py
+    python bench/bench_almacenamiento.py --tamanos 10000 100000 1000000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from almacenamiento import AlmacenJSON, AlmacenSQLite, guardar_json  # noqa: E402
+
+
+def sembrar(n):
+    usuarios = list(range(1_000_000, 1_000_000 + n))
+    xp = {str(u): random.randint(0, 2000) for u in usuarios}
+    premium = {
+        str(u): {"lifetime": False, "exp": "2030-01-01", "plan": "standard"}
+        for u in usuarios[: n // 10]
+    }
+    return usuarios, xp, premium
+
+
+def mensaje(store, uid):
+    store.agregar_usuario(uid)
+    store.sumar_xp(uid, 5)
+    store.get_premium(uid)
+
+
+def medir(store, usuarios, iteraciones):
+    tiempos = []
+    for _ in range(iteraciones):
+        uid = random.choice(usuarios)
+        t0 = time.perf_counter()
+        mensaje(store, uid)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos), max(tiempos)
+
+
+def correr(n, iteraciones):
+    usuarios, xp, premium = sembrar(n)
+    with tempfile.TemporaryDirectory() as d:
+        rutas = {k: os.path.join(d, f"{k}.json") for k in ("premium", "usuarios", "xp", "ref")}
+        guardar_json(rutas["usuarios"], usuarios)
+        guardar_json(rutas["xp"], xp)
+        guardar_json(rutas["premium"], premium)
+        guardar_json(rutas["ref"], {})
+
+        js = AlmacenJSON(rutas["premium"], rutas["usuarios"], rutas["xp"], rutas["ref"])
+        it_json = max(3, min(iteraciones, 2_000_000 // n))
+        med_json, max_json = medir(js, usuarios, it_json)
+
+        db = AlmacenSQLite(os.path.join(d, "bot.db"))
+        with db.transaccion():
+            db.guardar_usuarios(usuarios)
+            db.guardar_xp(xp)
+            db.guardar_premium(premium)
+        med_sql, max_sql = medir(db, usuarios, iteraciones)
+        db.cerrar()
+
+    print(
+        f"{n:>9} usuarios | JSON  p50={med_json:10.3f} ms  max={max_json:10.3f} ms  ({it_json} msgs)\n"
+        f"{'':>9}          | SQLite p50={med_sql:9.3f} ms  max={max_sql:10.3f} ms  ({iteraciones} msgs)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--iteraciones", type=int, default=2000)
+    args = parser.parse_args()
+    for n in args.tamanos:
+        correr(n, args.iteraciones)
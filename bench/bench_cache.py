@@ -0,0 +1,82 @@
+"""
+Cache de respuestas IA (ia.py): cuántas preguntas reformuladas comparten
+respuesta y si alguna pregunta de sentido opuesto se lleva la respuesta
+de otra (colisión). Sale con código 1 si hay colisiones.
+
+    python bench/bench_cache.py
+    python bench/bench_cache.py --fuzzy --umbral 0.7
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ia import CacheRespuestas, normalizar_pregunta  # noqa: E402
+
+# Cada grupo es la misma pregunta escrita de otra forma: deberían compartir entrada
+PARAFRASEADAS = [
+    ["¿Cuál es la MEJOR sens para 800 DPI?", "cual es la mejor sens para 800 dpi", "Cuál es la mejor sens para 800 dpi??"],
+    ["cómo mejoro mis edits", "Como mejoro mis edits?", "che como mejoro mis edits"],
+    ["qué rotación hago en endgame", "Que rotacion hago en endgame?"],
+    ["mejor config con aim assist", "Mejor config con aim assist!!"],
+    ["rutina de aim de 30 minutos", "decime una rutina de aim de 30 minutos"],
+]
+
+# Pares que no pueden compartir respuesta
+OPUESTAS = [
+    ("mejor config sin aim assist", "mejor config con aim assist"),
+    ("juego con teclado o con joystick", "juego con teclado y con joystick"),
+    ("sens para pc", "sens sin pc"),
+    ("que hago si no tengo materiales", "que hago si tengo materiales"),
+    ("conviene jugar con mouse", "conviene jugar sin mouse"),
+    ("rutina para box fights", "rutina contra box fights"),
+    ("best settings with controller", "best settings without controller"),
+    ("edits o builds primero", "edits y builds primero"),
+    ("que sens uso con mouse de 800 dpi y monitor de 144 hz", "que sens uso con mouse de 400 dpi y monitor de 144 hz"),
+    ("que sens uso con mouse de 800 dpi y monitor de 144 hz", "que sens uso con mouse de 800 dpi y monitor de 240 hz"),
+]
+
+
+def colisiones(cache):
+    res = []
+    for a, b in OPUESTAS:
+        for pregunta, otra in ((a, b), (b, a)):
+            cache.put(pregunta, f"respuesta a: {pregunta}")
+            resp = cache.get(otra)
+            if resp is not None:
+                res.append((otra, resp, normalizar_pregunta(pregunta), normalizar_pregunta(otra)))
+            cache._datos.clear()
+            cache._buckets.clear()
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fuzzy", action="store_true")
+    parser.add_argument("--umbral", type=float, default=0.8)
+    parser.add_argument("--n", type=int, default=50_000, help="gets para medir el costo")
+    args = parser.parse_args()
+
+    cache = CacheRespuestas(fuzzy=args.fuzzy, umbral=args.umbral)
+    for grupo in PARAFRASEADAS:
+        cache.put(grupo[0], f"respuesta a: {grupo[0]}")
+    hits = sum(1 for grupo in PARAFRASEADAS for p in grupo[1:] if cache.get(p) is not None)
+    total = sum(len(g) - 1 for g in PARAFRASEADAS)
+    print(f"{'fuzzy' if args.fuzzy else 'exacta'}: reformuladas que pegan {hits}/{total}")
+
+    t0 = time.perf_counter()
+    for i in range(args.n):
+        cache.get(PARAFRASEADAS[i % len(PARAFRASEADAS)][-1])
+    print(f"get: {(time.perf_counter() - t0) / args.n * 1e6:.1f} µs")
+
+    malas = colisiones(CacheRespuestas(fuzzy=args.fuzzy, umbral=args.umbral))
+    print(f"colisiones entre preguntas opuestas: {len(malas)}/{len(OPUESTAS) * 2}")
+    for otra, resp, k1, k2 in malas:
+        print(f"  ⚠️ {otra!r} recibió {resp!r} ({k2!r} ~ {k1!r})")
+    sys.exit(1 if malas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Envío masivo: el loop secuencial de siempre contra Difusion (concurrencia
+acotada + TokenBucket), con latencia de red simulada, un RetryAfter de vez
+en cuando y una interrupción a mitad de camino para probar la reanudación.
+
+    python bench/bench_difusion.py --usuarios 2000 --latencia 0.08 --por-segundo 30
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from telegram.error import RetryAfter, Forbidden
+
+from difusion import TokenBucket, Difusion
+
+
+class BotLento:
+    """send_message con latencia, bloqueos y algún RetryAfter."""
+
+    def __init__(self, latencia, prob_bloqueo=0.05, retry_cada=0):
+        self.latencia = latencia
+        self.prob_bloqueo = prob_bloqueo
+        self.retry_cada = retry_cada
+        self.llamadas = 0
+        self.entregados = []
+        self.retry_after = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.llamadas += 1
+        n = self.llamadas
+        await asyncio.sleep(self.latencia * random.uniform(0.5, 1.5))
+        if self.retry_cada and n % self.retry_cada == 0:
+            self.retry_after += 1
+            raise RetryAfter(1)
+        if random.random() < self.prob_bloqueo:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.entregados.append(chat_id)
+
+
+async def enviar_con(bot, chat_id, texto, parse_mode):
+    try:
+        await bot.send_message(chat_id=chat_id, text=texto, parse_mode=parse_mode)
+        return True
+    except Forbidden:
+        return False
+
+
+async def secuencial(bot, usuarios):
+    t0 = time.perf_counter()
+    for uid in usuarios:
+        try:
+            await bot.send_message(chat_id=uid, text="hola")
+        except Exception:
+            pass
+    return time.perf_counter() - t0
+
+
+async def motor(bot, usuarios, args, directorio, cortar_en=None):
+    bucket = TokenBucket(por_segundo=args.por_segundo)
+    dif = Difusion.crear(directorio, "hola", usuarios)
+    tarea = asyncio.create_task(
+        dif.correr(lambda c, t, p: enviar_con(bot, c, t, p), bucket, concurrencia=args.concurrencia)
+    )
+    t0 = time.perf_counter()
+    if cortar_en is not None:
+        while dif.procesados < cortar_en:
+            await asyncio.sleep(0.01)
+        tarea.cancel()
+        await asyncio.gather(tarea, return_exceptions=True)
+        primera = time.perf_counter() - t0
+        # "Reinicio": se lee el checkpoint desde disco y se sigue
+        pendientes = Difusion.pendientes(directorio)
+        assert len(pendientes) == 1
+        dif = pendientes[0]
+        print(f"  cortado en {pendientes[0].procesados}/{len(usuarios)} tras {primera:.1f}s, reanudando...")
+        t0 = time.perf_counter() - primera
+        await dif.correr(
+            lambda c, t, p: enviar_con(bot, c, t, p), TokenBucket(por_segundo=args.por_segundo),
+            concurrencia=args.concurrencia,
+        )
+    else:
+        await tarea
+    return time.perf_counter() - t0, dif
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--latencia", type=float, default=0.08, help="segundos por send_message")
+    parser.add_argument("--por-segundo", type=float, default=30)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    parser.add_argument("--retry-cada", type=int, default=500, help="un RetryAfter cada N llamadas (0 = nunca)")
+    args = parser.parse_args()
+    random.seed(1)
+    usuarios = list(range(1, args.usuarios + 1))
+
+    async def todo():
+        bot = BotLento(args.latencia, retry_cada=0)
+        t = await secuencial(bot, usuarios)
+        print(f"secuencial: {t:.1f}s  ({len(usuarios) / t:.1f} msg/s)")
+
+        with tempfile.TemporaryDirectory() as d:
+            bot = BotLento(args.latencia, retry_cada=args.retry_cada)
+            t, dif = await motor(bot, usuarios, args, d)
+            p = dif.progreso()
+            print(
+                f"Difusion:   {t:.1f}s  ({len(usuarios) / t:.1f} msg/s, tope {args.por_segundo:.0f})  "
+                f"enviados={p['enviados']} fallidos={p['fallidos']} retry_after={bot.retry_after}"
+            )
+
+        with tempfile.TemporaryDirectory() as d:
+            bot = BotLento(args.latencia, retry_cada=args.retry_cada)
+            t, dif = await motor(bot, usuarios, args, d, cortar_en=len(usuarios) // 2)
+            repetidos = len(bot.entregados) - len(set(bot.entregados))
+            p = dif.progreso()
+            print(
+                f"con corte:  {t:.1f}s  enviados={p['enviados']} fallidos={p['fallidos']} "
+                f"repetidos={repetidos} checkpoint_borrado={not os.listdir(d)}"
+            )
+
+    asyncio.run(todo())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Prueba de carga: N preguntas IA en paralelo y, mientras tanto, /menu de
+otro usuario cada 50 ms. Mide cuánto tarda /menu en responder.
+
+Los updates entran por la update_queue de la Application que arma
+construir_app (igual que en producción), así que cuenta cuántos atiende
+PTB a la vez y no sólo el cliente de la IA.
+
+    python bench/bench_ia_concurrente.py --ia 50 --latencia 2
+    python bench/bench_ia_concurrente.py --concurrentes 1    # de a un update (PTB por defecto)
+    python bench/bench_ia_concurrente.py --bloqueante         # simula el cliente sync viejo
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from _fakes import preparar_entorno, OpenAIFalso
+from bench_replay import BotFalso, _mensaje
+
+USUARIO_MENU = 999
+
+
+async def correr(bot_mod, n_ia, duracion):
+    app = bot_mod.construir_app(updater=False, jobs=False, bot=BotFalso())
+    inyectado = {}
+    terminado = {}
+
+    async def fin_de_update(update, context):
+        terminado[update.update_id] = time.perf_counter()
+
+    app.add_handler(TypeHandler(Update, fin_de_update), group=99)
+
+    async with app:
+        await app.start()
+        update_id = 0
+        for i in range(n_ia):
+            update_id += 1
+            inyectado[update_id] = time.perf_counter()
+            await app.update_queue.put(
+                Update.de_json(_mensaje(update_id, 10_000 + i, f"cómo mejoro mis edits jugando {i} horas?"), app.bot)
+            )
+
+        # Cada /menu "llega" en un instante fijo; si el loop está congelado o
+        # PTB no lo toma, la espera cuenta como latencia (igual que para un usuario real)
+        menus = []
+        inicio = time.perf_counter()
+        for k in range(int(duracion / 0.05)):
+            llegada = inicio + k * 0.05
+            await asyncio.sleep(max(0.0, llegada - time.perf_counter()))
+            update_id += 1
+            menus.append(update_id)
+            inyectado[update_id] = llegada
+            await app.update_queue.put(Update.de_json(_mensaje(update_id, USUARIO_MENU, "/menu"), app.bot))
+
+        while len(terminado) < update_id:
+            await asyncio.sleep(0.01)
+        resto = time.perf_counter() - inicio
+        await app.stop()
+    await bot_mod.al_apagar(app)
+
+    latencias = sorted((terminado[u] - inyectado[u]) * 1000 for u in menus)
+    return latencias, resto
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ia", type=int, default=50, help="preguntas IA simultáneas")
+    parser.add_argument("--latencia", type=float, default=2.0, help="segundos por respuesta IA")
+    parser.add_argument("--duracion", type=float, default=3.0)
+    parser.add_argument("--concurrentes", type=int, help="UPDATES_CONCURRENTES (default: el del bot)")
+    parser.add_argument("--bloqueante", action="store_true")
+    args = parser.parse_args()
+
+    # Uno de cada cuatro es PLUS, para ver la espera por carril
+    premium = {
+        str(10_000 + i): {"lifetime": True, "exp": None, "plan": "plus" if i % 4 == 0 else "standard"}
+        for i in range(args.ia)
+    }
+    preparar_entorno(premium=premium)
+    import os
+    os.environ["METRICS_PORT"] = "0"
+    import bot as bot_mod
+
+    bot_mod.ia.client = OpenAIFalso(latencia=args.latencia)
+    if args.concurrentes:
+        bot_mod.UPDATES_CONCURRENTES = args.concurrentes
+
+    if args.bloqueante:
+        # Lo que hacía el cliente sync: el event loop queda congelado
+        async def responder_sync(messages):
+            time.sleep(args.latencia)
+            return "Respuesta de prueba del coach."
+
+        bot_mod.ia.responder = responder_sync
+
+    latencias, resto = asyncio.run(correr(bot_mod, args.ia, args.duracion))
+    modo = "sync (viejo)" if args.bloqueante else "async"
+    print(
+        f"{modo}, {bot_mod.UPDATES_CONCURRENTES} updates a la vez: {args.ia} preguntas IA de {args.latencia}s\n"
+        f"/menu durante la carga: n={len(latencias)} "
+        f"p50={statistics.median(latencias):.2f} ms max={latencias[-1]:.2f} ms "
+        f"(todo terminado en {resto:.1f} s)"
+    )
+    for carril, st in bot_mod.cola_ia.estado().items():
+        print(
+            f"carril {carril:<8} atendidos={st['atendidos']:>4} rechazados={st['rechazados']:>4} "
+            f"espera media={st['espera_media']:.2f}s máx={st['espera_max']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
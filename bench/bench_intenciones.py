@@ -0,0 +1,78 @@
+"""
+Clasificación de mensajes: la cadena de ifs vieja de handle_message contra
+RouterIntenciones, y cuánto cambia el router al sumarle intenciones.
+
+    python bench/bench_intenciones.py --extra 50
+"""
+import time
+import argparse
+
+from _fakes import preparar_entorno
+
+MENSAJES = [
+    "como mejoro mi aim con escopeta en box fights",
+    "que config de pc me recomendas para tener mas fps",
+    "armame una rutina de 30 minutos para edits",
+    "hola buenas, quiero saber donde caer en la nueva season",
+    "pasame la sens de peterbot",
+    "cuanto sale el premium?",
+    "me tilteo mucho en endgame, que hago",
+    "sens pros",
+]
+
+
+def clasificar_viejo(bot, low):
+    if any(low.startswith(g) for g in bot.GREETINGS) or "ayuda" in low or "coach" in low:
+        return "saludo"
+    if bot.obtener_sens_pro_desde_texto(low):
+        return "sens_pro"
+    if "premium" in low or "pagar" in low or "pago" in low or "precio" in low:
+        return "premium"
+    if "sens pros" in low or "sensibilidad de pros" in low or "sensibilidades de pros" in low:
+        return "sens_pros"
+    return None
+
+
+def medir(fn, repeticiones):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        for m in MENSAJES:
+            fn(m)
+    return (time.perf_counter() - t0) / (repeticiones * len(MENSAJES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--extra", type=int, default=50, help="intenciones sintéticas extra")
+    parser.add_argument("--repeticiones", type=int, default=2000)
+    args = parser.parse_args()
+
+    preparar_entorno()
+    import bot as bot_mod
+    from intenciones import RouterIntenciones
+
+    print("mensaje → viejo / router")
+    for m in MENSAJES:
+        i, _ = bot_mod.router_intenciones.clasificar(m)
+        print(f"  {m[:45]:<45} {clasificar_viejo(bot_mod, m)!s:>9} / {i['nombre'] if i else None}")
+
+    viejo = medir(lambda m: clasificar_viejo(bot_mod, m), args.repeticiones)
+    router = medir(bot_mod.router_intenciones.clasificar, args.repeticiones)
+
+    extra = [
+        {"nombre": f"extra{n}", "prioridad": 100 + n, "contiene": [f"tema{n}", f"consulta{n} x"], "handler": None}
+        for n in range(args.extra)
+    ]
+    grande = RouterIntenciones(bot_mod.INTENCIONES + extra)
+    router_grande = medir(grande.clasificar, args.repeticiones)
+
+    print(f"\nµs por mensaje (promedio de {len(MENSAJES)} mensajes):")
+    print(f"  if-chain viejo ({4} intenciones):           {viejo:6.1f}")
+    print(f"  router ({len(bot_mod.INTENCIONES)} intenciones):                  {router:6.1f}")
+    print(f"  router (+{args.extra} intenciones sintéticas):     {router_grande:6.1f}")
+    lat = bot_mod.router_intenciones.latencias()
+    print(f"  latencia medida por el router: p50 {lat['p50']:.1f} µs, p99 {lat['p99']:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
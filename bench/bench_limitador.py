@@ -0,0 +1,124 @@
+"""
+Límite por usuario y shedding delante de la cola IA, con una IA falsa de
+latencia fija y workers contados (capacidad = workers / latencia).
+
+    python bench/bench_limitador.py
+
+Escenario "flood": usuarios normales a 1 pregunta/s y uno solo mandando
+100/s. Escenario "pico": más tráfico Standard del que la IA puede atender,
+con algunos PLUS; sin shedding la cola se llena y todos esperan, con
+shedding se corta Standard y PLUS mantiene la latencia.
+Los tiempos están comprimidos: los límites por minuto del bot acá son por
+segundo para que la corrida dure segundos.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ia import ColaIA, LimitadorUsuarios, ControlCarga  # noqa: E402
+
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(len(orden) * p))]
+
+
+async def simular(usuarios, duracion, latencia_ia, workers, limitador=None, control=None):
+    """
+    usuarios: [(user_id, carril, preguntas_por_segundo, grupo)]. Devuelve
+    {grupo: {"lat": [...], "frenados": n, "cortados": n, "llena": n}}.
+    """
+    cola = ColaIA([("plus", 100), ("standard", 50)], workers=workers)
+    res = {g: {"lat": [], "frenados": 0, "cortados": 0, "llena": 0} for *_, g in usuarios}
+    pendientes = []
+
+    async def ia_falsa():
+        await asyncio.sleep(latencia_ia)
+        return "ok"
+
+    async def preguntar(uid, carril, r):
+        if limitador is not None and limitador.tomar(uid, carril):
+            r["frenados"] += 1
+            return
+        if control is not None and not control.admitir(carril):
+            r["cortados"] += 1
+            return
+        inicio = time.monotonic()
+        pedido = cola.enviar(carril, ia_falsa)
+        if pedido is None:
+            r["llena"] += 1
+            return
+        await pedido
+        dt = time.monotonic() - inicio
+        if control is not None:
+            control.observar(dt)
+        r["lat"].append(dt)
+
+    async def usuario(uid, carril, por_segundo, grupo, rnd):
+        # Que no arranquen todos en el mismo instante
+        await asyncio.sleep(rnd.random() / por_segundo)
+        fin = time.monotonic() + duracion
+        while time.monotonic() < fin:
+            pendientes.append(asyncio.create_task(preguntar(uid, carril, res[grupo])))
+            await asyncio.sleep(rnd.expovariate(por_segundo))
+
+    rnd = random.Random(3)
+    await asyncio.gather(*(usuario(*u, rnd) for u in usuarios))
+    await asyncio.gather(*pendientes)
+    await cola.detener()
+    return res
+
+
+def fila(nombre, grupo, r):
+    lat = r["lat"]
+    print(
+        f"{nombre:<22}{grupo:<10}{len(lat):>7}{percentil(lat, 0.5) * 1000:>9.0f}"
+        f"{percentil(lat, 0.95) * 1000:>9.0f}{r['frenados']:>10}{r['cortados']:>10}{r['llena']:>8}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duracion", type=float, default=10)
+    parser.add_argument("--latencia-ia", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    capacidad = args.workers / args.latencia_ia
+    print(f"IA: {args.latencia_ia * 1000:.0f} ms por pedido, {args.workers} workers = {capacidad:.0f} pedidos/s\n")
+    print(f"{'caso':<22}{'quién':<10}{'resp':>7}{'p50 ms':>9}{'p95 ms':>9}{'frenados':>10}{'cortados':>10}{'llena':>8}")
+
+    # Flood: 40 usuarios normales (40/s) + 1 usuario a 100/s
+    flood = [(u, "standard", 1.0, "normales") for u in range(1, 41)]
+    flood.append((999, "standard", 100.0, "abusador"))
+    for nombre, limitador in (
+        ("flood sin límite", None),
+        # ráfaga 5 y 2 por "minuto" (comprimido a segundo): un normal no se entera
+        ("flood con límite", LimitadorUsuarios({"standard": (5, 120), "plus": (10, 240)})),
+    ):
+        res = await simular(flood, args.duracion, args.latencia_ia, args.workers, limitador=limitador)
+        fila(nombre, "normales", res["normales"])
+        fila("", "abusador", res["abusador"])
+
+    # Pico: Standard pide 2x la capacidad, PLUS un 20%
+    pico = [(u, "standard", 2.0, "standard") for u in range(1, int(capacidad) + 1)]
+    pico += [(10_000 + u, "plus", 1.0, "plus") for u in range(int(capacidad * 0.2))]
+    for nombre, control in (
+        ("pico sin shedding", None),
+        ("pico con shedding", ControlCarga(slo=args.latencia_ia * 4, sonda=0.5)),
+    ):
+        res = await simular(pico, args.duracion, args.latencia_ia, args.workers, control=control)
+        fila(nombre, "plus", res["plus"])
+        fila("", "standard", res["standard"])
+        if control is not None:
+            print(f"{'':<22}EWMA final {control.ewma * 1000:.0f} ms, {control.episodios} picos")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""
+Memoria que ocupa MemoriaConversaciones por cada 10k usuarios activos.
+
+    python bench/bench_memoria.py --usuarios 10000 --turnos 6
+    python bench/bench_memoria.py --usuarios 100000 --max-mb 64
+"""
+import os
+import sys
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ia import MemoriaConversaciones  # noqa: E402
+
+PREGUNTAS = [
+    "tengo 800 dpi y juego en pc a 240 hz, qué sens me recomendás?",
+    "soy diamante en ranked, cómo llego a unreal?",
+    "cómo mejoro mis edits en box fights?",
+    "qué drop me conviene para cash cups en nae?",
+    "me tilteo mucho en endgame, tips?",
+    "armame una rutina de aim de 30 minutos",
+]
+RESPUESTA = (
+    "Para tu caso te recomiendo bajar un poco la sens y trabajar tracking 10 minutos, "
+    "después piece control y cerrar con realistics. Mantené la misma rutina una semana. "
+) * 6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usuarios", type=int, default=10_000)
+    parser.add_argument("--turnos", type=int, default=6)
+    parser.add_argument("--tokens", type=int, default=800)
+    parser.add_argument("--max-mb", type=float, default=0, help="tope de la memoria (0 = sin tope)")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb else 10**15
+    mem = MemoriaConversaciones(presupuesto=args.tokens, max_usuarios=10**9, max_bytes=max_bytes)
+    for uid in range(args.usuarios):
+        for _ in range(args.turnos):
+            # Textos nuevos en cada turno, como en la realidad (no comparten memoria)
+            p = random.choice(PREGUNTAS) + f" #{random.randint(0, 10**6)}"
+            mem.agregar(uid, p, RESPUESTA + str(uid))
+    usado = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    por_usuario = usado / len(mem)
+    print(
+        f"{args.usuarios} usuarios x {args.turnos} turnos, presupuesto {args.tokens} tokens, "
+        f"{len(mem)} conversaciones en memoria\n"
+        f"total {usado / 1e6:.1f} MB (estimado por la memoria: {mem.bytes / 1e6:.1f} MB) | "
+        f"{por_usuario / 1024:.2f} KB por usuario | "
+        f"{por_usuario * 10_000 / 1e6:.1f} MB cada 10k | {por_usuario * 100_000 / 1e6:.0f} MB para 100k"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Costo de las métricas en el camino caliente: un handler vacío con y sin
+medir_handler, y cuánto tarda armar /metrics con todos los handlers.
+
+    python bench/bench_metricas.py
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metricas import METRICAS, medir_handler  # noqa: E402
+
+
+async def vacio(update, context):
+    return None
+
+
+async def medir(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await fn(None, None)
+    return (time.perf_counter() - t0) / n * 1e9
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llamadas", type=int, default=200_000)
+    args = parser.parse_args()
+
+    medido = medir_handler(vacio)
+    await medir(vacio, 1000)
+    await medir(medido, 1000)
+    base = await medir(vacio, args.llamadas)
+    con = await medir(medido, args.llamadas)
+    print(f"handler vacío:        {base:7.0f} ns")
+    print(f"con medir_handler:    {con:7.0f} ns  (+{con - base:.0f} ns por update)")
+
+    # /metrics con 30 handlers con datos
+    for i in range(30):
+        h = medir_handler(vacio, f"handler_{i}")
+        for _ in range(100):
+            await h(None, None)
+    t0 = time.perf_counter()
+    texto = METRICAS.exponer()
+    print(f"/metrics ({len(texto.splitlines())} líneas): {(time.perf_counter() - t0) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Chequeos premium por segundo: el camino viejo (leer premium_users.json +
+strptime en cada llamada) contra IndicePremium.
+
+    python bench/bench_premium.py --n 10000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from almacenamiento import cargar_json, guardar_json  # noqa: E402
+from indices import IndicePremium  # noqa: E402
+
+
+def vencio_premium(fecha_str):
+    if not fecha_str:
+        return False
+    return datetime.strptime(fecha_str, "%Y-%m-%d") < datetime.now()
+
+
+def es_premium_viejo(path, user_id):
+    premium = cargar_json(path, {})
+    uid = str(user_id)
+    if uid not in premium:
+        return False
+    entry = premium[uid]
+    if isinstance(entry, str):
+        return not vencio_premium(entry)
+    if entry.get("lifetime"):
+        return True
+    exp = entry.get("exp")
+    if not exp:
+        return False
+    return not vencio_premium(exp)
+
+
+def premium_falso(n):
+    data = {}
+    for i in range(n):
+        uid = str(1_000_000 + i)
+        r = i % 4
+        if r == 0:
+            data[uid] = "2031-01-01"
+        elif r == 1:
+            data[uid] = {"lifetime": True, "exp": None, "plan": "plus"}
+        elif r == 2:
+            data[uid] = {"lifetime": False, "exp": "2020-01-01", "plan": "standard"}
+        else:
+            data[uid] = {"lifetime": False, "exp": "2031-01-01", "plan": "plus"}
+    return data
+
+
+def por_segundo(fn, ids, segundos=1.0):
+    hechos = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < segundos:
+        for uid in ids:
+            fn(uid)
+        hechos += len(ids)
+    return hechos / (time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=10_000)
+    args = parser.parse_args()
+
+    data = premium_falso(args.n)
+    # mitad usuarios premium, mitad que no están en el archivo
+    ids = [random.randint(1_000_000, 1_000_000 + 2 * args.n) for _ in range(1000)]
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "premium_users.json")
+        guardar_json(path, data)
+        antes = por_segundo(lambda u: es_premium_viejo(path, u), ids[:20])
+
+        idx = IndicePremium()
+        idx.cargar(data)
+        # Mismo resultado que el camino viejo
+        assert all(idx.es_premium(u) == es_premium_viejo(path, u) for u in ids[:50])
+
+    despues = por_segundo(idx.es_premium, ids)
+
+    print(f"{args.n} entradas premium")
+    print(f"antes  (archivo + strptime): {antes:14,.0f} chequeos/s")
+    print(f"después (IndicePremium):     {despues:14,.0f} chequeos/s  (x{despues / antes:,.0f})")
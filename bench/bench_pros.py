@@ -0,0 +1,126 @@
+"""
+Búsqueda de pros en un mensaje: el loop viejo (un `alias in texto` por
+cada alias de cada pro) contra BuscadorAlias (un regex compilado + índice
+de trigramas para typos).
+
+    python bench/bench_pros.py --pros 500
+
+Al final corre los alias reales de PRO_SENS contra palabras comunes que
+se parecen a un pro ("veneno", "los pollos hermanos"): ninguna tiene que
+matchear. Sale con código 1 si alguna matchea.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indices import BuscadorAlias  # noqa: E402
+
+CONSONANTES = "bcdfghjklmnprstvxz"
+VOCALES = "aeiou"
+
+MENSAJES_COMUNES = [
+    "como mejoro mi aim con escopeta en box fights",
+    "que config de pc me recomendas para tener mas fps",
+    "armame una rutina de 30 minutos para edits",
+    "hola buenas, quiero saber donde droppear en la nueva season",
+]
+
+
+# Mensajes sin ningún pro que se parecen a un alias real
+FALSOS_AMIGOS = [
+    "tengo veneno en la escopeta?",
+    "como le gano a un venom en box fights",
+    "juego como los pollos hermanos",
+    "el clima esta epico hoy",
+    "quiero ser una persona mas constante",
+    "soy un savage en zone wars",
+    "que tal juega tyson fury",
+    "cual es el mejor bug para farmear",
+]
+# Typos de alias reales que sí tienen que encontrarse
+TYPOS_REALES = ["sens de peterbott", "config de mrsavag", "sens de taysom", "sens de epikwale", "sens de petterbot"]
+
+
+def pros_falsos(n, rnd):
+    pros = {}
+    while len(pros) < n:
+        # Nicks tipo "Zakorin": consonante + vocal, 2 a 4 sílabas
+        nombre = "".join(rnd.choice(CONSONANTES) + rnd.choice(VOCALES) for _ in range(rnd.randint(2, 4)))
+        pros[nombre] = {"aliases": [nombre, nombre[:3] + " " + nombre[3:]]}
+    return pros
+
+
+def buscar_viejo(pros, texto):
+    low = texto.lower()
+    for key, data in pros.items():
+        for alias in data["aliases"]:
+            if alias in low:
+                return key
+    return None
+
+
+def typo(nombre, rnd):
+    i = rnd.randrange(len(nombre))
+    return nombre[:i] + nombre[i] + nombre[i:]  # letra repetida
+
+
+def medir(fn, mensajes, repeticiones):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        for m in mensajes:
+            fn(m)
+    return (time.perf_counter() - t0) / (repeticiones * len(mensajes)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pros", type=int, default=500)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+    rnd = random.Random(7)
+
+    pros = pros_falsos(args.pros, rnd)
+    t0 = time.perf_counter()
+    buscador = BuscadorAlias({k: d["aliases"] for k, d in pros.items()})
+    print(f"{args.pros} pros, índice armado en {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    nombres = list(pros)
+    casos = {
+        "sin pro": MENSAJES_COMUNES,
+        "exacto": [f"pasame la sens de {rnd.choice(nombres)} porfa" for _ in range(20)],
+        "typo": [f"pasame la sens de {typo(rnd.choice(nombres), rnd)} porfa" for _ in range(20)],
+    }
+
+    print(f"{'caso':<10}{'viejo µs':>10}{'nuevo µs':>10}{'acierto viejo':>15}{'acierto nuevo':>15}")
+    for caso, mensajes in casos.items():
+        viejo = medir(lambda m: buscar_viejo(pros, m), mensajes, args.repeticiones)
+        nuevo = medir(buscador.buscar, mensajes, args.repeticiones)
+        if caso == "sin pro":
+            ok_v = sum(buscar_viejo(pros, m) is None for m in mensajes)
+            ok_n = sum(buscador.buscar(m) is None for m in mensajes)
+        else:
+            ok_v = sum(buscar_viejo(pros, m) is not None for m in mensajes)
+            ok_n = sum(buscador.buscar(m) is not None for m in mensajes)
+        print(f"{caso:<10}{viejo:>10.1f}{nuevo:>10.1f}{ok_v:>10}/{len(mensajes):<4}{ok_n:>10}/{len(mensajes):<4}")
+
+    # Alias reales del bot
+    from _fakes import preparar_entorno
+
+    preparar_entorno()
+    import bot
+
+    reales = bot.buscador_pros
+    malos = [(m, reales.buscar(m)) for m in FALSOS_AMIGOS if reales.buscar(m) is not None]
+    typos = sum(reales.buscar(m) is not None for m in TYPOS_REALES)
+    print(f"\nalias reales: falsos amigos que matchean {len(malos)}/{len(FALSOS_AMIGOS)}, typos encontrados {typos}/{len(TYPOS_REALES)}")
+    for m, (clave, score) in malos:
+        print(f"  ⚠️ {m!r} -> {clave} ({score})")
+    sys.exit(1 if malos else 0)
+
+
+if __name__ == "__main__":
+    main()
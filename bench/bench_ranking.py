@@ -0,0 +1,71 @@
+"""
+Puesto y top K por XP: ordenar todo xp_users.json (lo que hacía
+competencia, y lo que haría falta para un puesto en /perfil) contra
+RankingXP (SortedList actualizado en cada add_xp).
+
+    python bench/bench_ranking.py --n 100000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indices import RankingXP  # noqa: E402
+
+
+def puesto_ordenando(xp_data, uid):
+    orden = sorted(xp_data.items(), key=lambda x: x[1], reverse=True)
+    xp = xp_data[uid]
+    return sum(1 for _, v in orden if v > xp) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--consultas", type=int, default=1000)
+    args = parser.parse_args()
+    rnd = random.Random(3)
+
+    xp_data = {str(1_000_000 + i): int(rnd.paretovariate(1.2) * 10) for i in range(args.n)}
+    ids = list(xp_data)
+
+    t0 = time.perf_counter()
+    r = RankingXP()
+    r.cargar(xp_data)
+    print(f"N={args.n}: RankingXP armado en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    muestra = rnd.sample(ids, 5)
+    t0 = time.perf_counter()
+    viejos = [puesto_ordenando(xp_data, u) for u in muestra]
+    viejo = (time.perf_counter() - t0) / len(muestra)
+    assert viejos == [r.puesto(u) for u in muestra]
+
+    consultas = [rnd.choice(ids) for _ in range(args.consultas)]
+    t0 = time.perf_counter()
+    for u in consultas:
+        r.puesto(u)
+    puesto = (time.perf_counter() - t0) / len(consultas)
+
+    t0 = time.perf_counter()
+    sorted(xp_data.items(), key=lambda x: x[1], reverse=True)[:3]
+    top_viejo = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(args.consultas):
+        r.top(3)
+    top_nuevo = (time.perf_counter() - t0) / args.consultas
+
+    t0 = time.perf_counter()
+    for u in consultas:
+        r.sumar(u, 5)
+    sumar = (time.perf_counter() - t0) / len(consultas)
+
+    print(f"  puesto:   ordenando {viejo * 1000:8.1f} ms   RankingXP {puesto * 1e6:6.1f} µs")
+    print(f"  top 3:    ordenando {top_viejo * 1000:8.1f} ms   RankingXP {top_nuevo * 1e6:6.1f} µs")
+    print(f"  add_xp:   costo extra del ranking {sumar * 1e6:.1f} µs por suma")
+
+
+if __name__ == "__main__":
+    main()
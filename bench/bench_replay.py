@@ -0,0 +1,372 @@
+"""
+Replay de updates sintéticos contra la Application de bot.py (la misma
+que arma construir_app) sin Telegram ni OpenAI: un ExtBot falso anota
+todo lo que el bot manda y un cliente OpenAI falso contesta con la
+latencia que se le pida.
+
+    python bench/bench_replay.py --mezcla general --updates 3000 --ritmo 200
+    python bench/bench_replay.py --mezcla ia --latencia-ia 800 --salida ia.json
+    python bench/bench_replay.py --mezcla ia --latencia-ia 800 --comparar ia.json
+    python bench/bench_replay.py --concurrentes 1   # como PTB por defecto, para comparar
+
+Mide desde que el update entra a la cola de la Application hasta que
+terminó su handler: p50/p95/p99 por tipo y en total, y updates por
+segundo. Con --salida guarda el resultado en JSON; con --comparar lo
+compara contra uno anterior. Corre en un directorio temporal, así que no
+toca los .json del bot.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import importlib
+from types import SimpleNamespace
+from collections import Counter, defaultdict
+
+from telegram import Update
+from telegram.ext import ExtBot, TypeHandler
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ADMIN_ID = 1
+USUARIO_BOT = {"id": 42, "is_bot": True, "first_name": "Coach", "username": "coach_falso_bot"}
+
+# tipo -> peso, por mezcla
+MEZCLAS = {
+    "general": {"saludo": 20, "sens": 15, "menu": 20, "boton": 25, "ia": 15, "stats": 1},
+    "menu": {"menu": 50, "boton": 50},
+    "ia": {"ia": 100},
+    "sens": {"sens": 100},
+    "admin": {"stats": 100},
+}
+BOTONES = ["cfg", "sens", "combos", "duo", "mento"]
+TEMAS = ["aim", "edits", "box fights", "rotaciones", "sensibilidad", "endgame"]
+
+
+# ==========================
+#   TELEGRAM Y OPENAI FALSOS
+# ==========================
+
+
+class BotFalso(ExtBot):
+    """ExtBot que no sale a la red: cuenta cada método y devuelve un Message."""
+
+    def __init__(self, latencia: float = 0.0):
+        super().__init__(token="123:falso")
+        # Bot queda congelado después del __init__ (TelegramObject)
+        with self._unfrozen():
+            self.latencia = latencia
+            self.llamadas = Counter()
+            self._message_id = 0
+
+    async def _do_post(self, endpoint, data, **kwargs):
+        self.llamadas[endpoint] += 1
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        if endpoint == "getMe":
+            return USUARIO_BOT
+        if endpoint in ("sendMessage", "editMessageText", "sendPhoto"):
+            self._message_id += 1
+            return {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id") or 0), "type": "private"},
+                "from": USUARIO_BOT,
+                "text": str(data.get("text", "")),
+            }
+        return True
+
+
+class OpenAIFalso:
+    """
+    Lo que usa ClienteIA de AsyncOpenAI (chat.completions.create), con
+    latencia lognormal alrededor de `latencia` y texto en trozos si es stream.
+    """
+
+    def __init__(self, latencia: float, dispersion: float = 0.5, largo: int = 600, seed: int = 1):
+        self.latencia = latencia
+        self.dispersion = dispersion
+        self.largo = largo
+        self.rnd = random.Random(seed)
+        self.pedidos = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _demora(self):
+        if not self.latencia:
+            return 0.0
+        return self.latencia * self.rnd.lognormvariate(0, self.dispersion)
+
+    async def _create(self, model, messages, stream=False, **kwargs):
+        self.pedidos += 1
+        texto = ("Trabajá el crosshair placement y hacé 10 minutos de edits por día. " * 20)[: self.largo]
+        uso = {"prompt_tokens": sum(len(m["content"]) for m in messages) // 4, "completion_tokens": len(texto) // 4}
+        if not stream:
+            await asyncio.sleep(self._demora())
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=texto))],
+                usage=SimpleNamespace(**uso),
+            )
+        return self._stream(texto, uso)
+
+    async def _stream(self, texto, uso):
+        demora = self._demora()
+        # Primer token al 30% del total, el resto en 10 trozos
+        await asyncio.sleep(demora * 0.3)
+        paso = max(1, len(texto) // 10)
+        for i in range(0, len(texto), paso):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=texto[i : i + paso]))], usage=None)
+            await asyncio.sleep(demora * 0.07)
+        yield SimpleNamespace(choices=[], usage=uso)
+
+
+# ==========================
+#   UPDATES SINTÉTICOS
+# ==========================
+
+
+def _usuario(uid):
+    return {"id": uid, "is_bot": False, "first_name": f"Jugador{uid}"}
+
+
+def _mensaje(update_id, uid, texto):
+    msg = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": uid, "type": "private"},
+        "from": _usuario(uid),
+        "text": texto,
+    }
+    if texto.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(texto.split()[0])}]
+    return {"update_id": update_id, "message": msg}
+
+
+def _boton(update_id, uid, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _usuario(uid),
+            "chat_instance": str(uid),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": uid, "type": "private"},
+                "from": USUARIO_BOT,
+                "text": "menú",
+            },
+        },
+    }
+
+
+def generar(mezcla, n, usuarios, premium, rnd):
+    """[(tipo, dict de update)]: los de IA salen de usuarios premium."""
+    tipos = list(MEZCLAS[mezcla])
+    pesos = [MEZCLAS[mezcla][t] for t in tipos]
+    comunes = range(ADMIN_ID + 1, ADMIN_ID + 1 + usuarios)
+    res = []
+    for update_id in range(1, n + 1):
+        tipo = rnd.choices(tipos, pesos)[0]
+        uid = rnd.choice(premium) if tipo == "ia" else rnd.choice(comunes)
+        if tipo == "saludo":
+            u = _mensaje(update_id, uid, rnd.choice(["hola coach", "buenas", "hola!"]))
+        elif tipo == "sens":
+            u = _mensaje(update_id, uid, "pasame la sens de peterbot")
+        elif tipo == "menu":
+            u = _mensaje(update_id, uid, "/menu")
+        elif tipo == "boton":
+            u = _boton(update_id, uid, rnd.choice(BOTONES))
+        elif tipo == "ia":
+            # Preguntas distintas para que no las conteste la cache
+            u = _mensaje(update_id, uid, f"como mejoro mis {rnd.choice(TEMAS)} si juego {update_id} horas")
+        else:
+            u = _mensaje(update_id, ADMIN_ID, "/stats")
+        res.append((tipo, u))
+    return res
+
+
+# ==========================
+#   CORRIDA
+# ==========================
+
+
+def percentiles(valores):
+    if not valores:
+        return {"n": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    orden = sorted(valores)
+
+    def p(q):
+        return round(orden[min(len(orden) - 1, int(len(orden) * q))] * 1000, 2)
+
+    return {"n": len(orden), "p50_ms": p(0.5), "p95_ms": p(0.95), "p99_ms": p(0.99)}
+
+
+async def correr(args):
+    bot = importlib.import_module("bot")
+    rnd = random.Random(args.seed)
+
+    falso = BotFalso(latencia=args.latencia_telegram / 1000)
+    if not args.openai_url:
+        bot.ia.client = OpenAIFalso(latencia=args.latencia_ia / 1000, seed=args.seed)
+    if not args.limite:
+        # Medimos handlers, no el límite por usuario
+        bot.limitador_ia.planes = {p: (1e9, 1e9) for p in bot.limitador_ia.planes}
+
+    premium = list(range(1_000_000, 1_000_000 + max(1, args.usuarios // 5)))
+    for i, uid in enumerate(premium):
+        plan = "plus" if i % 2 else "standard"
+        bot.set_premium(uid, {"lifetime": True, "exp": None, "plan": plan})
+
+    if args.concurrentes:
+        bot.UPDATES_CONCURRENTES = args.concurrentes
+    app = bot.construir_app(updater=False, jobs=False, bot=falso)
+
+    inyectado = {}
+    tipos = {}
+    latencias = defaultdict(list)
+    terminados = asyncio.Event()
+    errores = Counter()
+    total = args.updates
+    hechos = [0]
+
+    async def fin_de_update(update, context):
+        # Grupo aparte, después del handler que atendió el update
+        t = time.perf_counter() - inyectado.pop(update.update_id)
+        latencias[tipos.pop(update.update_id)].append(t)
+        hechos[0] += 1
+        if hechos[0] >= total:
+            terminados.set()
+
+    async def al_fallar(update, context):
+        errores[type(context.error).__name__] += 1
+
+    app.add_handler(TypeHandler(Update, fin_de_update), group=99)
+    app.add_error_handler(al_fallar)
+
+    updates = generar(args.mezcla, total, args.usuarios, premium, rnd)
+    async with app:
+        await app.start()
+        t0 = time.perf_counter()
+        for i, (tipo, data) in enumerate(updates):
+            if args.ritmo:
+                espera = t0 + i / args.ritmo - time.perf_counter()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+            update = Update.de_json(data, falso)
+            tipos[update.update_id] = tipo
+            inyectado[update.update_id] = time.perf_counter()
+            await app.update_queue.put(update)
+        try:
+            await asyncio.wait_for(terminados.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ timeout: quedaron {len(inyectado)} updates sin terminar")
+        duracion = time.perf_counter() - t0
+        await app.stop()
+    await bot.al_apagar(app)
+
+    todas = [x for v in latencias.values() for x in v]
+    return {
+        "mezcla": args.mezcla,
+        "updates": total,
+        "usuarios": args.usuarios,
+        "ritmo": args.ritmo,
+        "latencia_ia_ms": args.latencia_ia,
+        "latencia_telegram_ms": args.latencia_telegram,
+        "concurrentes": bot.UPDATES_CONCURRENTES,
+        "limite": args.limite,
+        "duracion_s": round(duracion, 3),
+        "updates_por_seg": round(len(todas) / duracion, 1),
+        "total": percentiles(todas),
+        "por_tipo": {t: percentiles(v) for t, v in sorted(latencias.items())},
+        "llamadas_telegram": dict(falso.llamadas),
+        "pedidos_ia": getattr(bot.ia.client, "pedidos", None),
+        "openai_url": args.openai_url,
+        "errores": dict(errores),
+        "python": platform.python_version(),
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def imprimir(res):
+    print(
+        f"mezcla {res['mezcla']}: {res['updates']} updates, {res['usuarios']} usuarios, "
+        f"ritmo {res['ritmo'] or 'máximo'}, IA {res['openai_url'] or str(res['latencia_ia_ms']) + ' ms'}, "
+        f"{res['concurrentes']} a la vez\n"
+    )
+    print(f"{'tipo':<10}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for tipo, p in list(res["por_tipo"].items()) + [("TOTAL", res["total"])]:
+        print(f"{tipo:<10}{p['n']:>7}{p['p50_ms']:>10}{p['p95_ms']:>10}{p['p99_ms']:>10}")
+    print(f"\n{res['updates_por_seg']} updates/s en {res['duracion_s']} s")
+    print(f"Telegram: {res['llamadas_telegram']}  IA: {res['pedidos_ia'] or '?'} pedidos")
+    if res["errores"]:
+        print(f"⚠️ errores en handlers: {res['errores']}")
+
+
+def comparar(res, previo):
+    print(f"\nContra {previo.get('fecha', '?')}:")
+    filas = [("updates/s", previo["updates_por_seg"], res["updates_por_seg"], True)]
+    for clave in ("p50_ms", "p95_ms", "p99_ms"):
+        filas.append((f"total {clave}", previo["total"][clave], res["total"][clave], False))
+    for nombre, antes, ahora, mas_es_mejor in filas:
+        if not antes or ahora is None:
+            continue
+        cambio = (ahora - antes) / antes * 100
+        peor = cambio < -5 if mas_es_mejor else cambio > 5
+        print(f"  {nombre:<14}{antes:>10}{ahora:>10}{cambio:>+9.1f}%{'  ⚠️' if peor else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mezcla", choices=sorted(MEZCLAS), default="general")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--usuarios", type=int, default=500)
+    parser.add_argument("--ritmo", type=float, default=0, help="updates/s (0 = todo junto)")
+    parser.add_argument("--latencia-ia", type=float, default=800, help="ms, mediana")
+    parser.add_argument(
+        "--openai-url", help="usar el ClienteIA de verdad contra este servidor (ej. bench/fake_openai.py)"
+    )
+    parser.add_argument("--latencia-telegram", type=float, default=0, help="ms por llamada")
+    parser.add_argument(
+        "--concurrentes", type=int, help="UPDATES_CONCURRENTES del bot (default: el de bot.py; 1 = de a uno)"
+    )
+    parser.add_argument("--limite", action="store_true", help="dejar activo el límite por usuario")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--salida")
+    parser.add_argument("--comparar")
+    args = parser.parse_args()
+
+    # Estado del bot en un directorio descartable, sin red ni métricas
+    for clave, valor in {
+        "TELEGRAM_BOT_TOKEN": "123:falso",
+        "ADMIN_ID": str(ADMIN_ID),
+        "OPENAI_API_KEY": "sk-falso",
+        "METRICS_PORT": "0",
+    }.items():
+        os.environ.setdefault(clave, valor)
+    if args.openai_url:
+        os.environ["OPENAI_BASE_URL"] = args.openai_url
+    salida = os.path.abspath(args.salida) if args.salida else None
+    previo = os.path.abspath(args.comparar) if args.comparar else None
+    os.chdir(tempfile.mkdtemp(prefix="bench_replay_"))
+
+    res = asyncio.run(correr(args))
+    imprimir(res)
+    if previo:
+        with open(previo, encoding="utf-8") as f:
+            comparar(res, json.load(f))
+    if salida:
+        with open(salida, "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+        print(f"\nGuardado en {salida}")
+
+
+if __name__ == "__main__":
+    main()
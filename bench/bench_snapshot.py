@@ -0,0 +1,80 @@
+"""
+Snapshot de premium_users.json: escritura vieja (indent=4, "w" directo)
+contra el writer atómico en JSON compacto y en msgpack.
+
+    python bench/bench_snapshot.py --n 1000000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import almacenamiento  # noqa: E402
+from almacenamiento import guardar_json, cargar_json  # noqa: E402
+
+
+def guardar_viejo(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def cargar_viejo(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def premium_falso(n):
+    data = {}
+    for i in range(n):
+        uid = str(5_000_000_000 + i)
+        if i % 5 == 0:
+            data[uid] = "2025-12-20"  # formato viejo
+        elif i % 7 == 0:
+            data[uid] = {"lifetime": True, "exp": None, "plan": "plus"}
+        else:
+            data[uid] = {"lifetime": False, "exp": "2026-03-01", "plan": "standard"}
+    return data
+
+
+def medir(nombre, guardar, cargar, path, data):
+    t0 = time.perf_counter()
+    guardar(path, data)
+    t_w = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    leido = cargar(path)
+    t_r = time.perf_counter() - t0
+    assert leido == data
+    mb = os.path.getsize(path) / 1e6
+    print(f"{nombre:<22} escribir={t_w * 1000:8.0f} ms  leer={t_r * 1000:8.0f} ms  tamaño={mb:7.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    data = premium_falso(args.n)
+    print(f"{args.n} entradas premium")
+    with tempfile.TemporaryDirectory() as d:
+        medir("viejo (indent=4)", guardar_viejo, cargar_viejo, os.path.join(d, "a.json"), data)
+        medir(
+            "atómico json compacto",
+            lambda p, x: guardar_json(p, x, formato="json"),
+            lambda p: cargar_json(p, None),
+            os.path.join(d, "b.json"),
+            data,
+        )
+        if almacenamiento.msgpack is not None:
+            medir(
+                "atómico msgpack",
+                lambda p, x: guardar_json(p, x, formato="msgpack"),
+                lambda p: cargar_json(p, None),
+                os.path.join(d, "c.json"),
+                data,
+            )
+        else:
+            print("msgpack no instalado: se omite")
@@ -0,0 +1,55 @@
+"""
+Tiempo hasta el primer texto visible: respuesta completa (reply_text al
+final) contra streaming con ediciones progresivas.
+
+    python bench/bench_streaming.py --latencia 0.5 --tokens-por-seg 60 --caracteres 1500
+"""
+import time
+import asyncio
+import argparse
+
+from _fakes import preparar_entorno, update_texto, BotFalso, contexto, OpenAIFalso
+
+
+async def una_pregunta(bot_mod, uid):
+    enviados = []
+    upd = update_texto(uid, "armame una rutina de aim para 30 minutos", enviados)
+    t0 = time.perf_counter()
+    await bot_mod.handle_message(upd, contexto(BotFalso()))
+    total = time.perf_counter() - t0
+    primero = enviados[0][0] - t0 if enviados else float("nan")
+    return primero, total, len(enviados)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latencia", type=float, default=0.5, help="segundos hasta el primer token")
+    parser.add_argument("--tokens-por-seg", type=float, default=60)
+    parser.add_argument("--caracteres", type=int, default=1500)
+    args = parser.parse_args()
+
+    preparar_entorno(premium={"500": {"lifetime": True, "exp": None, "plan": "standard"}})
+    import bot as bot_mod
+
+    bot_mod.ia.client = OpenAIFalso(
+        latencia=args.latencia,
+        respuesta=("Hacé 10 minutos de tracking y 10 de flicks. " * 100)[: args.caracteres],
+        tokens_por_seg=args.tokens_por_seg,
+    )
+
+    async def ambos():
+        for streaming in (False, True):
+            bot_mod.IA_STREAMING = streaming
+            bot_mod.cache_ia = bot_mod.CacheRespuestas(max_items=0)
+            primero, total, mensajes = await una_pregunta(bot_mod, 500)
+            modo = "streaming" if streaming else "completa "
+            print(
+                f"{modo}: primer texto visible {primero * 1000:7.0f} ms | "
+                f"respuesta terminada {total * 1000:7.0f} ms | envíos+ediciones {mensajes}"
+            )
+
+    # Un solo event loop: la cola IA arranca sus workers en el primero que la usa
+    asyncio.run(ambos())
+
+if __name__ == "__main__":
+    main()
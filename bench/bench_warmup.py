@@ -0,0 +1,84 @@
+"""
+Duración del job de warm-up diario: el camino viejo (recorrer
+premium_users.json y llamar a es_premium, que relee el archivo en cada
+entrada) contra una pasada por premium_idx.activos() en cada tanda (las programa
+la agenda, ver agenda.py).
+
+    python bench/bench_warmup.py --n 10000
+    python bench/bench_warmup.py --n 100000
+
+El envío en sí queda acotado por DIFUSION_POR_SEGUNDO (N / 30 segundos
+como mínimo); acá se mide el costo propio del job con un bot falso y un
+bucket sin límite.
+"""
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from types import SimpleNamespace
+
+from _fakes import preparar_entorno, BotFalso
+from bench_premium import es_premium_viejo, premium_falso
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=10000, help="entradas en premium_users.json")
+    parser.add_argument("--muestra", type=int, default=20, help="chequeos viejos a medir (se extrapola)")
+    args = parser.parse_args()
+
+    premium = premium_falso(args.n)
+    preparar_entorno(premium=premium)
+    import bot as bot_mod
+    from difusion import TokenBucket
+
+    # Viejo: N chequeos, cada uno relee el archivo entero
+    ids = list(premium)[: args.muestra]
+    t0 = time.perf_counter()
+    for uid in ids:
+        es_premium_viejo(bot_mod.PREMIUM_FILE, int(uid))
+    por_chequeo = (time.perf_counter() - t0) / len(ids)
+    print(f"N={args.n}")
+    print(f"  viejo: {por_chequeo * 1000:.1f} ms por entrada -> job ≈ {por_chequeo * args.n:.0f} s (extrapolado)")
+
+    # Nuevo: una pasada por tanda (la agenda llama al job una vez por tanda)
+    bot = BotFalso()
+    app = SimpleNamespace(bot=bot, create_task=asyncio.ensure_future)
+    base = datetime.now().replace(hour=bot_mod.WARMUP_HORA, minute=0, second=0, microsecond=0)
+    contextos = [
+        SimpleNamespace(
+            bot=bot,
+            application=app,
+            job=SimpleNamespace(data={"base": base, "tanda": i, "tandas": bot_mod.WARMUP_TANDAS}),
+        )
+        for i in range(bot_mod.WARMUP_TANDAS)
+    ]
+
+    async def nuevo():
+        # Envío de todas las tandas sin tope de velocidad: costo por mensaje
+        bot_mod.limitador_envios = TokenBucket(por_segundo=1e9, rafaga=10**9)
+        destinatarios = sum(1 for _ in bot_mod.premium_idx.activos())
+        t0 = time.perf_counter()
+        for ctx in contextos:
+            await bot_mod.enviar_warmup_diario(ctx)
+        planificar = time.perf_counter() - t0
+        print(
+            f"  nuevo: {len(contextos)} tandas en {planificar * 1000:.1f} ms "
+            f"({destinatarios} activos, una tanda cada {bot_mod.WARMUP_VENTANA_MIN / bot_mod.WARMUP_TANDAS:.0f} min)"
+        )
+
+        t0 = time.perf_counter()
+        while len(bot.enviados) < destinatarios:
+            await asyncio.sleep(0.01)
+        envio = time.perf_counter() - t0
+        print(
+            f"  envío: {envio:.2f} s para {len(bot.enviados)} mensajes "
+            f"({envio / len(bot.enviados) * 1e6:.0f} µs c/u); con Telegram real el piso es "
+            f"{destinatarios / bot_mod.DIFUSION_POR_SEGUNDO / 60:.0f} min a {bot_mod.DIFUSION_POR_SEGUNDO:.0f} msg/s"
+        )
+
+    asyncio.run(nuevo())
+
+
+if __name__ == "__main__":
+    main()
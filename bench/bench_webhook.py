@@ -0,0 +1,158 @@
+"""
+Polling contra webhook sobre el mismo flujo de updates sintéticos: levanta
+la Bot API falsa (fake_telegram.py), corre bot.py como proceso aparte en
+cada modo y mide desde que el update "llega a Telegram" hasta que el bot
+contesta con sendMessage.
+
+    python bench/bench_webhook.py --updates 300 --por-segundo 50
+
+Dos fases por modo: a ritmo fijo (latencia p50/p95/p99) y en ráfaga
+(todo junto: updates por segundo que saca el bot).
+"""
+import os
+import sys
+import time
+import signal
+import tempfile
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_telegram import TelegramFalso, crear_servidor, update_mensaje
+from webhook_replay import postear
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "bench-secret"
+
+
+def percentil(valores, p):
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(len(orden) * p))]
+
+
+def puerto_libre():
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def lanzar_bot(modo, api_url, puerto_webhook):
+    env = dict(os.environ)
+    env.update(
+        TELEGRAM_BOT_TOKEN="123:falso",
+        ADMIN_ID="1",
+        OPENAI_API_KEY="sk-falso",
+        TELEGRAM_API_URL=api_url,
+        BOT_MODE=modo,
+        WEBHOOK_URL=f"http://127.0.0.1:{puerto_webhook}",
+        WEBHOOK_SECRET=SECRET,
+        WEBHOOK_LISTEN="127.0.0.1",
+        PORT=str(puerto_webhook),
+    )
+    return subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, "bot.py")],
+        cwd=tempfile.mkdtemp(prefix="bench_webhook_"),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+
+def esperar_listo(falso, modo, url_webhook, segundos=30):
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        if modo == "polling" and falso.llamadas.get("getUpdates"):
+            return True
+        if modo == "webhook" and falso.webhook:
+            try:
+                postear(url_webhook, {"update_id": 0}, "no")
+                return True
+            except OSError:
+                pass
+        time.sleep(0.1)
+    return False
+
+
+def correr_fase(falso, modo, url_webhook, updates, por_segundo, base_chat):
+    """Manda los updates y devuelve (latencias, duración total)."""
+    enviados = {}
+    inicio_respuestas = len(falso.respuestas)
+    pool = ThreadPoolExecutor(max_workers=40)  # como max_connections de Telegram
+
+    t0 = time.monotonic()
+    for i in range(updates):
+        chat = base_chat + i
+        update = update_mensaje(base_chat + i, chat, "/menu")
+        if por_segundo:
+            espera = t0 + i / por_segundo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+        enviados[chat] = time.monotonic()
+        if modo == "polling":
+            falso.encolar(update)
+        else:
+            pool.submit(postear, url_webhook, update, SECRET)
+
+    fin = time.monotonic() + 60
+    while time.monotonic() < fin:
+        respondidos = {c for _, _, c in falso.respuestas[inicio_respuestas:] if c in enviados}
+        if len(respondidos) >= updates:
+            break
+        time.sleep(0.02)
+    pool.shutdown(wait=False)
+
+    primera = {}
+    for t, _, chat in falso.respuestas[inicio_respuestas:]:
+        if chat in enviados and chat not in primera:
+            primera[chat] = t
+    latencias = [(primera[c] - enviados[c]) * 1000 for c in primera]
+    duracion = max(primera.values()) - t0 if primera else float("nan")
+    return latencias, duracion, len(primera)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--por-segundo", type=float, default=50)
+    args = parser.parse_args()
+
+    falso = TelegramFalso()
+    servidor = crear_servidor(falso)
+    api_url = f"http://127.0.0.1:{servidor.server_address[1]}"
+
+    print(f"{args.updates} updates /menu por fase\n")
+    print(f"{'modo':<9}{'fase':<10}{'ok':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'upd/s':>9}")
+    for n, modo in enumerate(("polling", "webhook")):
+        puerto = puerto_libre()
+        url_webhook = f"http://127.0.0.1:{puerto}/telegram"
+        bot = lanzar_bot(modo, api_url, puerto)
+        try:
+            if not esperar_listo(falso, modo, url_webhook):
+                print(f"{modo}: el bot no arrancó\n{bot.stderr.read().decode()[-2000:]}")
+                continue
+            if modo == "webhook":
+                status, _ = postear(url_webhook, {"update_id": 0}, "secreto-incorrecto")
+                assert status == 403, f"secret incorrecto debería dar 403, dio {status}"
+            for fase, ritmo in (("ritmo", args.por_segundo), ("ráfaga", 0)):
+                base = 1_000_000 * (n * 2 + (fase == "ráfaga") + 1)
+                lat, dur, ok = correr_fase(falso, modo, url_webhook, args.updates, ritmo, base)
+                if not lat:
+                    print(f"{modo:<9}{fase:<10}{0:>6}")
+                    continue
+                print(
+                    f"{modo:<9}{fase:<10}{ok:>6}{percentil(lat, 0.5):>9.1f}{percentil(lat, 0.95):>9.1f}"
+                    f"{percentil(lat, 0.99):>9.1f}{ok / dur:>9.0f}"
+                )
+        finally:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
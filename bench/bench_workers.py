@@ -0,0 +1,101 @@
+"""
+Updates por segundo del pool de workers (trabajadores.py) con 1, 2, 4 y 8
+procesos contra la Bot API falsa (fake_telegram.py), todo en SQLite.
+
+    python bench/bench_workers.py --updates 2000 --latencia-ms 50
+
+La carga mezcla /menu, /perfil, saludos y búsquedas de sens de pros, con
+chats distintos. --latencia-ms simula lo que tarda Telegram en contestar
+cada sendMessage: con un solo proceso los updates se atienden de a uno y
+esa espera se suma; con varios se superpone.
+"""
+import os
+import sys
+import time
+import signal
+import tempfile
+import argparse
+import subprocess
+
+from fake_telegram import TelegramFalso, crear_servidor, update_mensaje
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEXTOS = ["/menu", "/perfil", "hola coach", "pasame la sens de peterbot", "/ranking"]
+
+
+def lanzar_pool(n, api_url):
+    env = dict(os.environ)
+    env.update(
+        TELEGRAM_BOT_TOKEN="123:falso",
+        ADMIN_ID="1",
+        OPENAI_API_KEY="sk-falso",
+        TELEGRAM_API_URL=api_url,
+        STORAGE_BACKEND="sqlite",
+        BOT_WORKERS=str(n),
+        POLL_TIMEOUT="1",
+        PYTHONPATH=RAIZ,
+    )
+    return subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, "trabajadores.py")],
+        cwd=tempfile.mkdtemp(prefix="bench_workers_"),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+
+def mandar_y_esperar(falso, chats, base_update, espera=120):
+    """Encola un update por chat y espera una respuesta de cada uno."""
+    desde = len(falso.respuestas)
+    pendientes = set(chats)
+    t0 = time.monotonic()
+    for i, chat in enumerate(chats):
+        falso.encolar(update_mensaje(base_update + i, chat, TEXTOS[i % len(TEXTOS)]))
+    fin = t0 + espera
+    while pendientes and time.monotonic() < fin:
+        nuevas = falso.respuestas[desde:]
+        desde += len(nuevas)
+        for _, _, chat in nuevas:
+            pendientes.discard(chat)
+        time.sleep(0.01)
+    return time.monotonic() - t0, len(chats) - len(pendientes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--latencia-ms", type=float, default=50)
+    parser.add_argument("--workers", default="1,2,4,8")
+    args = parser.parse_args()
+
+    print(f"{args.updates} updates, sendMessage a {args.latencia_ms:.0f} ms, {os.cpu_count()} núcleos\n")
+    print(f"{'workers':>8}{'ok':>8}{'seg':>8}{'upd/s':>9}")
+    base = 1
+    for n in (int(x) for x in args.workers.split(",")):
+        falso = TelegramFalso(latencia=args.latencia_ms / 1000)
+        servidor = crear_servidor(falso)
+        pool = lanzar_pool(n, f"http://127.0.0.1:{servidor.server_address[1]}")
+        try:
+            # Calentamiento: que todos los workers hayan arrancado y atendido algo
+            calentar = list(range(10_000_000 + base, 10_000_000 + base + 20 * n))
+            _, ok = mandar_y_esperar(falso, calentar, base)
+            base += len(calentar)
+            if ok < len(calentar):
+                print(f"{n:>8}  no arrancó\n{pool.stderr.read1().decode()[-2000:]}")
+                continue
+            chats = list(range(20_000_000 + base, 20_000_000 + base + args.updates))
+            dur, ok = mandar_y_esperar(falso, chats, base)
+            base += len(chats)
+            print(f"{n:>8}{ok:>8}{dur:>8.1f}{ok / dur:>9.0f}")
+        finally:
+            pool.send_signal(signal.SIGINT)
+            try:
+                pool.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                pool.kill()
+            servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+API de OpenAI falsa (sólo stdlib) para cargar el bot sin gastar tokens:
+contesta /v1/chat/completions como el servicio real, con o sin stream
+(SSE), y con la latencia, el ritmo de tokens y los errores que se pidan.
+
+    python bench/fake_openai.py --puerto 8082 --latencia-ms 800 --tokens-por-seg 60
+    OPENAI_BASE_URL=http://127.0.0.1:8082/v1 python bot.py
+
+Opciones de carga:
+    --distribucion   fija | lognormal | uniforme (alrededor de --latencia-ms)
+    --error-429      probabilidad de contestar 429 (con Retry-After)
+    --error-500      probabilidad de contestar 500
+    --max-concurrencia  pedidos simultáneos antes de contestar 429 a todo
+                        lo que sobre (como el rate limit real)
+    --eco            devuelve la última pregunta en vez del texto fijo
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+RESPUESTA = (
+    "Para mejorar el aim trabajá el crosshair placement: apuntá siempre a la altura "
+    "de la cabeza donde puede aparecer el rival. Hacé 10 minutos de tracking en "
+    "modo creativo antes de jugar, bajá un poco la sens si te pasás de los objetivos "
+    "y revisá tus replays para ver en qué peleas perdés el primer tiro."
+)
+
+
+def estimar_tokens(texto: str) -> int:
+    return len(texto) // 4 + 1
+
+
+class OpenAIFalso:
+    def __init__(
+        self,
+        latencia: float = 0.8,
+        distribucion: str = "lognormal",
+        dispersion: float = 0.5,
+        tokens_por_seg: float = 0.0,
+        error_429: float = 0.0,
+        error_500: float = 0.0,
+        max_concurrencia: int = 0,
+        eco: bool = False,
+        respuesta: str = RESPUESTA,
+        seed=None,
+    ):
+        self.latencia = latencia
+        self.distribucion = distribucion
+        self.dispersion = dispersion
+        self.tokens_por_seg = tokens_por_seg
+        self.error_429 = error_429
+        self.error_500 = error_500
+        self.max_concurrencia = max_concurrencia
+        self.eco = eco
+        self.respuesta = respuesta
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.stats = {"pedidos": 0, "ok": 0, "429": 0, "500": 0, "stream": 0}
+
+    def demora(self) -> float:
+        """Tiempo total hasta el primer token."""
+        with self._lock:
+            if self.distribucion == "fija":
+                return self.latencia
+            if self.distribucion == "uniforme":
+                return self._rnd.uniform(0, 2 * self.latencia)
+            return self.latencia * self._rnd.lognormvariate(0, self.dispersion)
+
+    def elegir_error(self):
+        """None, o (status, mensaje, tipo) para inyectar."""
+        with self._lock:
+            self.stats["pedidos"] += 1
+            if self.max_concurrencia and self.en_curso >= self.max_concurrencia:
+                self.stats["429"] += 1
+                return 429, "Rate limit reached (concurrency)", "rate_limit_exceeded"
+            r = self._rnd.random()
+            if r < self.error_429:
+                self.stats["429"] += 1
+                return 429, "Rate limit reached for requests", "rate_limit_exceeded"
+            if r < self.error_429 + self.error_500:
+                self.stats["500"] += 1
+                return 500, "The server had an error while processing your request", "server_error"
+            self.en_curso += 1
+            return None
+
+    def terminar(self, stream: bool):
+        with self._lock:
+            self.en_curso -= 1
+            self.stats["ok"] += 1
+            if stream:
+                self.stats["stream"] += 1
+
+    def texto_para(self, messages) -> str:
+        if self.eco:
+            for m in reversed(messages):
+                if m.get("role") == "user":
+                    return str(m.get("content", ""))
+        return self.respuesta
+
+    def trozos(self, texto: str):
+        """(trozo, segundos a esperar antes) al ritmo de tokens_por_seg."""
+        palabras = texto.split(" ")
+        for i, palabra in enumerate(palabras):
+            trozo = palabra if i == 0 else " " + palabra
+            espera = estimar_tokens(trozo) / self.tokens_por_seg if self.tokens_por_seg else 0.0
+            yield trozo, espera
+
+
+def crear_servidor(falso: OpenAIFalso, puerto: int = 0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _json(self, status, cuerpo, extra_headers=()):
+            data = json.dumps(cuerpo).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in extra_headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "falso"}]})
+            else:
+                self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+        def do_POST(self):
+            largo = int(self.headers.get("Content-Length") or 0)
+            pedido = json.loads(self.rfile.read(largo) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                return
+
+            error = falso.elegir_error()
+            if error is not None:
+                status, mensaje, tipo = error
+                headers = [("Retry-After", "1")] if status == 429 else []
+                self._json(status, {"error": {"message": mensaje, "type": tipo, "code": tipo}}, headers)
+                return
+
+            stream = bool(pedido.get("stream"))
+            try:
+                modelo = pedido.get("model", "gpt-4o-mini")
+                messages = pedido.get("messages", [])
+                texto = falso.texto_para(messages)
+                uso = {
+                    "prompt_tokens": sum(estimar_tokens(str(m.get("content", ""))) for m in messages),
+                    "completion_tokens": estimar_tokens(texto),
+                }
+                uso["total_tokens"] = uso["prompt_tokens"] + uso["completion_tokens"]
+                ident = f"chatcmpl-falso{int(time.time() * 1000)}"
+                time.sleep(falso.demora())
+                if stream:
+                    incluir_uso = bool((pedido.get("stream_options") or {}).get("include_usage"))
+                    self._stream(ident, modelo, texto, uso if incluir_uso else None)
+                else:
+                    # Sin stream el texto llega entero, después de generarlo todo
+                    time.sleep(sum(espera for _, espera in falso.trozos(texto)))
+                    self._json(200, {
+                        "id": ident,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": modelo,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": texto}, "finish_reason": "stop"}],
+                        "usage": uso,
+                    })
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # el cliente cortó (timeout del lado del bot)
+            finally:
+                falso.terminar(stream)
+
+        def _stream(self, ident, modelo, texto, uso):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            base = {"id": ident, "object": "chat.completion.chunk", "created": int(time.time()), "model": modelo}
+
+            def evento(choices, **extra):
+                chunk = dict(base, choices=choices, **extra)
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            evento([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            for trozo, espera in falso.trozos(texto):
+                if espera:
+                    time.sleep(espera)
+                evento([{"index": 0, "delta": {"content": trozo}, "finish_reason": None}])
+            evento([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if uso is not None:
+                evento([], usage=uso)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--puerto", type=int, default=8082)
+    parser.add_argument("--latencia-ms", type=float, default=800, help="hasta el primer token")
+    parser.add_argument("--distribucion", choices=["fija", "lognormal", "uniforme"], default="lognormal")
+    parser.add_argument("--dispersion", type=float, default=0.5, help="sigma de la lognormal")
+    parser.add_argument("--tokens-por-seg", type=float, default=60, help="0 = todo de una")
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--error-500", type=float, default=0.0)
+    parser.add_argument("--max-concurrencia", type=int, default=0)
+    parser.add_argument("--eco", action="store_true")
+    parser.add_argument("--respuesta", default=RESPUESTA)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    falso = OpenAIFalso(
+        latencia=args.latencia_ms / 1000,
+        distribucion=args.distribucion,
+        dispersion=args.dispersion,
+        tokens_por_seg=args.tokens_por_seg,
+        error_429=args.error_429,
+        error_500=args.error_500,
+        max_concurrencia=args.max_concurrencia,
+        eco=args.eco,
+        respuesta=args.respuesta,
+        seed=args.seed,
+    )
+    servidor = crear_servidor(falso, args.puerto)
+    print(f"OpenAI falsa en http://127.0.0.1:{servidor.server_address[1]}/v1 (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"  en curso: {falso.en_curso}  {falso.stats}")
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
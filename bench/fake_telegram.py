@@ -0,0 +1,169 @@
+"""
+Bot API de Telegram falsa (sólo stdlib) para medir el bot de punta a punta
+sin red: bot.py le habla como si fuera api.telegram.org usando
+TELEGRAM_API_URL=http://127.0.0.1:<puerto>.
+
+Implementa lo que usa el bot: getMe, getUpdates (long polling de verdad:
+responde apenas hay updates), setWebhook / deleteWebhook, sendMessage,
+editMessageText, sendChatAction y sendPhoto. Cada respuesta del bot queda
+registrada con su hora para medir latencias.
+
+    python bench/fake_telegram.py --puerto 8081
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Coach", "username": "coach_falso_bot"}
+
+
+def update_mensaje(update_id, chat_id, texto):
+    """Un update de texto como los que manda Telegram (comandos con entity)."""
+    msg = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private", "first_name": "Jugador"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Jugador"},
+        "text": texto,
+    }
+    if texto.startswith("/"):
+        largo = len(texto.split()[0])
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": largo}]
+    return {"update_id": update_id, "message": msg}
+
+
+class TelegramFalso:
+    def __init__(self, latencia: float = 0.0):
+        # Segundos que tarda cada envío (sendMessage & co.), como el RTT real
+        self.latencia = latencia
+        self._cond = threading.Condition()
+        self._pendientes = []
+        self._message_id = 0
+        self.respuestas = []  # (monotonic, metodo, chat_id)
+        self.webhook = None
+        self.llamadas = {}
+
+    # --- lado "Telegram" ---
+
+    def encolar(self, update):
+        with self._cond:
+            self._pendientes.append(update)
+            self._cond.notify_all()
+
+    def _get_updates(self, params):
+        offset = int(params.get("offset", 0) or 0)
+        timeout = float(params.get("timeout", 0) or 0)
+        limite = int(params.get("limit", 100) or 100)
+        fin = time.monotonic() + timeout
+        with self._cond:
+            # offset confirma todo lo anterior
+            self._pendientes = [u for u in self._pendientes if u["update_id"] >= offset]
+            while not self._pendientes:
+                resto = fin - time.monotonic()
+                if resto <= 0:
+                    return []
+                self._cond.wait(resto)
+            return self._pendientes[:limite]
+
+    def _mensaje(self, params):
+        with self._cond:
+            self._message_id += 1
+            mid = self._message_id
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": mid,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    def atender(self, metodo, params):
+        self.llamadas[metodo] = self.llamadas.get(metodo, 0) + 1
+        if metodo == "getMe":
+            return BOT_USER
+        if metodo == "getUpdates":
+            return self._get_updates(params)
+        if metodo in ("deleteWebhook", "setWebhook"):
+            self.webhook = params.get("url") if metodo == "setWebhook" else None
+            return True
+        if metodo == "getWebhookInfo":
+            return {"url": self.webhook or "", "has_custom_certificate": False, "pending_update_count": 0}
+        if metodo in ("sendMessage", "sendPhoto", "editMessageText"):
+            if self.latencia:
+                time.sleep(self.latencia)
+            self.respuestas.append((time.monotonic(), metodo, int(params.get("chat_id", 0))))
+            return self._mensaje(params)
+        if metodo == "sendChatAction":
+            return True
+        return True
+
+
+def _leer_params(handler):
+    largo = int(handler.headers.get("Content-Length") or 0)
+    cuerpo = handler.rfile.read(largo) if largo else b""
+    tipo = handler.headers.get("Content-Type", "")
+    if "json" in tipo:
+        return json.loads(cuerpo or b"{}")
+    params = {}
+    for k, v in parse_qs(cuerpo.decode("utf-8")).items():
+        params[k] = v[0]
+    return params
+
+
+def crear_servidor(falso: TelegramFalso, puerto: int = 0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers y cuerpo salen en dos writes: con Nagle + delayed ACK cada
+        # respuesta se come ~40 ms y eso es lo que terminaríamos midiendo
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            # /bot<TOKEN>/<metodo>
+            metodo = self.path.rstrip("/").rsplit("/", 1)[-1]
+            try:
+                res = {"ok": True, "result": falso.atender(metodo, _leer_params(self))}
+            except Exception as e:
+                res = {"ok": False, "error_code": 400, "description": str(e)}
+            cuerpo = json.dumps(res).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            try:
+                self.wfile.write(cuerpo)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # el bot cortó (apagándose) mientras esperaba getUpdates
+
+        do_GET = do_POST
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--puerto", type=int, default=8081)
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    args = parser.parse_args()
+    falso = TelegramFalso(latencia=args.latencia_ms / 1000)
+    servidor = crear_servidor(falso, args.puerto)
+    print(f"Bot API falsa en http://127.0.0.1:{servidor.server_address[1]} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"  llamadas: {falso.llamadas}")
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
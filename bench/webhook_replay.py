@@ -0,0 +1,76 @@
+"""
+Manda updates grabados (un JSON por línea) al webhook del bot como lo haría
+Telegram, con el header del secret token. Antes prueba que un POST sin el
+secret correcto se rechace.
+
+Con el bot corriendo en modo webhook (por ejemplo contra la API falsa):
+
+    python bench/fake_telegram.py --puerto 8081 &
+    BOT_MODE=webhook WEBHOOK_URL=http://127.0.0.1:8443 WEBHOOK_SECRET=abc \\
+        TELEGRAM_API_URL=http://127.0.0.1:8081 python bot.py &
+    python bench/webhook_replay.py --url http://127.0.0.1:8443/telegram --secret abc
+"""
+import os
+import json
+import time
+import argparse
+import urllib.request
+import urllib.error
+
+GRABADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "updates_grabados.jsonl")
+
+
+def postear(url, update, secret):
+    """POST de un update; devuelve (status HTTP, segundos)."""
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode("utf-8"),
+        headers={
+            "Content-Type": "application/json",
+            "X-Telegram-Bot-Api-Secret-Token": secret,
+        },
+        method="POST",
+    )
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=10) as r:
+            return r.status, time.perf_counter() - t0
+    except urllib.error.HTTPError as e:
+        return e.code, time.perf_counter() - t0
+
+
+def cargar_grabados(path=GRABADOS):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def esperar_webhook(url, secret, segundos=30):
+    """Espera a que el servidor del bot acepte conexiones."""
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        try:
+            postear(url, {"update_id": 0}, "secreto-incorrecto")
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--archivo", default=GRABADOS)
+    args = parser.parse_args()
+
+    status, _ = postear(args.url, {"update_id": 0}, "secreto-incorrecto")
+    print(f"secret incorrecto -> HTTP {status} ({'OK' if status == 403 else 'ESPERABA 403'})")
+
+    for update in cargar_grabados(args.archivo):
+        status, dt = postear(args.url, update, args.secret)
+        tipo = "callback" if "callback_query" in update else update["message"].get("text", "")[:30]
+        print(f"update {update['update_id']:>3} {tipo:<30} -> HTTP {status} en {dt * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,37 @@
 import os
-import json
-from datetime import datetime, timedelta, time as dtime
+import time
+import asyncio
+import functools
+from datetime import datetime, timedelta
 
 from dotenv import load_dotenv
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, Forbidden, RetryAfter
 from telegram.ext import (
     ApplicationBuilder,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
     ContextTypes,
     filters,
 )
-from openai import OpenAI
+
+from almacenamiento import (
+    cargar_json,
+    guardar_json,
+    crear_almacen,
+    importar_si_falta,
+    RegistroUsuarios,
+    AcumuladorXP,
+)
+from indices import IndicePremium, RankingXP, GrafoReferidos, BuscadorAlias, epoch_a_fecha
+from ia import ClienteIA, ColaIA, CacheRespuestas, MemoriaConversaciones, LimitadorUsuarios, ControlCarga
+from difusion import TokenBucket, Difusion, EstadoEntregas
+from intenciones import RouterIntenciones
+from metricas import METRICAS, instrumentar_app, servir_metricas
+from agenda import Agenda, Diario, Mensual
 
 # ==========================
 #   CARGA VARIABLES
@@ -23,7 +42,145 @@ TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# "polling" (getUpdates, el de siempre), "webhook" (Telegram nos manda
+# los updates por HTTP; necesita una URL pública con HTTPS delante) o
+# "pool" (BOT_WORKERS procesos detrás de un supervisor, ver trabajadores.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+# Telegram lo manda en X-Telegram-Bot-Api-Secret-Token; sin él se rechaza
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", "8443")))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Para apuntar a otro servidor de la Bot API (local o de pruebas, ver bench/)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Métricas en formato Prometheus (ver metricas.py) en http://HOST:PORT/metrics;
+# 0 las apaga. En el pool cada worker usa METRICS_PORT + su número
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# Updates que la Application atiende a la vez; los de un mismo chat van
+# siempre de a uno y en orden (ver ProcesadorPorChat). Con 1 una pregunta a
+# la IA frena a todos los demás hasta que termina. Tiene que sobrar por
+# encima de IA_WORKERS + las colas IA (160 por defecto): las preguntas que
+# esperan a la IA ocupan un lugar cada una
+UPDATES_CONCURRENTES = int(os.getenv("UPDATES_CONCURRENTES", "256"))
+
+# Lo pone trabajadores.py en cada worker del pool ("0", "1", ...); vacío
+# cuando bot.py corre solo. Cada cuántos segundos un worker mira si otro
+# escribió en la base
+BOT_WORKER = os.getenv("BOT_WORKER", "")
+WORKER_SYNC_INTERVAL = float(os.getenv("WORKER_SYNC_INTERVAL", "1"))
+
+# "json" (archivos de siempre) o "sqlite" (ver almacenamiento.py)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+DB_FILE = os.getenv("DB_FILE", "bot.db")
+# Cada cuántas altas nuevas se compacta usuarios.log dentro de usuarios.json
+USERS_LOG_COMPACT_EVERY = int(os.getenv("USERS_LOG_COMPACT_EVERY", "1000"))
+# XP diferido: máximo de sumas sin escribir (= eventos que puede perder un crash)
+# y cada cuántos segundos se vacía igual aunque no se llegue al máximo
+XP_FLUSH_MAX_EVENTS = int(os.getenv("XP_FLUSH_MAX_EVENTS", "50"))
+XP_FLUSH_INTERVAL = int(os.getenv("XP_FLUSH_INTERVAL", "30"))
+# Aviso por DM antes de que venza el Premium y cada cuánto se revisa
+AVISO_VENCIMIENTO_DIAS = int(os.getenv("AVISO_VENCIMIENTO_DIAS", "3"))
+PREMIUM_CHECK_INTERVAL = int(os.getenv("PREMIUM_CHECK_INTERVAL", "600"))
+
+# Cliente IA: timeouts en segundos, pool de conexiones y llamadas simultáneas
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Otro servidor compatible con la API (vacío = OpenAI); para pruebas de carga
+# ver bench/fake_openai.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "10"))
+
+# Cola delante de la IA: workers y cuántos pedidos pueden esperar por plan
+IA_WORKERS = int(os.getenv("IA_WORKERS", str(OPENAI_MAX_CONCURRENCY)))
+IA_QUEUE_MAX_PLUS = int(os.getenv("IA_QUEUE_MAX_PLUS", "100"))
+IA_QUEUE_MAX_STANDARD = int(os.getenv("IA_QUEUE_MAX_STANDARD", "50"))
+# Cache de respuestas IA: tamaño (LRU), vida en segundos y modo "casi igual"
+IA_CACHE_SIZE = int(os.getenv("IA_CACHE_SIZE", "5000"))
+IA_CACHE_TTL = int(os.getenv("IA_CACHE_TTL", "86400"))
+IA_CACHE_FUZZY = os.getenv("IA_CACHE_FUZZY", "0") == "1"
+IA_CACHE_FUZZY_THRESHOLD = float(os.getenv("IA_CACHE_FUZZY_THRESHOLD", "0.8"))
+# Respuestas IA en vivo: se edita el mensaje a medida que llega el texto,
+# como mucho una edición cada IA_STREAM_EDIT_INTERVAL segundos por chat
+IA_STREAMING = os.getenv("IA_STREAMING", "1") == "1"
+IA_STREAM_EDIT_INTERVAL = float(os.getenv("IA_STREAM_EDIT_INTERVAL", "1.0"))
+# Memoria por usuario: tokens de historial por pedido, conversaciones en RAM,
+# tope en MB para todas juntas (una llena ocupa ~5 KB) y segundos de
+# inactividad antes de olvidar
+IA_MEMORIA_TOKENS = int(os.getenv("IA_MEMORIA_TOKENS", "800"))
+IA_MEMORIA_MAX_USUARIOS = int(os.getenv("IA_MEMORIA_MAX_USUARIOS", "100000"))
+IA_MEMORIA_MAX_MB = float(os.getenv("IA_MEMORIA_MAX_MB", "64"))
+IA_MEMORIA_TTL = int(os.getenv("IA_MEMORIA_TTL", str(6 * 3600)))
+# Límite por usuario delante de la IA: preguntas de entrada (ráfaga) y
+# cuántas más por minuto, por plan
+IA_RAFAGA_STANDARD = int(os.getenv("IA_RAFAGA_STANDARD", "5"))
+IA_POR_MINUTO_STANDARD = float(os.getenv("IA_POR_MINUTO_STANDARD", "6"))
+IA_RAFAGA_PLUS = int(os.getenv("IA_RAFAGA_PLUS", "10"))
+IA_POR_MINUTO_PLUS = float(os.getenv("IA_POR_MINUTO_PLUS", "20"))
+# Latencia objetivo de la IA en segundos (media móvil): si se pasa, se
+# rechaza el tráfico Standard con un aviso hasta que baje
+IA_SLO_SEGUNDOS = float(os.getenv("IA_SLO_SEGUNDOS", "12"))
+IA_SLO_ALFA = float(os.getenv("IA_SLO_ALFA", "0.2"))
+# Envíos masivos (/difundir, campañas): mensajes por segundo para todo el
+# bot, envíos en paralelo y cada cuántos segundos se actualiza el progreso
+DIFUSION_POR_SEGUNDO = float(os.getenv("DIFUSION_POR_SEGUNDO", "30"))
+DIFUSION_CONCURRENCIA = int(os.getenv("DIFUSION_CONCURRENCIA", "20"))
+DIFUSION_PROGRESO_INTERVAL = float(os.getenv("DIFUSION_PROGRESO_INTERVAL", "5"))
+# Warm-up diario: hora de arranque (hora local del servidor), minutos en los que
+# se reparte el envío y en cuántas tandas (por user_id) se divide
+WARMUP_HORA = int(os.getenv("WARMUP_HORA", "15"))
+WARMUP_VENTANA_MIN = int(os.getenv("WARMUP_VENTANA_MIN", "120"))
+WARMUP_TANDAS = int(os.getenv("WARMUP_TANDAS", "12"))
+# Agenda (ver agenda.py): hasta cuánto tarde se recupera un turno que un
+# reinicio dejó sin correr, y cada cuántos segundos sale uno recuperado
+WARMUP_GRACIA_MIN = int(os.getenv("WARMUP_GRACIA_MIN", "120"))
+DESCUENTO_GRACIA_HORAS = int(os.getenv("DESCUENTO_GRACIA_HORAS", "12"))
+AGENDA_ESCALON_SEGUNDOS = float(os.getenv("AGENDA_ESCALON_SEGUNDOS", "60"))
+# Parecido mínimo (0..1) para reconocer un pro mal escrito ("peterbott")
+PRO_FUZZY_UMBRAL = float(os.getenv("PRO_FUZZY_UMBRAL", "0.7"))
+# Letras mínimas de un alias para buscarlo con typos: los cortos ("veno",
+# "pollo") sólo exactos, si no "veneno" o "los pollos hermanos" se los llevan
+PRO_FUZZY_MIN_ALIAS = int(os.getenv("PRO_FUZZY_MIN_ALIAS", "6"))
+
+ia = ClienteIA(
+    OPENAI_API_KEY,
+    modelo=OPENAI_MODEL,
+    base_url=OPENAI_BASE_URL,
+    timeout=OPENAI_TIMEOUT,
+    max_conexiones=OPENAI_MAX_CONNECTIONS,
+    max_concurrencia=OPENAI_MAX_CONCURRENCY,
+)
+# PLUS primero: es la "priorización" que promete /premiumplus
+cola_ia = ColaIA(
+    [("plus", IA_QUEUE_MAX_PLUS), ("standard", IA_QUEUE_MAX_STANDARD)],
+    workers=IA_WORKERS,
+)
+cache_ia = CacheRespuestas(
+    max_items=IA_CACHE_SIZE,
+    ttl=IA_CACHE_TTL,
+    fuzzy=IA_CACHE_FUZZY,
+    umbral=IA_CACHE_FUZZY_THRESHOLD,
+)
+memoria_ia = MemoriaConversaciones(
+    presupuesto=IA_MEMORIA_TOKENS,
+    max_usuarios=IA_MEMORIA_MAX_USUARIOS,
+    ttl=IA_MEMORIA_TTL,
+    max_bytes=int(IA_MEMORIA_MAX_MB * 1024 * 1024),
+)
+limitador_ia = LimitadorUsuarios(
+    {
+        "standard": (IA_RAFAGA_STANDARD, IA_POR_MINUTO_STANDARD),
+        "plus": (IA_RAFAGA_PLUS, IA_POR_MINUTO_PLUS),
+    },
+    max_usuarios=IA_MEMORIA_MAX_USUARIOS,
+)
+control_carga = ControlCarga(slo=IA_SLO_SEGUNDOS, alfa=IA_SLO_ALFA)
+limitador_envios = TokenBucket(por_segundo=DIFUSION_POR_SEGUNDO)
 
 # ==========================
 #   ARCHIVOS
@@ -33,55 +190,85 @@ PREMIUM_FILE = "premium_users.json"
 USERS_FILE = "usuarios.json"
 XP_FILE = "xp_users.json"
 REF_FILE = "referrals.json"
+# En el pool de workers cada proceso tiene su propia cache IA
+# (ia_cache.w0.json, ...); el resto se comparte por SQLite
+SUFIJO_WORKER = f".w{BOT_WORKER}" if BOT_WORKER else ""
+IA_CACHE_FILE = f"ia_cache{SUFIJO_WORKER}.json"
+# Checkpoints de difusiones en curso (uno por envío masivo)
+DIFUSION_DIR = "difusiones"
+# Usuarios a los que Telegram no deja escribir (bloqueos, cuentas borradas);
+# con STORAGE_BACKEND=sqlite van a la base, compartidos entre workers
+ENTREGAS_FILE = "entregas.json"
+# Turnos ya corridos de los jobs de calendario (uno por archivo, ver agenda.py)
+AGENDA_DIR = "agenda"
+
+if STORAGE_BACKEND == "sqlite" and not BOT_WORKER:
+    # En el pool lo hace trabajadores.py antes de lanzar los workers
+    importar_si_falta(DB_FILE, PREMIUM_FILE, USERS_FILE, XP_FILE, REF_FILE, ENTREGAS_FILE)
+store = crear_almacen(STORAGE_BACKEND, DB_FILE, PREMIUM_FILE, USERS_FILE, XP_FILE, REF_FILE)
+# Lo que se carga abajo incluye el log de cambios hasta acá (ver sincronizar_estado_job)
+cambio_cargado = store.ultimo_cambio() if STORAGE_BACKEND == "sqlite" else 0
+registro = RegistroUsuarios(store, compactar_cada=USERS_LOG_COMPACT_EVERY)
+xp_buffer = AcumuladorXP(store, max_eventos=XP_FLUSH_MAX_EVENTS)
+
+# Puestos por XP en memoria (ver indices.py); add_xp lo mantiene al día
+ranking_xp = RankingXP()
+ranking_xp.cargar(xp_buffer.cargar())
+
+# Referidos como grafo en memoria (ver indices.py); se escribe en el store
+grafo_ref = GrafoReferidos()
+grafo_ref.cargar(store.cargar_ref())
+
+# Entitlements premium en memoria (ver indices.py)
+premium_idx = IndicePremium(aviso_segundos=AVISO_VENCIMIENTO_DIAS * 86400)
+premium_idx.cargar(store.cargar_premium())
+
+cache_ia.cargar(IA_CACHE_FILE)
+
+entregas = EstadoEntregas(store if STORAGE_BACKEND == "sqlite" else None)
+entregas.cargar(ENTREGAS_FILE)
+
+agenda = Agenda(AGENDA_DIR, escalon=AGENDA_ESCALON_SEGUNDOS)
 
 # ==========================
-#   HELPERS JSON
+#   HELPERS ALMACENAMIENTO
 # ==========================
 
 
-def cargar_json(path, default):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return default
-
-
-def guardar_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-
 def cargar_premium():
-    return cargar_json(PREMIUM_FILE, {})
+    return store.cargar_premium()
 
 
 def guardar_premium(data: dict):
-    guardar_json(PREMIUM_FILE, data)
+    store.guardar_premium(data)
+    premium_idx.cargar(data)
 
 
 def cargar_usuarios():
-    return cargar_json(USERS_FILE, [])
+    return store.cargar_usuarios()
 
 
 def guardar_usuarios(lista):
-    guardar_json(USERS_FILE, lista)
+    registro.reemplazar(lista)
 
 
 def cargar_xp():
-    return cargar_json(XP_FILE, {})
+    # Incluye el XP que todavía no se escribió
+    return xp_buffer.cargar()
 
 
 def guardar_xp(data):
-    guardar_json(XP_FILE, data)
+    xp_buffer.reemplazar(data)
+    ranking_xp.cargar(data)
 
 
 def cargar_ref():
-    return cargar_json(REF_FILE, {})
+    return store.cargar_ref()
 
 
 def guardar_ref(data):
-    guardar_json(REF_FILE, data)
+    store.guardar_ref(data)
+    grafo_ref.cargar(data)
 
 
 # ==========================
@@ -90,17 +277,15 @@ def guardar_ref(data):
 
 
 def registrar_usuario(user_id: int):
-    usuarios = cargar_usuarios()
-    if user_id not in usuarios:
-        usuarios.append(user_id)
-        guardar_usuarios(usuarios)
+    # Usuario conocido: lookup en memoria, cero I/O
+    registro.registrar(user_id)
+    # Si nos había bloqueado y volvió a escribir, se le puede mandar de nuevo
+    entregas.reactivar(user_id)
 
 
 def add_xp(user_id: int, amount: int):
-    data = cargar_xp()
-    uid = str(user_id)
-    data[uid] = data.get(uid, 0) + amount
-    guardar_xp(data)
+    xp_buffer.sumar(user_id, amount)
+    ranking_xp.sumar(user_id, amount)
 
 
 def get_level(xp: int) -> int:
@@ -148,65 +333,33 @@ def vencio_premium(fecha_str: str) -> bool:
 
 
 def es_premium(user_id: int) -> bool:
-    premium = cargar_premium()
-    uid = str(user_id)
-    if uid not in premium:
-        return False
-
-    entry = premium[uid]
-
-    # Formato viejo
-    if isinstance(entry, str):
-        return not vencio_premium(entry)
-
-    # Lifetime
-    if entry.get("lifetime"):
-        return True
-
-    exp = entry.get("exp")
-    if not exp:
-        return False
-
-    return not vencio_premium(exp)
+    return premium_idx.es_premium(user_id)
 
 
 def es_premium_plus(user_id: int) -> bool:
-    premium = cargar_premium()
-    uid = str(user_id)
-    if uid not in premium:
-        return False
-    entry = premium[uid]
-    if isinstance(entry, str):
-        return False
-    return entry.get("plan") == "plus"
+    return premium_idx.es_plus(user_id)
 
 
 def obtener_info_premium(user_id: int) -> str:
-    premium = cargar_premium()
-    uid = str(user_id)
-    if uid not in premium:
+    e = premium_idx.get(user_id)
+    if e is None:
         return "No sos Premium."
 
-    entry = premium[uid]
-    plan = "Standard"
+    plan, lifetime, exp = e
+    if lifetime:
+        return f"Premium {plan} de por vida 🏆"
 
-    # Formato viejo
-    if isinstance(entry, str):
-        exp = entry
-    else:
-        plan = entry.get("plan", "Standard")
-        if entry.get("lifetime"):
-            return f"Premium {plan} de por vida 🏆"
-        exp = entry.get("exp")
+    return f"Premium {plan} activo hasta: {epoch_a_fecha(exp)}"
 
-    return f"Premium {plan} activo hasta: {exp}"
 
+def set_premium(user_id: int, entry):
+    """Guarda una entrada y mantiene el índice al día."""
+    store.set_premium(user_id, entry)
+    premium_idx.actualizar(user_id, entry)
 
-def add_days_premium(user_id: int, dias: int, plan: str = "standard"):
-    premium = cargar_premium()
-    uid = str(user_id)
 
-    entry = premium.get(uid)
+def add_days_premium(user_id: int, dias: int, plan: str = "standard"):
+    entry = store.get_premium(user_id)
 
     # Si ya es de por vida, no tocar
     if isinstance(entry, dict) and entry.get("lifetime"):
@@ -215,7 +368,7 @@ def add_days_premium(user_id: int, dias: int, plan: str = "standard"):
     if entry is None:
         # Crear nuevo
         exp = datetime.now() + timedelta(days=dias)
-        premium[uid] = {
+        nuevo = {
             "lifetime": False,
             "exp": exp.strftime("%Y-%m-%d"),
             "plan": plan,
@@ -225,7 +378,7 @@ def add_days_premium(user_id: int, dias: int, plan: str = "standard"):
         if isinstance(entry, str):
             base = datetime.strptime(entry, "%Y-%m-%d")
             new_exp = base + timedelta(days=dias)
-            premium[uid] = {
+            nuevo = {
                 "lifetime": False,
                 "exp": new_exp.strftime("%Y-%m-%d"),
                 "plan": plan,
@@ -241,9 +394,9 @@ def add_days_premium(user_id: int, dias: int, plan: str = "standard"):
             # si ya era plus, mantener
             if entry.get("plan") is None:
                 entry["plan"] = plan
-            premium[uid] = entry
+            nuevo = entry
 
-    guardar_premium(premium)
+    set_premium(user_id, nuevo)
 
 
 # ==========================
@@ -259,6 +412,8 @@ DESCUENTO_MENSUAL = {
 
 
 def descuento_mensual_activo():
+    if not DESCUENTO_MENSUAL["activo"]:
+        restaurar_descuento_mensual()
     if not DESCUENTO_MENSUAL["activo"]:
         return False
 
@@ -270,6 +425,21 @@ def descuento_mensual_activo():
     return True
 
 
+def restaurar_descuento_mensual():
+    """
+    El descuento vive en memoria: después de un reinicio, o en un worker
+    que no corre los jobs, se rearma con la última activación anotada en
+    la agenda.
+    """
+    ultima = agenda.ultima("descuento_mensual")
+    if ultima is None:
+        return
+    exp = datetime.fromtimestamp(ultima["inicio"]) + timedelta(hours=24)
+    if datetime.now() < exp:
+        DESCUENTO_MENSUAL["activo"] = True
+        DESCUENTO_MENSUAL["expira"] = exp.strftime("%Y-%m-%d %H:%M")
+
+
 # ==========================
 #   REFERIDOS
 # ==========================
@@ -280,25 +450,15 @@ def registrar_referido(user_id: int, ref_id: int) -> str:
     if user_id == ref_id:
         return "No podés usar tu propio código."
 
-    refs = cargar_ref()
-    u = str(user_id)
-    r = str(ref_id)
-
-    info_u = refs.get(u, {"ref_by": None, "referred": [], "premios": []})
-
-    if info_u.get("ref_by"):
+    if grafo_ref.padre(user_id) is not None:
         return "Ya usaste un código de referido antes."
 
-    # Asignar
-    info_u["ref_by"] = r
-    refs[u] = info_u
+    # Evita granjas circulares: A refiere a B y B vuelve a referir a A
+    if grafo_ref.crearia_ciclo(user_id, ref_id):
+        return "No podés usar el código de alguien que entró con el tuyo."
 
-    info_r = refs.get(r, {"ref_by": None, "referred": [], "premios": []})
-    if u not in info_r["referred"]:
-        info_r["referred"].append(u)
-    refs[r] = info_r
-
-    guardar_ref(refs)
+    grafo_ref.agregar(user_id, ref_id)
+    store.set_refs({str(user_id): grafo_ref.info(user_id), str(ref_id): grafo_ref.info(ref_id)})
     return "✅ Código de referido aplicado correctamente."
 
 
@@ -307,30 +467,32 @@ def procesar_bonus_referido(uid_str: str):
     Cuando un usuario uid_str se activa Premium,
     si tiene ref_by y el bonus no fue usado, darle 7 días al referrer.
     """
-    refs = cargar_ref()
-    if uid_str not in refs:
-        return
-
-    data_u = refs[uid_str]
-    ref_by = data_u.get("ref_by")
-    if not ref_by:
+    uid = int(uid_str)
+    ref_by = grafo_ref.padre(uid)
+    if ref_by is None:
         return
 
-    # Marcar que este usuario ya otorgó bonus a su referrer
-    data_r = refs.get(ref_by, {"ref_by": None, "referred": [], "premios": []})
-    premios = data_r.get("premios", [])
-
-    if uid_str in premios:
+    if uid in grafo_ref.premios(ref_by):
         # Ya se le dio bonus por este usuario
         return
 
-    # Dar 7 días de premium standard al referrer
-    add_days_premium(int(ref_by), 7, plan="standard")
+    if grafo_ref.en_ciclo(uid):
+        print(f"⚠️ Bonus de referido no otorgado: {uid} está en un ciclo de referidos")
+        return
 
-    premios.append(uid_str)
-    data_r["premios"] = premios
-    refs[ref_by] = data_r
-    guardar_ref(refs)
+    # Los 7 días y el registro del premio van juntos: o quedan los dos o
+    # ninguno (SQLite: una transacción; JSON: el diario de AlmacenJSON)
+    info_r = grafo_ref.info(ref_by)
+    info_r["premios"].append(uid_str)
+    try:
+        with store.transaccion():
+            add_days_premium(ref_by, 7, plan="standard")
+            store.set_refs({str(ref_by): info_r})
+    except Exception:
+        # El índice premium ya se había actualizado: volver a lo del store
+        premium_idx.actualizar(ref_by, store.get_premium(ref_by))
+        raise
+    grafo_ref.marcar_premio(ref_by, uid)
 
 
 # ==========================
@@ -421,30 +583,41 @@ PRO_SENS = {
 }
 
 
+# Todos los alias en un solo matcher, armado una vez al arrancar
+buscador_pros = BuscadorAlias(
+    {key: data["aliases"] for key, data in PRO_SENS.items()},
+    umbral=PRO_FUZZY_UMBRAL,
+    min_largo_alias=PRO_FUZZY_MIN_ALIAS,
+)
+
+
 def obtener_sens_pro_desde_texto(texto: str):
     """
     Busca dentro del mensaje si aparece el nombre de algún pro
     y devuelve un mensaje con su sens exacta.
     """
-    low = texto.lower()
-
-    for key, data in PRO_SENS.items():
-        for alias in data["aliases"]:
-            if alias in low:
-                return (
-                    f"🎮 *Sens de {data['display']}*\n\n"
-                    f"• DPI: *{data['dpi']}*\n"
-                    f"• X: *{data['x']}%*\n"
-                    f"• Y: *{data['y']}%*\n"
-                    f"• Targeting: *{data['target']}%*\n"
-                    f"• Scope: *{data['scope']}%*\n\n"
-                    f"🧠 Estilo de juego: {data['estilo']}\n\n"
-                    "Recordá que estas sens pueden cambiar con el tiempo.\n"
-                    "Si querés, te armo una *sens personalizada* basada en esta pero "
-                    "ajustada a tu DPI, resolución y estilo (agresivo/pasivo)."
-                )
+    encontrado = buscador_pros.buscar(texto)
+    if encontrado is None:
+        return None
+
+    key, score = encontrado
+    data = PRO_SENS[key]
+    # Coincidencia aproximada (nombre mal escrito): aclarar a quién se entendió
+    aviso = "" if score >= 1.0 else f"🔎 Entendí que buscás a *{data['display']}*.\n\n"
+    return aviso + (
+        f"🎮 *Sens de {data['display']}*\n\n"
+        f"• DPI: *{data['dpi']}*\n"
+        f"• X: *{data['x']}%*\n"
+        f"• Y: *{data['y']}%*\n"
+        f"• Targeting: *{data['target']}%*\n"
+        f"• Scope: *{data['scope']}%*\n\n"
+        f"🧠 Estilo de juego: {data['estilo']}\n\n"
+        "Recordá que estas sens pueden cambiar con el tiempo.\n"
+        "Si querés, te armo una *sens personalizada* basada en esta pero "
+        "ajustada a tu DPI, resolución y estilo (agresivo/pasivo)."
+    )
+
 
-    return None
 # ==========================
 #   MENÚ / SECCIONES
 # ==========================
@@ -626,8 +799,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• /resumen – Analizo tu partida (PREMIUM)\n"
         "• /premiuminfo – Cómo pagar y planes\n"
         "• /perfil – Tu XP, nivel y estado Premium\n"
+        "• /ranking – Top de XP y tu puesto\n"
         "• /referidos – Tu código para invitar amigos\n"
-        "• /replay – Cómo mandarme info de un replay\n\n"
+        "• /replay – Cómo mandarme info de un replay\n"
+        "• /olvidar – Empezar de cero la charla con la IA\n\n"
         "🎮 *Sensibilidades de PROS*\n"
         "Pedime cosas como: _\"sens tipo Clix\"_, _\"sens tipo Peterbot\"_, "
         "_\"sens de Queasy\"_ y te explico el estilo y te ajusto una sens inspirada en ellos.\n\n"
@@ -655,6 +830,7 @@ async def menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def about(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    registrar_usuario(update.effective_user.id)
     await update.message.reply_text(
         "🤖 *Coach Fortnite IA Premium*\n\n"
         "Bot diseñado para jugadores que quieren competir en serio: FNCS, Cash Cups, scrims y ranked.\n"
@@ -664,6 +840,7 @@ async def about(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def premiuminfo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    registrar_usuario(update.effective_user.id)
     await update.message.reply_text(
         "━━━━━━━━━━━━━━━━━━\n"
         "💎 *PREMIUM FORTNITE COACH IA*\n"
@@ -689,6 +866,7 @@ async def premiuminfo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def validar_codigo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    registrar_usuario(update.effective_user.id)
     try:
         codigo = context.args[0].upper()
     except Exception:
@@ -725,23 +903,27 @@ async def validar_codigo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def perfil(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
-    xp_data = cargar_xp()
-    xp = xp_data.get(str(uid), 0)
+    registrar_usuario(uid)
+    xp = xp_buffer.get(uid)
     lvl = get_level(xp)
     lvl_n = level_name(lvl)
     prem_info = obtener_info_premium(uid)
+    puesto = ranking_xp.puesto(uid)
+    if puesto:
+        linea_puesto = f"🏅 Ranking: puesto #{puesto} de {len(ranking_xp)}"
+    else:
+        linea_puesto = "🏅 Ranking: todavía sin XP"
 
-    refs = cargar_ref()
-    info_ref = refs.get(str(uid), {"ref_by": None, "referred": [], "premios": []})
-    ref_by = info_ref.get("ref_by")
-    referred = info_ref.get("referred", [])
-    premios = info_ref.get("premios", [])
+    ref_by = grafo_ref.padre(uid)
+    referred = grafo_ref.hijos(uid)
+    premios = grafo_ref.premios(uid)
 
     texto = (
         "📄 *Tu perfil competitivo*\n\n"
         f"🆔 ID: `{uid}`\n\n"
         f"⭐ Nivel: {lvl} – *{lvl_n}*\n"
-        f"📈 XP total: {xp}\n\n"
+        f"📈 XP total: {xp}\n"
+        f"{linea_puesto}\n\n"
         f"💎 Estado Premium: {prem_info}\n\n"
         f"👥 Referidos: {len(referred)}\n"
         f"🎁 Bonos obtenidos por referidos: {len(premios)}\n"
@@ -753,12 +935,39 @@ async def perfil(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(texto, parse_mode="Markdown")
 
 
+async def ranking(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Top 10 por XP y el puesto de quien pregunta."""
+    uid = update.effective_user.id
+    registrar_usuario(uid)
+
+    top = ranking_xp.top(10)
+    if not top:
+        await update.message.reply_text("Todavía nadie sumó XP. ¡Sé el primero! 🔥")
+        return
+
+    texto = "🏅 *RANKING XP*\n\n"
+    for u, xp in top:
+        marca = " ← vos" if u == uid else ""
+        # Con empate comparten puesto, igual que en /perfil
+        texto += f"{ranking_xp.puesto(u)}. `{u}` – {xp} XP (nivel {get_level(xp)}){marca}\n"
+
+    puesto = ranking_xp.puesto(uid)
+    if puesto is None:
+        texto += "\nTodavía no tenés XP: usá el chat IA o los menús para sumar."
+    elif uid not in dict(top):
+        # Con empates el puesto no dice si entró en el top: puede compartir
+        # el #10 y quedar afuera por el desempate
+        texto += f"\nVos: puesto #{puesto} de {len(ranking_xp)} con {ranking_xp.get(uid)} XP."
+
+    await update.message.reply_text(texto, parse_mode="Markdown")
+
+
 async def referidos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
-    refs = cargar_ref()
-    info = refs.get(str(uid), {"ref_by": None, "referred": [], "premios": []})
-    referred = info.get("referred", [])
-    premios = info.get("premios", [])
+    registrar_usuario(uid)
+    referred = grafo_ref.hijos(uid)
+    premios = grafo_ref.premios(uid)
+    red = grafo_ref.descendientes(uid)
 
     texto = (
         "🎟 *Sistema de referidos*\n\n"
@@ -766,6 +975,7 @@ async def referidos(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "vos ganás *7 días de Premium* por cada uno.\n\n"
         f"🆔 *Tu código de referido:* `{uid}`\n\n"
         f"👥 Referidos registrados: {len(referred)}\n"
+        f"🌳 Tu red completa (referidos de tus referidos incluidos): {red}\n"
         f"🎁 Bonos ya usados: {len(premios)}\n\n"
         "Tus amigos tienen que usar:\n"
         f"`/usarref {uid}`\n"
@@ -775,6 +985,7 @@ async def referidos(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def usarref(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
+    registrar_usuario(user_id)
     try:
         ref_id = int(context.args[0])
     except Exception:
@@ -788,6 +999,7 @@ async def usarref(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def replay_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    registrar_usuario(update.effective_user.id)
     await update.message.reply_text(
         "🎥 *Analizar replay / partida*\n\n"
         "Mandame un mensaje contando:\n"
@@ -799,6 +1011,19 @@ async def replay_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Y te explico qué podrías haber hecho distinto y cómo jugar esa situación como un jugador PRO.",
         parse_mode="Markdown",
     )
+
+
+async def olvidar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uid = update.effective_user.id
+    registrar_usuario(uid)
+    memoria_ia.olvidar(uid)
+    await update.message.reply_text(
+        "🧹 Listo, borré nuestra charla. La próxima pregunta empieza de cero.\n"
+        "Acordate de contarme tu DPI, plataforma y rango si querés algo a medida.",
+        parse_mode="Markdown",
+    )
+
+
 # ==========================
 #   PANEL ADMIN
 # ==========================
@@ -808,36 +1033,13 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
         return
 
-    usuarios = cargar_usuarios()
-    premium = cargar_premium()
-    xp_data = cargar_xp()
-
-    total_users = len(usuarios)
-    total_premium = 0
-    total_plus = 0
-    total_life = 0
-
-    for uid, entry in premium.items():
-        if isinstance(entry, str):
-            if not vencio_premium(entry):
-                total_premium += 1
-        else:
-            plan = entry.get("plan", "standard")
-            life = entry.get("lifetime", False)
-            exp = entry.get("exp")
-
-            if life:
-                total_life += 1
-                if plan == "plus":
-                    total_plus += 1
-                else:
-                    total_premium += 1
-            else:
-                if exp and not vencio_premium(exp):
-                    if plan == "plus":
-                        total_plus += 1
-                    else:
-                        total_premium += 1
+    # Contadores mantenidos por los índices: no se recorre ningún archivo.
+    # refrescar() no se come los avisos de vencimiento (son del job)
+    premium_idx.refrescar()
+    total_users = len(registro)
+    total_premium = premium_idx.total_standard
+    total_plus = premium_idx.total_plus
+    total_life = premium_idx.total_life
 
     texto = (
         "📊 *ESTADÍSTICAS DEL BOT*\n\n"
@@ -845,8 +1047,103 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"💎 Premium Standard activos: {total_premium}\n"
         f"💜 Premium PLUS activos: {total_plus}\n"
         f"🏆 Premium de por vida (incluye Plus): {total_life}\n"
-        f"📈 Usuarios con XP registrado: {len(xp_data)}\n"
+        f"📈 Usuarios con XP registrado: {len(ranking_xp)}\n\n"
+        f"🚫 Usuarios inalcanzables: {len(entregas)}\n"
+        f"📭 Envíos evitados: {entregas.evitados}\n"
+        f"🔁 Reactivados al volver a escribir: {entregas.reactivados}\n"
     )
+    for motivo, n in sorted(entregas.por_motivo().items()):
+        texto += f"   • {motivo}: {n}\n"
+
+    await update.message.reply_text(texto, parse_mode="Markdown")
+
+
+async def colaia(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Profundidad y espera de la cola IA por plan (para dimensionar IA_WORKERS)."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    texto = f"🧵 *COLA IA* – workers: {cola_ia.n_workers}, en curso: {ia.en_curso}\n\n"
+    for carril, st in cola_ia.estado().items():
+        texto += (
+            f"*{carril.upper()}*\n"
+            f"• En cola: {st['en_cola']}/{st['capacidad']}\n"
+            f"• Atendidos: {st['atendidos']} – Rechazados: {st['rechazados']}\n"
+            f"• Espera media: {st['espera_media']:.2f}s – máx: {st['espera_max']:.2f}s\n\n"
+        )
+    texto += (
+        f"🚦 *Límite por usuario*: {len(limitador_ia)} buckets – "
+        + " – ".join(
+            f"{plan}: {limitador_ia.permitidos[plan]} ok / {limitador_ia.rechazados[plan]} frenados"
+            for plan in limitador_ia.planes
+        )
+        + "\n"
+        f"📉 *Carga IA*: latencia media {control_carga.ewma:.1f}s (SLO {control_carga.slo:.0f}s) – "
+        f"{'RECORTANDO Standard' if control_carga.activo else 'normal'} – "
+        f"{control_carga.rechazados} rechazados en {control_carga.episodios} picos\n\n"
+    )
+    texto += (
+        f"🗃 *Cache IA*: {len(cache_ia)} respuestas – hit rate {cache_ia.hit_rate:.0%} "
+        f"({cache_ia.hits} hits, {cache_ia.hits_fuzzy} casi iguales, {cache_ia.misses} misses)"
+    )
+    await update.message.reply_text(texto, parse_mode="Markdown")
+
+
+async def intenciones(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Cuántos mensajes cayeron en cada intención y cuánto tarda clasificarlos."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    lat = router_intenciones.latencias()
+    texto = "🧭 *INTENCIONES*\n\n"
+    for nombre, n in router_intenciones.clasificados.items():
+        texto += f"• {nombre.replace('_', ' ')}: {n}\n"
+    texto += (
+        f"• sin intención (IA): {router_intenciones.sin_intencion}\n\n"
+        f"⏱ Clasificación (últimos {lat['muestras']}): "
+        f"p50 {lat['p50']:.0f} µs · p99 {lat['p99']:.0f} µs · máx {lat['max']:.0f} µs"
+    )
+    await update.message.reply_text(texto, parse_mode="Markdown")
+
+
+async def arbolref(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /arbolref <id>: cadena hacia arriba, referidos y red de ese usuario.
+    /arbolref sin id: ciclos sospechosos y los que más refirieron.
+    """
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    if context.args:
+        try:
+            uid = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("Uso: /arbolref [id]")
+            return
+        cadena = grafo_ref.ancestros(uid)
+        texto = (
+            f"🌳 *Referidos de* `{uid}`\n\n"
+            f"⬆️ Cadena: {' → '.join(f'`{u}`' for u in cadena) or 'nadie'}\n"
+            f"👥 Directos: {len(grafo_ref.hijos(uid))}\n"
+            f"🌳 Red total: {grafo_ref.descendientes(uid)}\n"
+            f"🎁 Bonos cobrados: {len(grafo_ref.premios(uid))}\n"
+        )
+        if grafo_ref.en_ciclo(uid):
+            texto += "\n⚠️ Está en un ciclo de referidos (no cobra bonos)."
+        await update.message.reply_text(texto, parse_mode="Markdown")
+        return
+
+    ciclos = grafo_ref.ciclos()
+    texto = f"🔁 *Ciclos de referidos:* {len(ciclos)}\n"
+    for ciclo in ciclos[:20]:
+        texto += "• " + " → ".join(f"`{u}`" for u in ciclo) + "\n"
+
+    texto += "\n🏆 *Más referidos directos:*\n"
+    for u, directos in grafo_ref.mas_referidores(10):
+        texto += (
+            f"• `{u}` – {directos} directos, red {grafo_ref.descendientes(u)}, "
+            f"bonos {len(grafo_ref.premios(u))}\n"
+        )
     await update.message.reply_text(texto, parse_mode="Markdown")
 
 
@@ -854,36 +1151,25 @@ async def premiumactivos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
         return
 
-    premium = cargar_premium()
+    ahora = time.time()
     lineas = []
-    for uid, entry in premium.items():
-        estado = "INACTIVO"
-        plan = "Standard"
-        life = False
-        exp = None
-
-        if isinstance(entry, str):
-            life = False
-            plan = "Standard"
-            exp = entry
-            if not vencio_premium(entry):
-                estado = "ACTIVO"
+    for uid, (plan, life, exp) in premium_idx.items():
+        if len(lineas) >= 120:
+            break
+
+        if life:
+            estado = "LIFE"
+        elif premium_idx.es_premium(uid, ahora):
+            estado = "ACTIVO"
         else:
-            plan = entry.get("plan", "Standard")
-            life = entry.get("lifetime", False)
-            exp = entry.get("exp")
-            if life:
-                estado = "LIFE"
-            else:
-                if exp and not vencio_premium(exp):
-                    estado = "ACTIVO"
+            estado = "INACTIVO"
 
-        lineas.append(f"{uid} – {plan} – {estado} – exp: {exp}")
+        lineas.append(f"{uid} – {plan} – {estado} – exp: {epoch_a_fecha(exp)}")
 
     if not lineas:
         texto = "No hay usuarios en el sistema premium."
     else:
-        texto = "💎 *Premium registrados:*\n\n" + "\n".join(lineas[:120])
+        texto = "💎 *Premium registrados:*\n\n" + "\n".join(lineas)
 
     await update.message.reply_text(texto, parse_mode="Markdown")
 
@@ -899,17 +1185,10 @@ async def difundir(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     msg = " ".join(context.args)
-    usuarios = cargar_usuarios()
-    enviados = 0
-    for uid in usuarios:
-        try:
-            await context.bot.send_message(chat_id=uid, text=msg, parse_mode="Markdown")
-            enviados += 1
-        except Exception:
-            pass
+    lanzar_difusion(context.application, msg, "difundir")
 
     await update.message.reply_text(
-        f"Mensaje enviado a {enviados} usuarios.", parse_mode="Markdown"
+        f"📣 Difusión iniciada para {len(registro)} usuarios. Te voy avisando el progreso."
     )
 
 
@@ -918,25 +1197,24 @@ async def competencia(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
         return
 
-    xp_data = cargar_xp()
-    if not xp_data:
+    if not len(ranking_xp):
         await update.message.reply_text(
             "No hay datos de XP todavía.", parse_mode="Markdown"
         )
         return
 
-    # top 3 por XP
-    top = sorted(xp_data.items(), key=lambda x: x[1], reverse=True)[:3]
+    # top 3 por XP, directo del ranking (sin ordenar todo)
+    top = ranking_xp.top(3)
 
     texto = "🏆 *RESULTADOS COMPETENCIA XP*\n\n"
     pos = 1
-    for uid_str, xp in top:
-        uid = int(uid_str)
+    for uid, xp in top:
         add_days_premium(uid, 7, plan="standard")
         texto += f"{pos}️⃣ `{uid}` – {xp} XP → +7 días Premium\n"
         pos += 1
         try:
-            await context.bot.send_message(
+            await enviar_dm(
+                context.bot,
                 chat_id=uid,
                 text=(
                     "🏆 *Felicitaciones!*\n\n"
@@ -1063,9 +1341,213 @@ async def handle_payment_photo(update: Update, context: ContextTypes.DEFAULT_TYP
 #   CHAT IA PREMIUM + GANCHOS
 # ==========================
 
+SYSTEM_PROMPT = (
+    "Sos un COACH PROFESIONAL de Fortnite competitivo (FNCS, Cash Cups, scrims). "
+    "Respondés SIEMPRE en español, directo, concreto y útil. "
+    "Dás consejos de configuración, sens, AIM, mecánicas, rotaciones, mentalidad, "
+    "y todo lo relacionado al rendimiento competitivo en Fortnite."
+)
+
 GREETINGS = ["hola", "holaa", "buenas", "buenass", "hello", "ola", "hi", "buenas tardes", "buenos dias", "buenas noches"]
 
 
+async def intencion_saludo(update: Update, context: ContextTypes.DEFAULT_TYPE, dato):
+    await start(update, context)
+    return True
+
+
+async def intencion_sens_pro(update: Update, context: ContextTypes.DEFAULT_TYPE, dato):
+    await update.message.reply_text(dato, parse_mode="Markdown")
+    return True
+
+
+async def intencion_premium(update: Update, context: ContextTypes.DEFAULT_TYPE, dato):
+    await update.message.reply_text(
+        "💎 *Premium incluye:*\n"
+        "• Chat IA PRO ilimitado\n"
+        "• Rutinas diarias\n"
+        "• Drops competitivos\n"
+        "• Optimización de PC\n"
+        "• Análisis de partidas y nivel\n\n"
+        "Usá /premiuminfo o /menu y tocá *VER PREMIUM* para ver cómo activarlo.",
+        parse_mode="Markdown",
+    )
+    return True
+
+
+async def intencion_sens_pros(update: Update, context: ContextTypes.DEFAULT_TYPE, dato):
+    await update.message.reply_text(
+        "🧩 *Sensibilidades de PROS*\n\n"
+        "Puedo darte sens exactas de varios pros (Clix, Bugha, Peterbot, Pollo, etc.) "
+        "y también armarte una sens personalizada basada en ellos.\n\n"
+        "Mandame tu DPI, resolución y estilo (agresivo/pasivo) y te ajusto algo a tu medida.",
+        parse_mode="Markdown",
+    )
+    return True
+
+
+def intencion_seccion(seccion: str):
+    """
+    Temas PREMIUM del menú: el premium sigue de largo a la IA (que le
+    responde sobre su caso), el resto recibe la sección con lo que incluye.
+    """
+    async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE, dato):
+        if es_premium(update.effective_user.id):
+            return False
+        await update.message.reply_text(text_section(seccion), parse_mode="Markdown")
+        return True
+
+    return handler
+
+
+# Orden de evaluación = prioridad (menor gana). Para sumar una intención
+# alcanza con agregar una entrada: todas las frases comparten un solo regex.
+INTENCIONES = [
+    {
+        "nombre": "saludo",
+        "prioridad": 10,
+        "empieza": GREETINGS,
+        "contiene": ["ayuda", "coach"],
+        "handler": intencion_saludo,
+    },
+    {
+        # Sens de PROS exacta (Clix, Peterbot, Pollo, Bugha, etc.)
+        "nombre": "sens_pro",
+        "prioridad": 20,
+        "detectar": obtener_sens_pro_desde_texto,
+        "handler": intencion_sens_pro,
+    },
+    {
+        "nombre": "premium",
+        "prioridad": 30,
+        "contiene": ["premium", "pagar", "pago", "precio"],
+        "handler": intencion_premium,
+    },
+    {
+        "nombre": "sens_pros",
+        "prioridad": 40,
+        "contiene": ["sens pros", "sensibilidad de pros", "sensibilidades de pros"],
+        "handler": intencion_sens_pros,
+    },
+    {
+        "nombre": "optimizar_pc",
+        "prioridad": 50,
+        "contiene": [
+            "optimizar pc", "optimizar la pc", "optimizar mi pc", "optimizar el pc",
+            "mas fps", "más fps", "subir fps", "input lag",
+        ],
+        "handler": intencion_seccion("optimizar"),
+    },
+    {
+        "nombre": "drops",
+        "prioridad": 60,
+        "contiene": ["drop", "donde caer", "dónde caer", "donde caigo", "dónde caigo", "rotaciones"],
+        "handler": intencion_seccion("mapas"),
+    },
+]
+
+router_intenciones = RouterIntenciones(INTENCIONES)
+
+
+TELEGRAM_MAX_CHARS = 4096
+CURSOR = " ▌"
+
+
+def partir_mensaje(texto: str, limite: int = TELEGRAM_MAX_CHARS):
+    """
+    Corta el texto en partes de hasta `limite` caracteres, preferentemente en
+    un salto de línea o un espacio. Las partes concatenadas dan el original.
+    """
+    partes = []
+    while len(texto) > limite:
+        corte = texto.rfind("\n", 0, limite)
+        if corte < limite // 2:
+            corte = texto.rfind(" ", 0, limite)
+        if corte < limite // 2:
+            corte = limite
+        else:
+            corte += 1
+        partes.append(texto[:corte])
+        texto = texto[corte:]
+    partes.append(texto)
+    return partes
+
+
+async def mantener_escribiendo(bot, chat_id, listo: asyncio.Event):
+    """'escribiendo…' hasta que aparezca el primer texto (Telegram lo borra a los 5 s)."""
+    while not listo.is_set():
+        try:
+            await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(listo.wait(), timeout=4.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def editar_mensaje(msg, texto: str, final: bool = False):
+    try:
+        await msg.edit_text(texto)
+    except RetryAfter as e:
+        # Edición intermedia: se saltea. La final sí tiene que llegar.
+        if final:
+            await asyncio.sleep(e.retry_after)
+            await msg.edit_text(texto)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+
+
+async def responder_ia_en_vivo(update: Update, messages, listo: asyncio.Event) -> str:
+    """
+    Manda la respuesta de la IA mientras se genera: un mensaje apenas llegan
+    los primeros tokens y ediciones espaciadas con el resto. Si se pasa de
+    4096 caracteres, cierra ese mensaje y sigue en uno nuevo.
+    """
+    limite = TELEGRAM_MAX_CHARS - len(CURSOR)
+    texto = ""
+    base = 0  # dónde empieza, dentro de texto, el mensaje que se está editando
+    msg = None
+    ultima_edicion = 0.0
+
+    async for trozo in ia.responder_stream(messages):
+        texto += trozo
+        actual = texto[base:]
+
+        while len(actual) > limite:
+            parte = partir_mensaje(actual, limite)[0]
+            if msg is None:
+                await update.message.reply_text(parte)
+            else:
+                await editar_mensaje(msg, parte, final=True)
+            listo.set()
+            base += len(parte)
+            actual = texto[base:]
+            msg = None
+
+        ahora = time.monotonic()
+        if msg is None:
+            if actual.strip():
+                msg = await update.message.reply_text(actual + CURSOR)
+                listo.set()
+                ultima_edicion = ahora
+        elif ahora - ultima_edicion >= IA_STREAM_EDIT_INTERVAL:
+            await editar_mensaje(msg, actual + CURSOR)
+            ultima_edicion = ahora
+
+    if not texto.strip():
+        raise ValueError("respuesta vacía de la IA")
+
+    actual = texto[base:]
+    if msg is None:
+        if actual.strip():
+            await update.message.reply_text(actual)
+    else:
+        await editar_mensaje(msg, actual, final=True)
+    return texto
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     registrar_usuario(uid)
@@ -1073,79 +1555,190 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text or ""
     low = text.lower().strip()
 
-    # 1) Saludos o pedido de ayuda → mostrar /start
-    if any(low.startswith(g) for g in GREETINGS) or "ayuda" in low or "coach" in low:
-        await start(update, context)
-        return
-
-    # 2) Sens de PROS exacta (Clix, Peterbot, Pollo, Bugha, etc.)
-    resp_sens = obtener_sens_pro_desde_texto(low)
-    if resp_sens:
-        await update.message.reply_text(resp_sens, parse_mode="Markdown")
+    # 1-4) Saludo, sens de un pro, premium, temas del menú (ver INTENCIONES)
+    intencion, dato = router_intenciones.clasificar(low)
+    if intencion is not None and await intencion["handler"](update, context, dato):
         return
 
-    # 3) Frases relacionadas con premium / pagar
-    if "premium" in low or "pagar" in low or "pago" in low or "precio" in low:
+    # 5) Si NO es Premium, no puede usar IA PRO libre
+    if not es_premium(uid):
         await update.message.reply_text(
-            "💎 *Premium incluye:*\n"
-            "• Chat IA PRO ilimitado\n"
-            "• Rutinas diarias\n"
-            "• Drops competitivos\n"
-            "• Optimización de PC\n"
-            "• Análisis de partidas y nivel\n\n"
+            "🤖 El chat IA avanzado es solo para *usuarios PREMIUM*.\n\n"
             "Usá /premiuminfo o /menu y tocá *VER PREMIUM* para ver cómo activarlo.",
             parse_mode="Markdown",
         )
         return
 
-    # 4) Mensajes sobre sensibilidades de pros en general
-    if (
-        "sens pros" in low
-        or "sensibilidad de pros" in low
-        or "sensibilidades de pros" in low
-    ):
+    # 6) IA PRO (solo para Premium) + XP
+    # La cache guarda respuestas a preguntas sin contexto (primer turno). Con
+    # historial también se usa si la pregunta se entiende sola, con los datos
+    # que el jugador ya contó (DPI, plataforma...) en la clave. Una repregunta
+    # ("y con 400 dpi?") o una pregunta sobre sí mismo ("que sens me
+    # recomendas?") va siempre a la IA
+    contexto_cache = memoria_ia.contexto_cache(uid, text)
+    cacheada = cache_ia.get(text, contexto_cache) if contexto_cache is not None else None
+    if cacheada is not None:
+        for parte in partir_mensaje(cacheada):
+            await update.message.reply_text(parte)
+        memoria_ia.agregar(uid, text, cacheada)
+        add_xp(uid, 5)
+        return
+
+    # Un usuario no puede acaparar la IA: token bucket por plan
+    carril = "plus" if es_premium_plus(uid) else "standard"
+    espera = limitador_ia.tomar(uid, carril)
+    if espera:
         await update.message.reply_text(
-            "🧩 *Sensibilidades de PROS*\n\n"
-            "Puedo darte sens exactas de varios pros (Clix, Bugha, Peterbot, Pollo, etc.) "
-            "y también armarte una sens personalizada basada en ellos.\n\n"
-            "Mandame tu DPI, resolución y estilo (agresivo/pasivo) y te ajusto algo a tu medida.",
-            parse_mode="Markdown",
+            f"🐢 Vas muy rápido. Dame {max(1, round(espera))}s y preguntame de nuevo."
         )
         return
 
-    # 5) Si NO es Premium, no puede usar IA PRO libre
-    if not es_premium(uid):
+    # IA saturada (latencia arriba del SLO): primero se corta Standard.
+    # Lo rechazado de acá en adelante no gasta el token del limitador
+    if not control_carga.admitir(carril):
+        limitador_ia.devolver(uid, carril)
         await update.message.reply_text(
-            "🤖 El chat IA avanzado es solo para *usuarios PREMIUM*.\n\n"
-            "Usá /premiuminfo o /menu y tocá *VER PREMIUM* para ver cómo activarlo.",
-            parse_mode="Markdown",
+            "⏳ La IA está muy cargada en este momento. "
+            "Probá de nuevo en unos minutos (los PLUS tienen prioridad)."
         )
         return
 
-    # 6) IA PRO (solo para Premium) + XP
-    try:
-        r = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Sos un COACH PROFESIONAL de Fortnite competitivo (FNCS, Cash Cups, scrims). "
-                        "Respondés SIEMPRE en español, directo, concreto y útil. "
-                        "Dás consejos de configuración, sens, AIM, mecánicas, rotaciones, mentalidad, "
-                        "y todo lo relacionado al rendimiento competitivo en Fortnite."
-                    ),
-                },
-                {"role": "user", "content": text},
-            ],
+    messages = memoria_ia.mensajes(uid, SYSTEM_PROMPT, text)
+
+    listo = asyncio.Event()
+    if IA_STREAMING:
+        trabajo = functools.partial(responder_ia_en_vivo, update, messages, listo)
+    else:
+        trabajo = functools.partial(ia.responder, messages)
+
+    inicio = time.monotonic()
+    pedido = cola_ia.enviar(carril, trabajo)
+    if pedido is None:
+        limitador_ia.devolver(uid, carril)
+        await update.message.reply_text(
+            "⏳ Estoy respondiendo a muchos jugadores a la vez. Probá de nuevo en un minuto."
         )
-        reply = r.choices[0].message.content
-        await update.message.reply_text(reply)
+        return
+
+    # "escribiendo…" desde ya, aunque el pedido todavía esté en la cola
+    escribiendo = asyncio.create_task(
+        mantener_escribiendo(context.bot, update.effective_chat.id, listo)
+    )
+    try:
+        reply = await pedido
+        # Cola + respuesta completa: lo que espera el usuario
+        control_carga.observar(time.monotonic() - inicio)
+        if contexto_cache is not None:
+            cache_ia.put(text, reply, contexto_cache)
+        memoria_ia.agregar(uid, text, reply)
+        if not IA_STREAMING:
+            for parte in partir_mensaje(reply):
+                await update.message.reply_text(parte)
         add_xp(uid, 5)
 
     except Exception:
+        # Un timeout también es latencia (la peor)
+        control_carga.observar(time.monotonic() - inicio)
         await update.message.reply_text("⚠️ Hubo un problema al hablar con la IA.")
 
+    finally:
+        listo.set()
+        await escribiendo
+
+
+# ==========================
+#   DIFUSIÓN MASIVA
+# ==========================
+
+
+async def enviar_dm(bot, chat_id, text, parse_mode=None, **kwargs) -> bool:
+    """
+    send_message para mensajes a usuarios. Saltea a los que ya sabemos que
+    no reciben (y lo cuenta como envío evitado); si Telegram contesta que
+    bloqueó el bot o que el chat no existe, lo anota para la próxima.
+    RetryAfter y errores de red siguen subiendo como antes.
+    """
+    if entregas.evitar(chat_id):
+        return False
+    try:
+        await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode, **kwargs)
+        return True
+    except (Forbidden, BadRequest) as e:
+        entregas.registrar_error(chat_id, e)
+        return False
+
+
+def texto_progreso(dif: Difusion, final: bool = False) -> str:
+    p = dif.progreso()
+    cabecera = "✅ Difusión terminada" if final else "📣 Difusión en curso"
+    texto = (
+        f"{cabecera} ({dif.estado['id']})\n\n"
+        f"Enviados: {p['enviados']}\n"
+        f"Fallidos: {p['fallidos']}\n"
+        f"Restantes: {p['restantes']} de {p['total']}\n"
+    )
+    if not final and p["eta"] is not None:
+        minutos, segundos = divmod(int(p["eta"]), 60)
+        texto += f"Ritmo: {p['por_segundo']:.1f} msg/s · ETA {minutos}m {segundos:02d}s"
+    return texto
+
+
+async def correr_difusion(bot, dif: Difusion):
+    async def al_progresar(d: Difusion):
+        final = d.procesados >= d.total
+        texto = texto_progreso(d, final)
+        msg_id = d.estado.get("progreso_msg_id")
+        if msg_id is None:
+            msg = await bot.send_message(chat_id=d.estado["admin_chat"], text=texto)
+            d.estado["progreso_msg_id"] = msg.message_id
+            return
+        try:
+            await bot.edit_message_text(
+                chat_id=d.estado["admin_chat"], message_id=msg_id, text=texto
+            )
+        except BadRequest:
+            # "message is not modified" o el mensaje ya no existe
+            pass
+
+    await dif.correr(
+        functools.partial(enviar_dm, bot),
+        limitador_envios,
+        concurrencia=DIFUSION_CONCURRENCIA,
+        # Sin admin_chat (tandas del warm-up) no se reporta progreso
+        al_progresar=al_progresar if dif.estado.get("admin_chat") else None,
+        cada_segundos=DIFUSION_PROGRESO_INTERVAL,
+    )
+
+
+def lanzar_difusion(app, texto: str, nombre: str, parse_mode="Markdown", destinatarios=None, admin_chat=ADMIN_ID):
+    """
+    Arranca un envío masivo en segundo plano (por defecto a todos los
+    usuarios): el handler o el job que lo pide vuelve enseguida y el bot
+    sigue atendiendo.
+    """
+    if destinatarios is None:
+        destinatarios = registro
+    dif = Difusion.crear(
+        DIFUSION_DIR,
+        texto,
+        entregas.filtrar(destinatarios),
+        parse_mode=parse_mode,
+        admin_chat=admin_chat,
+        nombre=nombre,
+        worker=BOT_WORKER,
+    )
+    app.create_task(correr_difusion(app.bot, dif))
+    return dif
+
+
+async def reanudar_difusiones_job(context: ContextTypes.DEFAULT_TYPE):
+    # Sólo las de este proceso: las de otro worker las sigue mandando él.
+    # Las sin dueño (bot.py solo, o de antes del pool) las retoma el worker 0
+    workers = {BOT_WORKER, ""} if BOT_WORKER in ("", "0") else {BOT_WORKER}
+    for dif in Difusion.pendientes(DIFUSION_DIR, workers):
+        print(f"📣 Reanudando difusión {dif.estado['id']} ({dif.procesados}/{dif.total})")
+        context.application.create_task(correr_difusion(context.bot, dif))
+
 
 # ==========================
 #   DESCUENTO MENSUAL AUTOMÁTICO
@@ -1153,12 +1746,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def activar_descuento_mensual(context: ContextTypes.DEFAULT_TYPE):
+    # Lo corre la agenda el día 1 (o apenas arranca el bot, si un reinicio
+    # se comió las 00:00 y no pasaron DESCUENTO_GRACIA_HORAS)
     hoy = datetime.now()
 
-    # Solo se activa el día 1 del mes
-    if hoy.day != 1:
-        return
-
     # Activar descuento por 24 horas
     DESCUENTO_MENSUAL["activo"] = True
     DESCUENTO_MENSUAL["expira"] = (hoy + timedelta(hours=24)).strftime(
@@ -1178,19 +1769,12 @@ async def activar_descuento_mensual(context: ContextTypes.DEFAULT_TYPE):
         "➡ https://paypal.me/botpremiumfort/2.5"
     )
 
-    usuarios = cargar_usuarios()
-    for uid in usuarios:
-        try:
-            await context.bot.send_message(
-                chat_id=uid, text=mensaje, parse_mode="Markdown"
-            )
-        except Exception:
-            pass
+    lanzar_difusion(context.application, mensaje, "descuento")
 
-    # Aviso al admin
+    # Aviso al admin (el progreso del envío llega aparte)
     await context.bot.send_message(
         chat_id=ADMIN_ID,
-        text="📣 El descuento mensual fue activado y enviado a todos los usuarios.",
+        text="📣 El descuento mensual fue activado y se está enviando a todos los usuarios.",
         parse_mode="Markdown",
     )
 
@@ -1220,19 +1804,86 @@ WARMUPS = [
 ]
 
 
+def repartir_en_tandas(user_ids, tandas: int):
+    """
+    Una sola pasada: cada user_id cae siempre en la misma tanda, así cada
+    usuario recibe el warm-up más o menos a la misma hora todos los días.
+    El hash multiplicativo evita tandas vacías si los ids vienen con patrón.
+    """
+    res = [[] for _ in range(tandas)]
+    for uid in user_ids:
+        res[((uid * 2654435761 & 0xFFFFFFFF) >> 16) % tandas].append(uid)
+    return res
+
+
+# Tandas del warm-up del día: se arman una vez, en la primera tanda que
+# corre (o la primera después de un reinicio), y las demás sólo las leen
+_tandas_warmup = {"base": None, "tandas": []}
+
+
 async def enviar_warmup_diario(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Una tanda del warm-up: la agenda la llama WARMUP_TANDAS veces en
+    WARMUP_VENTANA_MIN minutos, en vez de una ráfaga a las 15:00. La pasada
+    por todos los activos se hace una vez por día, no una por tanda; los
+    que se hacen premium en medio de la ventana reciben el del día siguiente.
+    """
     import random
 
-    warmup = random.choice(WARMUPS)
-    premium = cargar_premium()
+    data = context.job.data
+    if _tandas_warmup["base"] != data["base"]:
+        _tandas_warmup["base"] = data["base"]
+        _tandas_warmup["tandas"] = repartir_en_tandas(premium_idx.activos(), data["tandas"])
+    # El que venció desde que se armaron las tandas ya no lo recibe
+    uids = [uid for uid in _tandas_warmup["tandas"][data["tanda"]] if premium_idx.es_premium(uid)]
+    if not uids:
+        return
+    # El mismo warm-up en todas las tandas del día, aunque haya un reinicio en el medio
+    warmup = random.Random(data["base"].toordinal()).choice(WARMUPS)
+    lanzar_difusion(
+        context.application,
+        warmup,
+        f"warmup{data['tanda']}",
+        destinatarios=uids,
+        admin_chat=None,
+    )
+
 
-    for uid_str, entry in premium.items():
-        uid = int(uid_str)
-        if not es_premium(uid):
-            continue
+# ==========================
+#   VENCIMIENTOS PREMIUM
+# ==========================
+
+
+async def revisar_vencimientos(context: ContextTypes.DEFAULT_TYPE):
+    """Avisa a los que están por vencer y a los que ya vencieron."""
+    a_avisar, vencidos = premium_idx.procesar()
+
+    for uid in a_avisar:
         try:
-            await context.bot.send_message(
-                chat_id=uid, text=warmup, parse_mode="Markdown"
+            await enviar_dm(
+                context.bot,
+                chat_id=uid,
+                text=(
+                    f"⏳ *Tu Premium vence en {AVISO_VENCIMIENTO_DIAS} días.*\n\n"
+                    "Renovalo para no perder la IA PRO, las rutinas y los drops competitivos.\n"
+                    "Usá /premiuminfo para ver los planes."
+                ),
+                parse_mode="Markdown",
+            )
+        except Exception:
+            pass
+
+    for uid in vencidos:
+        try:
+            await enviar_dm(
+                context.bot,
+                chat_id=uid,
+                text=(
+                    "⌛ *Tu Premium venció.*\n\n"
+                    "Gracias por entrenar conmigo. Cuando quieras volver, "
+                    "usá /premiuminfo y te reactivo al toque. 💎"
+                ),
+                parse_mode="Markdown",
             )
         except Exception:
             pass
@@ -1254,15 +1905,12 @@ async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         modo = context.args[1].lower()
         uid_int = int(uid_str)
 
-        data = cargar_premium()
-
         if modo in ["life", "lifetime", "vida", "perma", "permanente"]:
-            data[uid_str] = {
+            set_premium(uid_int, {
                 "lifetime": True,
                 "exp": None,
                 "plan": "standard",
-            }
-            guardar_premium(data)
+            })
 
             await update.message.reply_text(
                 f"✅ *Premium DE POR VIDA activado para {uid_str}* 🏆",
@@ -1270,7 +1918,8 @@ async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
             try:
-                await context.bot.send_message(
+                await enviar_dm(
+                    context.bot,
                     chat_id=uid_int,
                     text=(
                         "🏆 *Tu Premium de por vida fue activado.*\n\n"
@@ -1291,8 +1940,7 @@ async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             dias = int(modo)
             add_days_premium(uid_int, dias, plan="standard")
 
-            data = cargar_premium()
-            entry = data[uid_str]
+            entry = store.get_premium(uid_int)
             exp_str = entry["exp"] if isinstance(entry, dict) else entry
 
             await update.message.reply_text(
@@ -1302,7 +1950,8 @@ async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
             try:
-                await context.bot.send_message(
+                await enviar_dm(
+                    context.bot,
                     chat_id=uid_int,
                     text=(
                         f"💎 *Tu Premium fue activado por {dias} días.*\n"
@@ -1340,15 +1989,12 @@ async def premiumplus_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         modo = context.args[1].lower()
         uid_int = int(uid_str)
 
-        data = cargar_premium()
-
         if modo in ["life", "lifetime", "vida", "perma", "permanente"]:
-            data[uid_str] = {
+            set_premium(uid_int, {
                 "lifetime": True,
                 "exp": None,
                 "plan": "plus",
-            }
-            guardar_premium(data)
+            })
 
             await update.message.reply_text(
                 f"✅ *Premium PLUS DE POR VIDA activado para {uid_str}* 🏆",
@@ -1356,7 +2002,8 @@ async def premiumplus_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
 
             try:
-                await context.bot.send_message(
+                await enviar_dm(
+                    context.bot,
                     chat_id=uid_int,
                     text=(
                         "💜 *Tu Premium PLUS de por vida fue activado.*\n\n"
@@ -1373,8 +2020,7 @@ async def premiumplus_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             dias = int(modo)
             add_days_premium(uid_int, dias, plan="plus")
 
-            data = cargar_premium()
-            entry = data[uid_str]
+            entry = store.get_premium(uid_int)
             exp_str = entry["exp"] if isinstance(entry, dict) else entry
 
             await update.message.reply_text(
@@ -1384,7 +2030,8 @@ async def premiumplus_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
 
             try:
-                await context.bot.send_message(
+                await enviar_dm(
+                    context.bot,
                     chat_id=uid_int,
                     text=(
                         f"💜 *Tu Premium PLUS fue activado por {dias} días.*\n"
@@ -1416,8 +2063,109 @@ async def premiumplus_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 # ==========================
 
 
-def main():
-    app = ApplicationBuilder().token(TOKEN).build()
+async def compactar_usuarios_job(context: ContextTypes.DEFAULT_TYPE):
+    registro.compactar()
+    if STORAGE_BACKEND == "sqlite":
+        store.purgar_cambios()
+
+
+async def flush_xp_job(context: ContextTypes.DEFAULT_TYPE):
+    xp_buffer.flush()
+
+
+async def guardar_cache_ia_job(context: ContextTypes.DEFAULT_TYPE):
+    cache_ia.guardar(IA_CACHE_FILE)
+
+
+async def purgar_memoria_ia_job(context: ContextTypes.DEFAULT_TYPE):
+    memoria_ia.purgar()
+    limitador_ia.purgar()
+
+
+async def guardar_entregas_job(context: ContextTypes.DEFAULT_TYPE):
+    entregas.guardar(ENTREGAS_FILE)
+
+
+async def al_apagar(app):
+    # Dejar usuarios.json completo y el XP escrito antes de salir
+    registro.compactar()
+    xp_buffer.flush()
+    await cola_ia.detener()
+    await ia.cerrar()
+    cache_ia.guardar(IA_CACHE_FILE)
+    entregas.guardar(ENTREGAS_FILE)
+
+
+def _chat_de_update(update):
+    chat = getattr(update, "effective_chat", None) or getattr(update, "effective_user", None)
+    return chat.id if chat is not None else None
+
+
+class ProcesadorPorChat(BaseUpdateProcessor):
+    """
+    Hasta `limite` updates a la vez, pero los de un mismo chat de a uno y
+    en el orden en que llegaron: una pregunta a la IA no frena a los demás
+    y nadie ve sus respuestas desordenadas.
+
+    PTB toma su semáforo antes de llamar a do_process_update. Si ése fuera
+    el límite, los mensajes en fila de un solo chat ocuparían todos los
+    lugares; por eso queda holgado y el límite real se toma recién cuando
+    le toca el turno al chat.
+    """
+
+    def __init__(self, limite: int, holgura: int = 1000):
+        super().__init__(limite + holgura)
+        self.limite = limite
+        self._en_curso = asyncio.Semaphore(limite)
+        # chat_id -> [lock, updates de ese chat esperando o en curso]
+        self._chats = {}
+
+    async def do_process_update(self, update, coroutine):
+        chat = _chat_de_update(update)
+        if chat is None:
+            async with self._en_curso:
+                await coroutine
+            return
+        entrada = self._chats.get(chat)
+        if entrada is None:
+            entrada = self._chats[chat] = [asyncio.Lock(), 0]
+        entrada[1] += 1
+        try:
+            # asyncio.Lock despierta en orden de llegada
+            async with entrada[0], self._en_curso:
+                await coroutine
+        finally:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del self._chats[chat]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def construir_app(updater: bool = True, jobs: bool = True, reanudar: bool = True, bot=None):
+    """
+    Arma la Application con todos los handlers. Sin `updater` no busca
+    updates por su cuenta (se los pasa otro, ver correr_trabajador); sin
+    `jobs` no programa los jobs que mandan mensajes o escriben archivos
+    compartidos, para que en el pool de workers los corra uno solo. `bot`
+    reemplaza al ExtBot de siempre (ver bench/bench_replay.py).
+    """
+    builder = ApplicationBuilder().post_shutdown(al_apagar)
+    if bot is not None:
+        builder = builder.bot(bot)
+    else:
+        builder = builder.token(TOKEN)
+        if TELEGRAM_API_URL:
+            builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+    if not updater:
+        builder = builder.updater(None)
+    if UPDATES_CONCURRENTES > 1:
+        builder = builder.concurrent_updates(ProcesadorPorChat(UPDATES_CONCURRENTES))
+    app = builder.build()
 
     # Comandos normales
     app.add_handler(CommandHandler("start", start))
@@ -1427,13 +2175,18 @@ def main():
     app.add_handler(CommandHandler("premiuminfo", premiuminfo))
     app.add_handler(CommandHandler("codigo", validar_codigo))
     app.add_handler(CommandHandler("perfil", perfil))
+    app.add_handler(CommandHandler("ranking", ranking))
     app.add_handler(CommandHandler("referidos", referidos))
     app.add_handler(CommandHandler("usarref", usarref))
     app.add_handler(CommandHandler("replay", replay_cmd))
+    app.add_handler(CommandHandler("olvidar", olvidar))
 
     # Panel admin
     app.add_handler(CommandHandler("stats", stats))
     app.add_handler(CommandHandler("premiumactivos", premiumactivos))
+    app.add_handler(CommandHandler("colaia", colaia))
+    app.add_handler(CommandHandler("intenciones", intenciones))
+    app.add_handler(CommandHandler("arbolref", arbolref))
     app.add_handler(CommandHandler("difundir", difundir))
     app.add_handler(CommandHandler("competencia", competencia))
     app.add_handler(CommandHandler("premium", premium_command))
@@ -1448,14 +2201,209 @@ def main():
     # Chat IA / texto general
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
-   # Jobs programados (desactivados de momento)
-   # job = app.job_queue
-   # job.run_daily(activar_descuento_mensual, time=dtime(hour=0, minute=0))
-   # job.run_daily(enviar_warmup_diario, time=dtime(hour=15, minute=0))
+    # Latencia, llamadas y errores de cada handler (ver metricas.py)
+    instrumentar_app(app)
+
+    # Mantenimiento (de este proceso)
+    app.job_queue.run_repeating(compactar_usuarios_job, interval=3600, first=3600)
+    app.job_queue.run_repeating(flush_xp_job, interval=XP_FLUSH_INTERVAL, first=XP_FLUSH_INTERVAL)
+    app.job_queue.run_repeating(guardar_cache_ia_job, interval=900, first=900)
+    app.job_queue.run_repeating(purgar_memoria_ia_job, interval=600, first=600)
+    app.job_queue.run_repeating(guardar_entregas_job, interval=300, first=300)
+    # Difusiones que un reinicio dejó a medias (cada worker las suyas)
+    if reanudar:
+        app.job_queue.run_once(reanudar_difusiones_job, when=5)
+
+    if not jobs:
+        return app
+
+    app.job_queue.run_repeating(revisar_vencimientos, interval=PREMIUM_CHECK_INTERVAL, first=10)
+
+    # Jobs de calendario con estado en disco (ver agenda.py): un reinicio
+    # no los saltea y dos procesos no los repiten
+    agenda.agregar(
+        "warmup",
+        enviar_warmup_diario,
+        Diario(hora=WARMUP_HORA),
+        gracia=WARMUP_GRACIA_MIN * 60,
+        tandas=WARMUP_TANDAS,
+        ventana=WARMUP_VENTANA_MIN * 60,
+    )
+    agenda.agregar(
+        "descuento_mensual",
+        activar_descuento_mensual,
+        Mensual(dia=1),
+        gracia=DESCUENTO_GRACIA_HORAS * 3600,
+    )
+    agenda.instalar(app.job_queue)
+
+    return app
+
+
+def iniciar_metricas(desplazamiento: int = 0):
+    """Levanta /metrics y registra los gauges que se leen al exponer."""
+    if not METRICS_PORT:
+        return None
+    METRICAS.medidor("bot_usuarios", "Usuarios registrados", lambda: len(registro))
+    METRICAS.medidor(
+        "bot_premium_activos",
+        "Premium activos por plan",
+        lambda: {"standard": premium_idx.total_standard, "plus": premium_idx.total_plus},
+        ("plan",),
+    )
+    METRICAS.medidor(
+        "bot_ia_cola",
+        "Pedidos esperando en la cola IA",
+        lambda: {c: st["en_cola"] for c, st in cola_ia.estado().items()},
+        ("carril",),
+    )
+    METRICAS.medidor("bot_ia_en_curso", "Llamadas al LLM en curso", lambda: ia.en_curso)
+    METRICAS.medidor("bot_ia_memoria_bytes", "Conversaciones en memoria (estimado)", lambda: memoria_ia.bytes)
+    METRICAS.medidor("bot_ia_latencia_ewma_segundos", "Latencia media móvil de la IA", lambda: control_carga.ewma)
+    try:
+        servidor = servir_metricas(METRICS_PORT + desplazamiento, METRICS_HOST)
+    except OSError as e:
+        print(f"⚠️ No se pudo abrir /metrics en el puerto {METRICS_PORT + desplazamiento}: {e}")
+        return None
+    print(f"📈 Métricas en http://{METRICS_HOST}:{METRICS_PORT + desplazamiento}/metrics")
+    return servidor
+
+
+# ==========================
+#   POOL DE WORKERS
+# ==========================
+
+# Lo último que este worker vio de la base (ver sincronizar_estado_job)
+_sync = {"data_version": None, "versiones": {}, "cambio": 0}
 
 
-    print("🤖 BOT FORTNITE PREMIUM RUNNING...")
-    app.run_polling()
+async def sincronizar_estado_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Con varios workers cada uno tiene sus índices en memoria: si otro
+    proceso escribió en la base, se relee sólo el área que cambió. El
+    chequeo de todos los segundos es un PRAGMA data_version, que no cambia
+    con lo que escribe el mismo worker.
+    """
+    dv = store.data_version()
+    if dv == _sync["data_version"]:
+        return
+    _sync["data_version"] = dv
+    versiones = store.versiones()
+    vistas = _sync["versiones"]
+    _sync["versiones"] = versiones
+
+    if versiones.get("premium") != vistas.get("premium"):
+        premium_idx.sincronizar(store.cargar_premium())
+    if versiones.get("referidos") != vistas.get("referidos"):
+        grafo_ref.cargar(store.cargar_ref())
+    if versiones.get("entregas") != vistas.get("entregas"):
+        entregas.sincronizar()
+
+    # Usuarios y XP: sólo las filas escritas desde la última pasada. Las que
+    # escribió este worker vuelven con el valor que ya tiene en memoria
+    nuevos = store.cambios_desde(_sync["cambio"])
+    if nuevos is None:
+        await recargar_usuarios_y_xp()
+        return
+    _sync["cambio"], filas = nuevos
+    registro.sincronizar(filas.get("usuarios", {}))
+    pendientes = xp_buffer.pendientes()
+    for uid, xp in filas.get("xp", {}).items():
+        if xp is None and uid not in pendientes:
+            ranking_xp.fijar(uid, None)
+        else:
+            ranking_xp.fijar(uid, (xp or 0) + pendientes.get(uid, 0))
+
+
+async def recargar_usuarios_y_xp():
+    """
+    Muy atrasado con el log de cambios (o ya se purgó): usuarios y ranking
+    se arman de cero en un thread, sin frenar el loop, y se cambian de una.
+    """
+    global ranking_xp
+    cambio = store.ultimo_cambio()
+
+    def armar():
+        ranking = RankingXP()
+        ranking.cargar(store.cargar_xp())
+        return store.cargar_usuarios(), ranking
+
+    ids, ranking = await asyncio.get_running_loop().run_in_executor(None, armar)
+    # Lo sumado acá que todavía no se escribió; lo escrito mientras tanto
+    # queda después de `cambio` y entra en la próxima pasada
+    for uid, amount in xp_buffer.pendientes().items():
+        ranking.sumar(uid, amount)
+    registro.recargar(ids)
+    ranking_xp = ranking
+    _sync["cambio"] = cambio
+    _sync["data_version"] = None
+
+
+async def correr_trabajador(indice: int, cola, reanudar: bool = True):
+    """
+    Un worker del pool (ver trabajadores.py): procesa en orden los updates
+    que el supervisor le manda por `cola` (dicts; None = terminar). El
+    worker 0 es el único que corre los jobs programados.
+    """
+    import queue
+
+    app = construir_app(updater=False, jobs=(indice == 0), reanudar=reanudar)
+    iniciar_metricas(desplazamiento=indice)
+    _sync["versiones"] = store.versiones()
+    _sync["data_version"] = store.data_version()
+    _sync["cambio"] = cambio_cargado
+    app.job_queue.run_repeating(sincronizar_estado_job, interval=WORKER_SYNC_INTERVAL, first=WORKER_SYNC_INTERVAL)
+
+    loop = asyncio.get_running_loop()
+    padre = os.getppid()
+    async with app:
+        await app.start()
+        print(f"🤖 worker {indice} listo (pid {os.getpid()})")
+        while True:
+            try:
+                data = await loop.run_in_executor(None, cola.get, True, 1.0)
+            except queue.Empty:
+                # Si el supervisor murió sin avisar, no quedar huérfano
+                if os.getppid() != padre:
+                    break
+                continue
+            if data is None:
+                break
+            await app.update_queue.put(Update.de_json(data, app.bot))
+        # stop() termina de procesar lo que quedó en update_queue
+        await app.stop()
+    # Mismo orden que run_polling: stop, shutdown y después post_shutdown
+    await al_apagar(app)
+
+
+def main():
+    if BOT_MODE == "pool":
+        # Un solo proceso en el Procfile: este hace de supervisor y lanza los workers
+        import trabajadores
+
+        asyncio.run(trabajadores.correr_supervisor())
+        return
+
+    app = construir_app()
+    iniciar_metricas()
+
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL or not WEBHOOK_SECRET:
+            raise SystemExit("BOT_MODE=webhook necesita WEBHOOK_URL y WEBHOOK_SECRET")
+        print(f"🤖 BOT FORTNITE PREMIUM RUNNING (webhook en :{WEBHOOK_PORT}/{WEBHOOK_PATH})...")
+        # Servidor HTTP embebido de PTB (tornado): valida el secret token y
+        # registra la URL con setWebhook al arrancar
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+    else:
+        print("🤖 BOT FORTNITE PREMIUM RUNNING...")
+        app.run_polling()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,370 @@
+import os
+import time
+import asyncio
+import secrets
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut, NetworkError
+
+from almacenamiento import cargar_json, guardar_json
+
+# ==========================
+#   LIMITADOR GLOBAL
+# ==========================
+
+
+class TokenBucket:
+    """
+    Token bucket compartido por todos los envíos masivos. Telegram corta
+    alrededor de 30 mensajes por segundo por bot; un RetryAfter pausa el
+    bucket entero, no sólo al que lo recibió.
+    """
+
+    def __init__(self, por_segundo: float = 30.0, rafaga: int = 30):
+        self.por_segundo = por_segundo
+        self.rafaga = rafaga
+        self._tokens = float(rafaga)
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = asyncio.Lock()
+
+    def pausar(self, segundos: float):
+        self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+        # Al terminar la pausa se arranca de cero, sin ráfaga acumulada
+        self._tokens = 0.0
+        self._ultimo = self._pausa_hasta
+
+    async def tomar(self):
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                if ahora < self._pausa_hasta:
+                    await asyncio.sleep(self._pausa_hasta - ahora)
+                    continue
+                self._tokens = min(self.rafaga, self._tokens + max(0.0, ahora - self._ultimo) * self.por_segundo)
+                self._ultimo = max(self._ultimo, ahora)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.por_segundo)
+
+
+# ==========================
+#   ESTADO DE ENTREGAS
+# ==========================
+
+
+def motivo_no_entregable(error):
+    """
+    Si el error de Telegram dice que ese chat ya no recibe mensajes, devuelve
+    el motivo ("bloqueado", "desactivado", "inexistente", "prohibido").
+    Cualquier otra cosa (Markdown roto, red, RetryAfter) devuelve None.
+    """
+    texto = str(getattr(error, "message", error)).lower()
+    if isinstance(error, Forbidden):
+        if "blocked" in texto:
+            return "bloqueado"
+        if "deactivated" in texto:
+            return "desactivado"
+        return "prohibido"
+    if isinstance(error, BadRequest) and "chat not found" in texto:
+        return "inexistente"
+    return None
+
+
+class EstadoEntregas:
+    """
+    Usuarios a los que Telegram ya dijo que no se les puede escribir
+    (bloquearon el bot, cuenta borrada, chat inexistente). Los envíos los
+    saltan sin gastar una llamada ni cupo del TokenBucket; si el usuario
+    vuelve a hablarle al bot, reactivar() lo saca de la lista.
+
+    Se guarda como snapshot en un JSON chico (sólo los inalcanzables). Con
+    `store` (SQLite, el pool de workers) cada bloqueo y cada reactivación
+    van a la base en el momento: el worker que difunde ve lo que anotó el
+    que atendió al usuario. sincronizar() relee lo de los demás.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._usuarios = {}  # uid -> {"motivo": str, "desde": epoch}
+        self.evitados = 0
+        self.reactivados = 0
+        self._sucio = False
+        # Con store: evitados que todavía no se sumaron en la base
+        self._evitados_pendientes = 0
+
+    def __len__(self):
+        return len(self._usuarios)
+
+    def cargar(self, path=None):
+        data = self.store.cargar_entregas() if self.store is not None else cargar_json(path, {})
+        self._usuarios = {int(uid): e for uid, e in data.get("usuarios", {}).items()}
+        self.evitados = data.get("evitados", 0) + self._evitados_pendientes
+        self.reactivados = data.get("reactivados", 0)
+        self._sucio = False
+
+    def sincronizar(self):
+        if self.store is not None:
+            self.cargar()
+
+    def guardar(self, path=None):
+        if not self._sucio:
+            return
+        if self.store is not None:
+            # Los bloqueos ya están en la base; quedan los evitados, que se
+            # suman de a tandas para no escribir por cada envío salteado
+            if self._evitados_pendientes:
+                self.store.sumar_contador_entregas("evitados", self._evitados_pendientes)
+                self._evitados_pendientes = 0
+            self._sucio = False
+            return
+        guardar_json(path, {
+            "usuarios": {str(uid): e for uid, e in self._usuarios.items()},
+            "evitados": self.evitados,
+            "reactivados": self.reactivados,
+        })
+        self._sucio = False
+
+    def _sumar_evitados(self, n: int):
+        self.evitados += n
+        if self.store is not None:
+            self._evitados_pendientes += n
+        self._sucio = True
+
+    def bloqueado(self, user_id) -> bool:
+        return int(user_id) in self._usuarios
+
+    def evitar(self, user_id) -> bool:
+        """True (y cuenta un envío evitado) si no hay que escribirle."""
+        if int(user_id) in self._usuarios:
+            self._sumar_evitados(1)
+            return True
+        return False
+
+    def filtrar(self, user_ids):
+        """Los que sí reciben mensajes; los salteados suman a evitados."""
+        user_ids = list(user_ids)
+        res = [uid for uid in user_ids if int(uid) not in self._usuarios]
+        saltados = len(user_ids) - len(res)
+        if saltados:
+            self._sumar_evitados(saltados)
+        return res
+
+    def registrar_error(self, user_id, error) -> bool:
+        motivo = motivo_no_entregable(error)
+        if motivo is None:
+            return False
+        entry = {"motivo": motivo, "desde": int(time.time())}
+        self._usuarios[int(user_id)] = entry
+        if self.store is not None:
+            self.store.marcar_inalcanzable(int(user_id), entry["motivo"], entry["desde"])
+        else:
+            self._sucio = True
+        return True
+
+    def reactivar(self, user_id) -> bool:
+        if self._usuarios.pop(int(user_id), None) is None:
+            return False
+        if self.store is not None:
+            # Otro worker pudo haberlo reactivado primero: cuenta una sola vez
+            if self.store.reactivar_entrega(int(user_id)):
+                self.reactivados += 1
+            return True
+        self.reactivados += 1
+        self._sucio = True
+        return True
+
+    def por_motivo(self) -> dict:
+        res = {}
+        for e in self._usuarios.values():
+            res[e["motivo"]] = res.get(e["motivo"], 0) + 1
+        return res
+
+
+# ==========================
+#   DIFUSIÓN REANUDABLE
+# ==========================
+
+
+class Difusion:
+    """
+    Envío de un mismo texto a una lista de chats con concurrencia acotada,
+    respetando el TokenBucket y con checkpoint en disco: si el proceso se
+    reinicia, pendientes() la devuelve y correr() sigue desde donde quedó
+    en vez de empezar de nuevo.
+
+    El checkpoint guarda la lista de destinatarios (fija al crear la
+    difusión), un "hecho hasta" y los índices terminados por encima de él.
+    Lo que estaba en vuelo al cortarse se vuelve a mandar, así que un
+    reinicio puede repetir como mucho `concurrencia` mensajes. También
+    guarda qué worker la está mandando: cada uno retoma sólo las suyas.
+    """
+
+    def __init__(self, path, estado):
+        self.path = path
+        self.estado = estado
+        self._hechos_extra = set(estado.get("hechos_extra", []))
+        self._en_vuelo = set()
+        self._siguiente = estado["hecho_hasta"]
+        self._inicio = time.monotonic()
+        self._enviados_al_inicio = estado["enviados"] + estado["fallidos"]
+
+    # --- crear / reanudar ---
+
+    @classmethod
+    def crear(cls, directorio, texto, destinatarios, parse_mode=None, admin_chat=None, nombre="difusion", worker=""):
+        os.makedirs(directorio, exist_ok=True)
+        dif_id = f"{nombre}-{int(time.time())}-{secrets.token_hex(2)}"
+        estado = {
+            "id": dif_id,
+            "texto": texto,
+            "parse_mode": parse_mode,
+            "destinatarios": list(destinatarios),
+            "hecho_hasta": 0,
+            "hechos_extra": [],
+            "enviados": 0,
+            "fallidos": 0,
+            "admin_chat": admin_chat,
+            "progreso_msg_id": None,
+            "worker": worker,
+        }
+        d = cls(os.path.join(directorio, f"{dif_id}.json"), estado)
+        d.guardar()
+        return d
+
+    @classmethod
+    def pendientes(cls, directorio, workers=None):
+        """
+        Difusiones que quedaron a medias (por un reinicio o un crash). Con
+        `workers`, sólo las de esos workers ("" = sin pool o de antes del pool).
+        """
+        if not os.path.isdir(directorio):
+            return []
+        res = []
+        for nombre in sorted(os.listdir(directorio)):
+            if not nombre.endswith(".json"):
+                continue
+            path = os.path.join(directorio, nombre)
+            estado = cargar_json(path, None, etiqueta="difusion")
+            if estado and (workers is None or estado.get("worker", "") in workers):
+                res.append(cls(path, estado))
+        return res
+
+    # --- estado ---
+
+    @property
+    def total(self) -> int:
+        return len(self.estado["destinatarios"])
+
+    @property
+    def procesados(self) -> int:
+        return self.estado["enviados"] + self.estado["fallidos"]
+
+    def progreso(self) -> dict:
+        hechos = self.procesados - self._enviados_al_inicio
+        transcurrido = time.monotonic() - self._inicio
+        restantes = self.total - self.procesados
+        ritmo = hechos / transcurrido if transcurrido > 0 else 0.0
+        return {
+            "enviados": self.estado["enviados"],
+            "fallidos": self.estado["fallidos"],
+            "restantes": restantes,
+            "total": self.total,
+            "por_segundo": ritmo,
+            "eta": restantes / ritmo if ritmo > 0 else None,
+        }
+
+    def guardar(self):
+        self.estado["hechos_extra"] = sorted(self._hechos_extra)
+        guardar_json(self.path, self.estado, etiqueta="difusion")
+
+    def _marcar(self, i: int, ok: bool):
+        self._en_vuelo.discard(i)
+        self.estado["enviados" if ok else "fallidos"] += 1
+        self._hechos_extra.add(i)
+        # Avanzar el "hecho hasta" mientras los siguientes estén terminados
+        w = self.estado["hecho_hasta"]
+        while w in self._hechos_extra:
+            self._hechos_extra.discard(w)
+            w += 1
+        self.estado["hecho_hasta"] = w
+
+    # --- envío ---
+
+    async def correr(
+        self,
+        enviar,
+        bucket: TokenBucket,
+        concurrencia: int = 20,
+        reintentos: int = 3,
+        al_progresar=None,
+        cada_segundos: float = 5.0,
+    ):
+        """
+        enviar: async fn(chat_id, texto, parse_mode) -> bool (True si llegó).
+        al_progresar: async fn(difusion) llamada cada `cada_segundos` y al final.
+        """
+        destinatarios = self.estado["destinatarios"]
+
+        def proximo():
+            while self._siguiente < len(destinatarios):
+                i = self._siguiente
+                self._siguiente += 1
+                if i not in self._hechos_extra:
+                    return i
+            return None
+
+        async def worker():
+            while True:
+                i = proximo()
+                if i is None:
+                    return
+                self._en_vuelo.add(i)
+                ok = False
+                for intento in range(reintentos + 1):
+                    await bucket.tomar()
+                    try:
+                        ok = await enviar(
+                            destinatarios[i], self.estado["texto"], self.estado["parse_mode"]
+                        )
+                        break
+                    except RetryAfter as e:
+                        espera = e.retry_after
+                        if hasattr(espera, "total_seconds"):
+                            espera = espera.total_seconds()
+                        bucket.pausar(espera)
+                    except (TimedOut, NetworkError):
+                        await asyncio.sleep(2 ** intento)
+                    except Exception:
+                        break
+                self._marcar(i, ok)
+
+        async def reportar():
+            while True:
+                await asyncio.sleep(cada_segundos)
+                self.guardar()
+                if al_progresar:
+                    try:
+                        await al_progresar(self)
+                    except Exception:
+                        pass
+
+        reporte = asyncio.create_task(reportar())
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrencia)))
+        finally:
+            reporte.cancel()
+            await asyncio.gather(reporte, return_exceptions=True)
+            # Lo que quedó en vuelo (cancelación) se reenvía al reanudar
+            self.guardar()
+
+        if al_progresar:
+            try:
+                await al_progresar(self)
+            except Exception:
+                pass
+        # guardar_json deja una copia .bak: también se va
+        for path in (self.path, self.path + ".bak"):
+            if os.path.exists(path):
+                os.remove(path)
+        return self.progreso()
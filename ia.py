@@ -0,0 +1,770 @@
+import re
+import sys
+import time
+import zlib
+import random
+import asyncio
+import unicodedata
+from collections import OrderedDict
+
+import httpx
+from openai import AsyncOpenAI
+
+from almacenamiento import cargar_json, guardar_json
+from metricas import ia_segundos, ia_tokens, ia_errores
+
+# ==========================
+#   CLIENTE IA (ASYNC)
+# ==========================
+
+
+class ClienteIA:
+    """
+    AsyncOpenAI sobre un pool httpx compartido. Las llamadas no bloquean el
+    event loop de PTB y un semáforo limita cuántas van en paralelo, así un
+    pico de preguntas no abre cientos de conexiones contra OpenAI.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        modelo: str = "gpt-4o-mini",
+        base_url=None,
+        timeout: float = 30.0,
+        timeout_conexion: float = 5.0,
+        max_conexiones: int = 20,
+        max_concurrencia: int = 10,
+        max_reintentos: int = 2,
+    ):
+        self.modelo = modelo
+        self.max_concurrencia = max_concurrencia
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_conexiones,
+                max_keepalive_connections=max_conexiones,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(timeout, connect=timeout_conexion),
+        )
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self._http,
+            max_retries=max_reintentos,
+        )
+        self._sem = asyncio.Semaphore(max_concurrencia)
+        self.en_curso = 0
+
+    def _anotar_uso(self, usage):
+        # usage llega como objeto (respuesta normal) o dict (último chunk del stream)
+        if usage is None:
+            return
+        if isinstance(usage, dict):
+            prompt, completion = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        else:
+            prompt, completion = usage.prompt_tokens, usage.completion_tokens
+        ia_tokens.sumar(self.modelo, "prompt", n=prompt or 0)
+        ia_tokens.sumar(self.modelo, "completion", n=completion or 0)
+
+    async def responder(self, messages) -> str:
+        async with self._sem:
+            self.en_curso += 1
+            t0 = time.perf_counter()
+            try:
+                r = await self.client.chat.completions.create(
+                    model=self.modelo,
+                    messages=messages,
+                )
+            except Exception:
+                ia_errores.sumar(self.modelo)
+                raise
+            finally:
+                self.en_curso -= 1
+                ia_segundos.observar(time.perf_counter() - t0, self.modelo, "no")
+        self._anotar_uso(r.usage)
+        return r.choices[0].message.content
+
+    async def responder_stream(self, messages):
+        """Igual que responder() pero va devolviendo el texto a medida que llega."""
+        async with self._sem:
+            self.en_curso += 1
+            t0 = time.perf_counter()
+            try:
+                stream = await self.client.chat.completions.create(
+                    model=self.modelo,
+                    messages=messages,
+                    stream=True,
+                    # El último chunk trae usage (sin choices)
+                    extra_body={"stream_options": {"include_usage": True}},
+                )
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    self._anotar_uso(getattr(chunk, "usage", None))
+            except Exception:
+                ia_errores.sumar(self.modelo)
+                raise
+            finally:
+                self.en_curso -= 1
+                ia_segundos.observar(time.perf_counter() - t0, self.modelo, "si")
+
+    async def cerrar(self):
+        await self._http.aclose()
+
+
+# ==========================
+#   COLA IA CON PRIORIDAD
+# ==========================
+
+
+class ColaIA:
+    """
+    Cola acotada delante del LLM con un carril por plan. Los workers
+    siempre toman primero del carril de mayor prioridad (PLUS), y si un
+    carril está lleno se rechaza en el momento en vez de apilar pedidos.
+    """
+
+    def __init__(self, carriles, workers: int = 10):
+        # carriles: [(nombre, capacidad)] de mayor a menor prioridad
+        self.carriles = [nombre for nombre, _ in carriles]
+        self.capacidad = dict(carriles)
+        self.n_workers = workers
+        self._cola = None
+        self._seq = 0
+        self._workers = []
+        self.stats = {
+            nombre: {
+                "en_cola": 0,
+                "atendidos": 0,
+                "rechazados": 0,
+                "espera_total": 0.0,
+                "espera_max": 0.0,
+            }
+            for nombre in self.carriles
+        }
+
+    def iniciar(self):
+        if self._workers:
+            return
+        self._cola = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.n_workers)]
+
+    async def detener(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enviar(self, carril: str, trabajo):
+        """
+        trabajo: función async sin argumentos (ej. lambda: ia.responder(msgs)).
+        Devuelve un future con el resultado, o None si el carril está lleno.
+        """
+        if not self._workers:
+            self.iniciar()
+
+        st = self.stats[carril]
+        if st["en_cola"] >= self.capacidad[carril]:
+            st["rechazados"] += 1
+            return None
+
+        fut = asyncio.get_running_loop().create_future()
+        st["en_cola"] += 1
+        self._seq += 1
+        prioridad = self.carriles.index(carril)
+        self._cola.put_nowait((prioridad, self._seq, carril, time.monotonic(), trabajo, fut))
+        return fut
+
+    async def _worker(self):
+        while True:
+            _, _, carril, encolado, trabajo, fut = await self._cola.get()
+            st = self.stats[carril]
+            st["en_cola"] -= 1
+            espera = time.monotonic() - encolado
+            st["atendidos"] += 1
+            st["espera_total"] += espera
+            st["espera_max"] = max(st["espera_max"], espera)
+
+            if fut.cancelled():
+                continue
+            try:
+                resultado = await trabajo()
+            except Exception as e:
+                if not fut.cancelled():
+                    fut.set_exception(e)
+            else:
+                if not fut.cancelled():
+                    fut.set_result(resultado)
+
+    def estado(self) -> dict:
+        """Profundidad y espera por carril, para dimensionar los workers."""
+        res = {}
+        for nombre, st in self.stats.items():
+            res[nombre] = {
+                "en_cola": st["en_cola"],
+                "capacidad": self.capacidad[nombre],
+                "atendidos": st["atendidos"],
+                "rechazados": st["rechazados"],
+                "espera_media": st["espera_total"] / st["atendidos"] if st["atendidos"] else 0.0,
+                "espera_max": st["espera_max"],
+            }
+        return res
+
+
+# ==========================
+#   LÍMITE POR USUARIO Y SHEDDING
+# ==========================
+
+
+class LimitadorUsuarios:
+    """
+    Token bucket por usuario delante de la IA: cada plan tiene su ráfaga
+    (tokens de entrada) y su ritmo de recarga (tokens por minuto).
+
+    Cada bucket es una tupla (tokens, último uso) en un OrderedDict por
+    último uso. Un bucket que ya se habría recargado entero es igual a uno
+    nuevo, así que purgar() saca del frente los que llevan ese tiempo
+    quietos; además nunca hay más de `max_usuarios`.
+    """
+
+    def __init__(self, planes: dict, max_usuarios: int = 100_000):
+        # planes: {"standard": (rafaga, por_minuto), "plus": (...)}
+        self.planes = {p: (float(r), pm / 60.0) for p, (r, pm) in planes.items()}
+        self.max_usuarios = max_usuarios
+        # Tiempo de recarga completa del plan más lento
+        self._recarga_max = max(r / ps for r, ps in self.planes.values())
+        self._buckets = OrderedDict()
+        self.permitidos = {p: 0 for p in planes}
+        self.rechazados = {p: 0 for p in planes}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def tomar(self, user_id: int, plan: str, ahora=None) -> float:
+        """Gasta un token. Devuelve 0 si pasó, o los segundos hasta el próximo."""
+        ahora = ahora or time.monotonic()
+        rafaga, por_seg = self.planes[plan]
+        previo = self._buckets.pop(user_id, None)
+        if previo is None:
+            tokens = rafaga
+        else:
+            tokens = min(rafaga, previo[0] + (ahora - previo[1]) * por_seg)
+
+        if tokens >= 1:
+            self._buckets[user_id] = (tokens - 1, ahora)
+            self.permitidos[plan] += 1
+            espera = 0.0
+        else:
+            self._buckets[user_id] = (tokens, ahora)
+            self.rechazados[plan] += 1
+            espera = (1 - tokens) / por_seg
+
+        while len(self._buckets) > self.max_usuarios:
+            self._buckets.popitem(last=False)
+        return espera
+
+    def devolver(self, user_id: int, plan: str):
+        """
+        Reintegra el token de un tomar() que pasó pero no llegó a la IA
+        (shedding o cola llena): rechazar no cuenta como pregunta.
+        """
+        previo = self._buckets.get(user_id)
+        if previo is None:
+            return
+        rafaga, _ = self.planes[plan]
+        self._buckets[user_id] = (min(rafaga, previo[0] + 1), previo[1])
+        self.permitidos[plan] -= 1
+
+    def purgar(self, ahora=None) -> int:
+        """Saca los buckets que ya estarían llenos. Devuelve cuántos sacó."""
+        limite = (ahora or time.monotonic()) - self._recarga_max
+        sacados = 0
+        while self._buckets:
+            _, (_, ultimo) = next(iter(self._buckets.items()))
+            if ultimo > limite:
+                break
+            self._buckets.popitem(last=False)
+            sacados += 1
+        return sacados
+
+
+class ControlCarga:
+    """
+    Latencia de la IA como media móvil exponencial (EWMA). Si pasa el SLO
+    se empieza a rechazar el tráfico de los carriles no protegidos (PLUS
+    sigue entrando) y se deja de rechazar recién cuando baja de
+    `histeresis` * SLO, para no prender y apagar con cada respuesta.
+
+    Mientras rechaza deja pasar un pedido cada `sonda` segundos: si sólo
+    midiera lo que entra y no entrara nada, nunca se enteraría de que la
+    IA ya se recuperó.
+    """
+
+    def __init__(self, slo: float, alfa: float = 0.2, histeresis: float = 0.8, sonda: float = 5.0, protegidos=("plus",)):
+        self.slo = slo
+        self.alfa = alfa
+        self.histeresis = histeresis
+        self.sonda = sonda
+        self.protegidos = frozenset(protegidos)
+        self.ewma = 0.0
+        self.activo = False
+        self.episodios = 0
+        self.rechazados = 0
+        self._ultima_sonda = 0.0
+
+    def observar(self, segundos: float):
+        if self.ewma == 0.0:
+            self.ewma = segundos
+        else:
+            self.ewma += self.alfa * (segundos - self.ewma)
+        if not self.activo and self.ewma > self.slo:
+            self.activo = True
+            self.episodios += 1
+        elif self.activo and self.ewma < self.slo * self.histeresis:
+            self.activo = False
+
+    def admitir(self, carril: str, ahora=None) -> bool:
+        if not self.activo or carril in self.protegidos:
+            return True
+        ahora = ahora or time.monotonic()
+        if ahora - self._ultima_sonda >= self.sonda:
+            self._ultima_sonda = ahora
+            return True
+        self.rechazados += 1
+        return False
+
+
+# ==========================
+#   CACHE DE RESPUESTAS IA
+# ==========================
+
+STOP_WORDS = frozenset(
+    """
+    a al algo como cual cuales de del el en es esta este esto hay la las le lo los
+    me mi mis se soy sos su sus te tu tus
+    un una uno unos unas ya yo vos che bro pls porfa porfavor favor
+    quiero queria quisiera puedo podes podrias decime dime dame pasame
+    the a an of is my me i
+    """.split()
+)
+
+# Palabras que cambian el sentido de la pregunta: nunca son stop-words y,
+# con la cache fuzzy, dos preguntas sólo se parecen si tienen las mismas
+# (y los mismos números, ver _sentido): "config sin aim assist" no es
+# "config con aim assist"
+PALABRAS_SENTIDO = frozenset(
+    """
+    no ni sin con o y para por que pero porque si nunca solo contra
+    not no without with or and for to vs
+    """.split()
+)
+
+# Sube cuando cambia normalizar_pregunta: las claves guardadas con otra
+# versión no se cargan (podrían mezclar preguntas que ahora son distintas)
+VERSION_CLAVES = 2
+
+
+_NO_ALFANUM = re.compile(r"[^a-z0-9]+")
+
+
+def _palabras(texto: str):
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUM.sub(" ", texto).split()
+
+
+def normalizar_pregunta(texto: str) -> str:
+    """
+    "¿Cuál es la MEJOR sens para 800 DPI?" -> "mejor sens para 800 dpi".
+    Minúsculas, sin acentos ni signos, espacios colapsados y sin stop-words.
+    """
+    return " ".join(p for p in _palabras(texto) if p not in STOP_WORDS)
+
+
+# Repreguntas que sólo se entienden con la conversación: "y con 400 dpi?",
+# "eso sirve en consola?"
+_CONTINUACIONES = frozenset("y e o pero entonces tambien igual osea and but also so then".split())
+_REFERENCIAS = frozenset("eso esa ese esos esas aquello ahi aca alli anterior dijiste that it".split())
+# Preguntas sobre el propio jugador: "que sens me recomendas?", "cual es mi
+# mejor sens". Son stop-words (la clave queda "mejor sens"), pero la
+# respuesta depende de lo que contó antes
+_PERSONALES = frozenset("me mi mis yo conmigo my i".split())
+
+
+def pregunta_suelta(texto: str, min_palabras: int = 2) -> bool:
+    """
+    True si la pregunta se entiende sin el historial: no arranca como
+    continuación, no señala algo dicho antes, no pregunta por el propio
+    jugador y tiene al menos `min_palabras` palabras con contenido.
+    """
+    palabras = _palabras(texto)
+    if not palabras or palabras[0] in _CONTINUACIONES:
+        return False
+    if _REFERENCIAS.intersection(palabras) or _PERSONALES.intersection(palabras):
+        return False
+    return sum(1 for p in palabras if p not in STOP_WORDS) >= min_palabras
+
+
+_NUMEROS = re.compile(r"\d+")
+
+
+def _sentido(clave: str):
+    """
+    Lo que tiene que coincidir para servir una pregunta casi igual: las
+    PALABRAS_SENTIDO y los números, en orden ("800 dpi" no es "400 dpi",
+    aunque los trigramas se parezcan; "144hz" sí es "144 hz").
+    """
+    return (frozenset(p for p in clave.split() if p in PALABRAS_SENTIDO), tuple(_NUMEROS.findall(clave)))
+
+
+# Separa la pregunta normalizada de los datos del jugador en la clave
+# ("mejor sens box fights | dpi=800 plataforma=pc"); la pregunta nunca lo tiene
+_SEP_CONTEXTO = " | "
+
+
+def _clave(texto: str, contexto: str = "") -> str:
+    clave = normalizar_pregunta(texto)
+    if clave and contexto:
+        clave += _SEP_CONTEXTO + contexto
+    return clave
+
+# MinHash: 32 permutaciones en 8 bandas de 4 filas (LSH). crc32 en vez de
+# hash() para que las firmas sean iguales entre reinicios.
+_MINHASH_PERMS = 32
+_MINHASH_FILAS = 4
+_PRIMO = (1 << 61) - 1
+_rnd = random.Random(1337)
+_COEFS = [(_rnd.randrange(1, _PRIMO), _rnd.randrange(0, _PRIMO)) for _ in range(_MINHASH_PERMS)]
+
+
+def _shingles(clave: str, k: int = 3):
+    s = f" {clave} "
+    return {zlib.crc32(s[i:i + k].encode("utf-8")) for i in range(max(1, len(s) - k + 1))}
+
+
+def firma_minhash(clave: str):
+    sh = _shingles(clave)
+    return tuple(min((a * x + b) % _PRIMO for x in sh) for a, b in _COEFS)
+
+
+def _similitud(f1, f2) -> float:
+    return sum(1 for x, y in zip(f1, f2) if x == y) / len(f1)
+
+
+class CacheRespuestas:
+    """
+    Respuestas de la IA por pregunta normalizada. LRU acotado a `max_items`
+    con vencimiento por TTL. Con `fuzzy=True` también devuelve la respuesta
+    de una pregunta casi igual (MinHash + LSH sobre trigramas de caracteres).
+
+    `contexto` (ver MemoriaConversaciones.contexto) va en la clave: la
+    respuesta para un jugador con 800 dpi en PC no le sirve a otro.
+    """
+
+    def __init__(self, max_items: int = 5000, ttl: int = 86400, fuzzy: bool = False, umbral: float = 0.8):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.fuzzy = fuzzy
+        self.umbral = umbral
+        self._datos = OrderedDict()  # clave -> (respuesta, expira, firma)
+        self._buckets = {}  # (banda, valores) -> set(claves)
+        self.hits = 0
+        self.hits_fuzzy = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._datos)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _bandas(self, firma):
+        for i in range(0, len(firma), _MINHASH_FILAS):
+            yield (i, firma[i:i + _MINHASH_FILAS])
+
+    def _quitar(self, clave):
+        _, _, firma = self._datos.pop(clave)
+        if firma is not None:
+            for banda in self._bandas(firma):
+                claves = self._buckets.get(banda)
+                if claves is not None:
+                    claves.discard(clave)
+                    if not claves:
+                        del self._buckets[banda]
+
+    def _vigente(self, clave, ahora):
+        item = self._datos.get(clave)
+        if item is None:
+            return None
+        if item[1] < ahora:
+            self._quitar(clave)
+            return None
+        self._datos.move_to_end(clave)
+        return item[0]
+
+    def get(self, texto: str, contexto: str = ""):
+        clave = _clave(texto, contexto)
+        if not clave:
+            return None
+        ahora = time.time()
+
+        resp = self._vigente(clave, ahora)
+        if resp is not None:
+            self.hits += 1
+            return resp
+
+        if self.fuzzy:
+            pregunta, _, contexto = clave.partition(_SEP_CONTEXTO)
+            firma = firma_minhash(pregunta)
+            candidatas = set()
+            for banda in self._bandas(firma):
+                candidatas |= self._buckets.get(banda, set())
+            mejor, mejor_sim = None, self.umbral
+            sentido = _sentido(pregunta)
+            for cand in candidatas:
+                cand_pregunta, _, cand_contexto = cand.partition(_SEP_CONTEXTO)
+                if cand_contexto != contexto or _sentido(cand_pregunta) != sentido:
+                    continue
+                sim = _similitud(firma, self._datos[cand][2])
+                if sim >= mejor_sim:
+                    mejor, mejor_sim = cand, sim
+            if mejor is not None:
+                resp = self._vigente(mejor, ahora)
+                if resp is not None:
+                    self.hits += 1
+                    self.hits_fuzzy += 1
+                    return resp
+
+        self.misses += 1
+        return None
+
+    def put(self, texto: str, respuesta: str, contexto: str = "", expira=None):
+        clave = _clave(texto, contexto)
+        if clave:
+            self._poner(clave, respuesta, expira)
+
+    def _poner(self, clave, respuesta, expira=None):
+        if clave in self._datos:
+            self._quitar(clave)
+        firma = firma_minhash(clave.partition(_SEP_CONTEXTO)[0]) if self.fuzzy else None
+        self._datos[clave] = (respuesta, expira or time.time() + self.ttl, firma)
+        if firma is not None:
+            for banda in self._bandas(firma):
+                self._buckets.setdefault(banda, set()).add(clave)
+        while len(self._datos) > self.max_items:
+            self._quitar(next(iter(self._datos)))
+
+    def guardar(self, path):
+        ahora = time.time()
+        entradas = [[c, r, e] for c, (r, e, _) in self._datos.items() if e >= ahora]
+        guardar_json(path, {"v": VERSION_CLAVES, "entradas": entradas})
+
+    def cargar(self, path):
+        data = cargar_json(path, {})
+        if data.get("v") != VERSION_CLAVES:
+            return
+        ahora = time.time()
+        for clave, resp, expira in data.get("entradas", []):
+            if expira >= ahora:
+                # La clave ya está normalizada (y puede llevar contexto)
+                self._poner(clave, resp, expira)
+
+
+# ==========================
+#   MEMORIA DE CONVERSACIÓN
+# ==========================
+
+# Datos del jugador que vale la pena recordar cuando se resumen turnos viejos
+_DATOS_JUGADOR = [
+    ("DPI", re.compile(r"\b(\d{3,5})\s*dpi\b")),
+    ("Hz", re.compile(r"\b(\d{2,3})\s*hz\b")),
+    ("Sens", re.compile(r"\bsens(?:ibilidad)?\s*(?:de\s*)?(\d{1,2}(?:[.,]\d+)?)\b")),
+    ("Plataforma", re.compile(r"\b(pc|ps4|ps5|play|xbox|switch|celu|mobile|m[oó]vil)\b")),
+    ("Rango", re.compile(r"\b(bronce|plata|oro|platino|diamante|[ée]lite|campe[oó]n|champion|unreal)\b")),
+    ("Región", re.compile(r"\b(nae|naw|eu|brazil|brasil|oce|asia)\b")),
+    ("Estilo", re.compile(r"\b(agresivo|pasivo|macro|igl|fragger|support)\b")),
+]
+
+
+def _extraer_datos(texto: str) -> dict:
+    low = texto.lower()
+    datos = {}
+    for nombre, patron in _DATOS_JUGADOR:
+        m = patron.search(low)
+        if m:
+            datos[nombre] = m.group(1)
+    return datos
+
+
+def estimar_tokens(texto: str) -> int:
+    # ~4 caracteres por token en español; alcanza para presupuestar
+    return len(texto) // 4 + 1
+
+
+# Lo que ocupa una conversación además de sus textos: el objeto, su
+# entrada en el OrderedDict, las tuplas de turnos (medido con
+# bench/bench_memoria.py)
+_BYTES_CONVERSACION = 420
+_BYTES_TURNO = 72
+
+
+class _Conversacion:
+    __slots__ = ("turnos", "datos", "temas", "ultimo_uso", "bytes")
+
+    def __init__(self):
+        self.turnos = ()  # ((rol, texto), ...) del más viejo al más nuevo
+        self.datos = None  # {"DPI": "800", ...} extraído de turnos resumidos
+        self.temas = ()  # últimas preguntas resumidas, recortadas
+        self.ultimo_uso = 0.0
+        self.bytes = 0
+
+    def medir(self) -> int:
+        n = _BYTES_CONVERSACION
+        n += sum(_BYTES_TURNO + sys.getsizeof(t) for _, t in self.turnos)
+        n += sum(sys.getsizeof(t) for t in self.temas)
+        if self.datos:
+            n += sys.getsizeof(self.datos) + sum(sys.getsizeof(v) for v in self.datos.values())
+        return n
+
+
+class MemoriaConversaciones:
+    """
+    Últimos turnos de cada usuario, para que no tenga que repetir su DPI,
+    plataforma o rango en cada pregunta.
+
+    - Los turnos se guardan como tuplas chicas y se recortan a `presupuesto`
+      tokens; lo que no entra se resume (datos del jugador + temas) en vez
+      de mandarse entero.
+    - Las respuestas de la IA se guardan truncadas a `max_chars_respuesta`.
+    - LRU por último uso: a lo sumo `max_usuarios` conversaciones y
+      `max_bytes` de texto estimado (cada una pesa unos 4-5 KB llena); las
+      que llevan `ttl` segundos sin actividad se borran con purgar().
+    """
+
+    def __init__(
+        self,
+        presupuesto: int = 800,
+        max_usuarios: int = 100_000,
+        ttl: int = 6 * 3600,
+        max_chars_respuesta: int = 1200,
+        max_temas: int = 3,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.presupuesto = presupuesto
+        self.max_usuarios = max_usuarios
+        self.ttl = ttl
+        self.max_chars_respuesta = max_chars_respuesta
+        self.max_temas = max_temas
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._convs = OrderedDict()
+
+    def __len__(self):
+        return len(self._convs)
+
+    def tiene_historial(self, user_id: int) -> bool:
+        return user_id in self._convs
+
+    def olvidar(self, user_id: int) -> bool:
+        conv = self._convs.pop(user_id, None)
+        if conv is None:
+            return False
+        self.bytes -= conv.bytes
+        return True
+
+    def mensajes(self, user_id: int, system_prompt: str, pregunta: str):
+        """Arma los messages para la IA: system + resumen + turnos + pregunta."""
+        msgs = [{"role": "system", "content": system_prompt}]
+        conv = self._convs.get(user_id)
+        if conv is not None:
+            resumen = self._resumen(conv)
+            if resumen:
+                msgs.append({"role": "system", "content": resumen})
+            for rol, texto in conv.turnos:
+                msgs.append({"role": rol, "content": texto})
+        msgs.append({"role": "user", "content": pregunta})
+        return msgs
+
+    def agregar(self, user_id: int, pregunta: str, respuesta: str):
+        conv = self._convs.get(user_id)
+        if conv is None:
+            conv = _Conversacion()
+            self._convs[user_id] = conv
+        else:
+            self._convs.move_to_end(user_id)
+        conv.ultimo_uso = time.time()
+
+        respuesta = respuesta[: self.max_chars_respuesta]
+        turnos = conv.turnos + (("user", pregunta), ("assistant", respuesta))
+
+        # Pasado el presupuesto, los turnos más viejos pasan al resumen
+        usados = sum(estimar_tokens(t) for _, t in turnos)
+        inicio = 0
+        while usados > self.presupuesto and inicio < len(turnos) - 2:
+            rol, texto = turnos[inicio]
+            if rol == "user":
+                self._resumir(conv, texto)
+            usados -= estimar_tokens(texto)
+            inicio += 1
+        conv.turnos = turnos[inicio:]
+        tamano = conv.medir()
+        self.bytes += tamano - conv.bytes
+        conv.bytes = tamano
+
+        # La que se acaba de usar queda al final: nunca se borra a sí misma
+        while len(self._convs) > 1 and (len(self._convs) > self.max_usuarios or self.bytes > self.max_bytes):
+            _, vieja = self._convs.popitem(last=False)
+            self.bytes -= vieja.bytes
+
+    def purgar(self, ahora=None) -> int:
+        """Borra las conversaciones inactivas. Devuelve cuántas borró."""
+        limite = (ahora or time.time()) - self.ttl
+        borradas = 0
+        while self._convs:
+            uid, conv = next(iter(self._convs.items()))
+            if conv.ultimo_uso >= limite:
+                break
+            del self._convs[uid]
+            self.bytes -= conv.bytes
+            borradas += 1
+        return borradas
+
+    def contexto_cache(self, user_id: int, pregunta: str):
+        """
+        Con qué contexto se puede buscar (y guardar) esta pregunta en la
+        CacheRespuestas, o None si tiene que ir a la IA. Sin conversación, ""
+        (primer turno). Con conversación sólo si la pregunta se entiende sola
+        (ver pregunta_suelta), y con los datos que el jugador ya contó
+        ("dpi=800 plataforma=pc"): no recibe la respuesta armada para otro.
+        """
+        conv = self._convs.get(user_id)
+        if conv is None:
+            return ""
+        if not pregunta_suelta(pregunta):
+            return None
+        datos = dict(conv.datos or {})
+        for rol, texto in conv.turnos:
+            if rol == "user":
+                datos.update(_extraer_datos(texto))
+        return " ".join(f"{k.lower()}={v}" for k, v in sorted(datos.items()))
+
+    def _resumir(self, conv, pregunta: str):
+        datos = _extraer_datos(pregunta)
+        if datos:
+            if conv.datos is None:
+                conv.datos = {}
+            conv.datos.update(datos)
+        tema = pregunta.strip().replace("\n", " ")[:80]
+        conv.temas = (conv.temas + (tema,))[-self.max_temas:]
+
+    def _resumen(self, conv) -> str:
+        partes = []
+        if conv.datos:
+            partes.append(
+                "Datos del jugador: " + ", ".join(f"{k}: {v}" for k, v in conv.datos.items()) + "."
+            )
+        if conv.temas:
+            partes.append("Antes preguntó: " + " | ".join(conv.temas) + ".")
+        return " ".join(partes)
@@ -0,0 +1,533 @@
+import re
+import math
+import time
+import heapq
+import unicodedata
+from datetime import datetime
+from itertools import chain, islice
+
+from sortedcontainers import SortedList
+
+# ==========================
+#   ÍNDICE DE PREMIUM
+# ==========================
+
+
+def fecha_a_epoch(fecha_str) -> int:
+    """'2025-12-20' -> epoch de las 00:00 locales de ese día (0 si no hay fecha)."""
+    if not fecha_str:
+        return 0
+    return int(datetime.strptime(fecha_str, "%Y-%m-%d").timestamp())
+
+
+def epoch_a_fecha(epoch: int):
+    if not epoch:
+        return None
+    return datetime.fromtimestamp(epoch).strftime("%Y-%m-%d")
+
+
+def normalizar_entry(entry):
+    """
+    Pasa cualquiera de los dos formatos de premium_users.json a
+    (plan, lifetime, exp_epoch). Se hace una sola vez por entrada.
+    """
+    # Formato viejo: sólo la fecha, siempre Standard
+    if isinstance(entry, str):
+        return ("Standard", False, fecha_a_epoch(entry))
+    return (
+        entry.get("plan", "Standard"),
+        bool(entry.get("lifetime")),
+        fecha_a_epoch(entry.get("exp")),
+    )
+
+
+class IndicePremium:
+    """
+    user_id -> (plan, lifetime, exp_epoch) en memoria. Un chequeo es un
+    lookup en el dict más una comparación de enteros: nada de leer el
+    archivo ni de strptime por mensaje.
+
+    Además lleva contadores de activos (Standard, PLUS, de por vida) y dos
+    min-heaps por fecha: uno de vencimientos y otro de avisos previos.
+    refrescar() los va vaciando a medida que pasa el tiempo, así que /stats
+    lee los contadores sin recorrer nada; lo que sale de los heaps queda
+    anotado hasta que procesar() (el job de vencimientos) lo entrega.
+
+    Quien modifica premium tiene que llamar a actualizar() (o a cargar()
+    si reescribe todo el archivo).
+    """
+
+    def __init__(self, aviso_segundos: int = 3 * 86400):
+        self.aviso_segundos = aviso_segundos
+        self._entries = {}
+        self._activos = set()
+        self._vencimientos = []  # (exp, uid)
+        self._avisos = []  # (exp - aviso_segundos, uid, exp)
+        # Ya salieron de los heaps pero el job todavía no avisó: uid -> exp
+        self._por_avisar = {}
+        self._por_vencer = {}
+        self.total_standard = 0
+        self.total_plus = 0
+        self.total_life = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id):
+        return int(user_id) in self._entries
+
+    def cargar(self, premium: dict, ahora=None):
+        ahora = ahora or time.time()
+        # Lo que ya tocaba avisar pasa a pendiente antes de tirar los heaps;
+        # procesar() descarta después lo que se renovó en la recarga
+        self.refrescar(ahora)
+        self._entries = {}
+        self._activos = set()
+        self._vencimientos = []
+        self._avisos = []
+        self.total_standard = self.total_plus = self.total_life = 0
+        for uid, entry in premium.items():
+            self._poner(int(uid), normalizar_entry(entry), ahora)
+
+    def actualizar(self, user_id, entry, ahora=None):
+        ahora = ahora or time.time()
+        uid = int(user_id)
+        self._sacar(uid)
+        if entry is not None:
+            self._poner(uid, normalizar_entry(entry), ahora)
+
+    def sincronizar(self, premium: dict, ahora=None):
+        """
+        Como cargar() pero tocando sólo las entradas que cambiaron: las demás
+        conservan su lugar en los heaps y no se rearma todo. Devuelve cuántas
+        cambiaron.
+        """
+        ahora = ahora or time.time()
+        nuevas = {int(uid): normalizar_entry(entry) for uid, entry in premium.items()}
+        cambios = 0
+        for uid in [u for u in self._entries if u not in nuevas]:
+            self._sacar(uid)
+            cambios += 1
+        for uid, e in nuevas.items():
+            if self._entries.get(uid) != e:
+                self._sacar(uid)
+                self._poner(uid, e, ahora)
+                cambios += 1
+        return cambios
+
+    def _contar(self, e, signo):
+        plan, lifetime, _ = e
+        if plan == "plus":
+            self.total_plus += signo
+        else:
+            self.total_standard += signo
+        if lifetime:
+            self.total_life += signo
+
+    def _sacar(self, uid):
+        e = self._entries.pop(uid, None)
+        if e is not None and uid in self._activos:
+            self._activos.discard(uid)
+            self._contar(e, -1)
+        # Lo que quede en los heaps para este uid se descarta al salir (lazy)
+
+    def _poner(self, uid, e, ahora):
+        self._entries[uid] = e
+        plan, lifetime, exp = e
+        if lifetime:
+            self._activos.add(uid)
+            self._contar(e, +1)
+            return
+        if exp == 0 or ahora > exp:
+            return
+        self._activos.add(uid)
+        self._contar(e, +1)
+        heapq.heappush(self._vencimientos, (exp, uid))
+        # Avisos ya pasados no se mandan (evita repetirlos en cada reinicio)
+        if exp - self.aviso_segundos > ahora:
+            heapq.heappush(self._avisos, (exp - self.aviso_segundos, uid, exp))
+
+    def _vigente(self, uid, exp):
+        e = self._entries.get(uid)
+        return e is not None and not e[1] and e[2] == exp
+
+    def refrescar(self, ahora=None):
+        """
+        Saca de los heaps todo lo que ya venció o ya tiene que avisarse y
+        ajusta los contadores. No pierde nada: los avisos quedan pendientes
+        para procesar(), así que se puede llamar desde cualquier lado.
+        """
+        ahora = ahora or time.time()
+
+        while self._avisos and self._avisos[0][0] <= ahora:
+            _, uid, exp = heapq.heappop(self._avisos)
+            if self._vigente(uid, exp) and ahora <= exp:
+                self._por_avisar[uid] = exp
+
+        while self._vencimientos and self._vencimientos[0][0] < ahora:
+            exp, uid = heapq.heappop(self._vencimientos)
+            if self._vigente(uid, exp) and uid in self._activos:
+                self._activos.discard(uid)
+                self._contar(self._entries[uid], -1)
+                self._por_vencer[uid] = exp
+
+    def procesar(self, ahora=None):
+        """
+        refrescar() y entregar los avisos pendientes: (a_avisar, vencidos)
+        como listas de user_id. Cada uno sale una sola vez; es para el job
+        que manda los DMs. Si alguien renovó mientras esperaba, o si ya
+        venció antes de que corriera el job, no se avisa.
+        """
+        ahora = ahora or time.time()
+        self.refrescar(ahora)
+        a_avisar = [uid for uid, exp in self._por_avisar.items() if self._vigente(uid, exp) and ahora <= exp]
+        vencidos = [uid for uid, exp in self._por_vencer.items() if self._vigente(uid, exp)]
+        self._por_avisar = {}
+        self._por_vencer = {}
+        return a_avisar, vencidos
+
+    def get(self, user_id):
+        return self._entries.get(int(user_id))
+
+    def activos(self, ahora=None):
+        """
+        user_id de todos los premium activos, sin recorrer los vencidos.
+        Sólo lee: los que vencieron y todavía no pasaron por refrescar()
+        se filtran acá y sus avisos quedan para el job.
+        """
+        ahora = ahora or time.time()
+        return (uid for uid in tuple(self._activos) if self.es_premium(uid, ahora))
+
+    def items(self):
+        return self._entries.items()
+
+    def es_premium(self, user_id: int, ahora=None) -> bool:
+        e = self._entries.get(user_id)
+        if e is None:
+            return False
+        if e[1]:
+            return True
+        # Vence a las 00:00 del día de exp (igual que vencio_premium)
+        return e[2] != 0 and (ahora or time.time()) <= e[2]
+
+    def es_plus(self, user_id: int) -> bool:
+        e = self._entries.get(user_id)
+        return e is not None and e[0] == "plus"
+
+
+# ==========================
+#   RANKING DE XP
+# ==========================
+
+
+class RankingXP:
+    """
+    user_id -> XP con un SortedList de (-xp, user_id) al lado: sumar XP es
+    sacar y volver a meter una tupla (O(log N)), y el puesto de alguien o
+    el top K salen sin ordenar todo el archivo.
+
+    Con empate de XP comparten puesto (1, 2, 2, 4...); en top() desempata
+    el user_id más chico.
+    """
+
+    def __init__(self):
+        self._xp = {}
+        self._orden = SortedList()
+
+    def __len__(self):
+        return len(self._xp)
+
+    def cargar(self, xp_data: dict):
+        self._xp = {int(uid): xp for uid, xp in xp_data.items()}
+        self._orden = SortedList((-xp, uid) for uid, xp in self._xp.items())
+
+    def sumar(self, user_id, amount: int):
+        uid = int(user_id)
+        viejo = self._xp.get(uid)
+        if viejo is not None:
+            self._orden.remove((-viejo, uid))
+        nuevo = (viejo or 0) + amount
+        self._xp[uid] = nuevo
+        self._orden.add((-nuevo, uid))
+
+    def fijar(self, user_id, xp):
+        """Pone el XP que tiene en la base (lo escribió otro worker); None lo saca."""
+        uid = int(user_id)
+        viejo = self._xp.pop(uid, None)
+        if viejo is not None:
+            self._orden.remove((-viejo, uid))
+        if xp is not None:
+            self._xp[uid] = xp
+            self._orden.add((-xp, uid))
+
+    def get(self, user_id) -> int:
+        return self._xp.get(int(user_id), 0)
+
+    def puesto(self, user_id):
+        """Puesto 1-based, o None si todavía no tiene XP."""
+        xp = self._xp.get(int(user_id))
+        if xp is None:
+            return None
+        # (-xp,) queda antes que cualquier (-xp, uid): cuenta los que tienen más
+        return self._orden.bisect_left((-xp,)) + 1
+
+    def top(self, k: int):
+        """[(user_id, xp), ...] de los k con más XP."""
+        return [(uid, -neg) for neg, uid in islice(self._orden, k)]
+
+
+# ==========================
+#   GRAFO DE REFERIDOS
+# ==========================
+
+
+class GrafoReferidos:
+    """
+    Referidos en memoria: padre (ref_by) por usuario, el índice inverso
+    padre -> set de hijos y los premios ya dados como sets. "¿Ya lo
+    referí?" o "¿ya cobré por él?" son lookups, no recorridos de listas.
+
+    Cada usuario tiene un solo padre, así que subir por la cadena es
+    O(profundidad) y alcanza para detectar ciclos (A refiere a B y B a A,
+    o alguien que se refiere a sí mismo con datos viejos).
+
+    Es un índice: lo persistente sigue siendo el store.
+    """
+
+    def __init__(self):
+        self._padre = {}
+        self._hijos = {}
+        self._premios = {}
+
+    def cargar(self, refs: dict):
+        self._padre = {}
+        self._hijos = {}
+        self._premios = {}
+        for uid, info in refs.items():
+            u = int(uid)
+            if info.get("ref_by"):
+                self.agregar(u, int(info["ref_by"]))
+            for hijo in info.get("referred", []):
+                # Hijos que sólo figuran en la lista del padre
+                self._padre.setdefault(int(hijo), u)
+                self._hijos.setdefault(u, set()).add(int(hijo))
+            for p in info.get("premios", []):
+                self._premios.setdefault(u, set()).add(int(p))
+
+    def agregar(self, hijo: int, padre: int):
+        viejo = self._padre.get(hijo)
+        if viejo is not None and viejo != padre:
+            self._hijos.get(viejo, set()).discard(hijo)
+        self._padre[hijo] = padre
+        self._hijos.setdefault(padre, set()).add(hijo)
+
+    def marcar_premio(self, padre: int, hijo: int):
+        self._premios.setdefault(padre, set()).add(hijo)
+
+    def padre(self, uid: int):
+        return self._padre.get(uid)
+
+    def hijos(self, uid: int) -> set:
+        return self._hijos.get(uid, set())
+
+    def premios(self, uid: int) -> set:
+        return self._premios.get(uid, set())
+
+    def info(self, uid: int) -> dict:
+        """El mismo formato que referrals.json, para store.set_refs()."""
+        padre = self._padre.get(uid)
+        return {
+            "ref_by": str(padre) if padre is not None else None,
+            "referred": [str(h) for h in sorted(self.hijos(uid))],
+            "premios": [str(p) for p in sorted(self.premios(uid))],
+        }
+
+    def ancestros(self, uid: int, limite: int = 10000):
+        """Cadena de padres hacia arriba (se corta si hay un ciclo)."""
+        res = []
+        vistos = {uid}
+        actual = self._padre.get(uid)
+        while actual is not None and actual not in vistos and len(res) < limite:
+            res.append(actual)
+            vistos.add(actual)
+            actual = self._padre.get(actual)
+        return res
+
+    def en_ciclo(self, uid: int) -> bool:
+        """True si subiendo desde uid se vuelve a pasar por uid."""
+        actual = self._padre.get(uid)
+        vistos = set()
+        while actual is not None and actual not in vistos:
+            if actual == uid:
+                return True
+            vistos.add(actual)
+            actual = self._padre.get(actual)
+        return False
+
+    def crearia_ciclo(self, hijo: int, padre: int) -> bool:
+        """¿Si hijo usa el código de padre se cierra un ciclo?"""
+        return hijo == padre or hijo in self.ancestros(padre)
+
+    def mas_referidores(self, k: int):
+        """[(user_id, hijos directos), ...] de los k que más refirieron."""
+        top = heapq.nlargest(k, self._hijos.items(), key=lambda x: len(x[1]))
+        return [(u, len(h)) for u, h in top]
+
+    def descendientes(self, uid: int) -> int:
+        """Toda la red debajo de uid (hijos, nietos...), sin contarlo a él."""
+        total = 0
+        vistos = {uid}
+        pila = list(self.hijos(uid))
+        while pila:
+            u = pila.pop()
+            if u in vistos:
+                continue
+            vistos.add(u)
+            total += 1
+            pila.extend(self._hijos.get(u, ()))
+        return total
+
+    def ciclos(self):
+        """
+        Todos los ciclos del grafo como listas de user_id. Cada nodo tiene
+        a lo sumo un padre: con colores por recorrido queda O(N).
+        """
+        estado = {}  # uid -> id del recorrido que lo visitó
+        res = []
+        for inicio in self._padre:
+            if inicio in estado:
+                continue
+            camino = []
+            actual = inicio
+            while actual is not None and actual not in estado:
+                estado[actual] = inicio
+                camino.append(actual)
+                actual = self._padre.get(actual)
+            if actual is not None and estado[actual] == inicio:
+                res.append(camino[camino.index(actual):])
+        return res
+
+
+# ==========================
+#   BUSCADOR DE ALIAS
+# ==========================
+
+
+def _sin_acentos(texto: str) -> str:
+    t = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in t if not unicodedata.combining(c))
+
+
+def regex_trie(palabras) -> str:
+    """
+    Alternación con los prefijos comunes factorizados ("pe(?:terbot|...)"):
+    el motor de re no tiene que probar cada alias desde cero en cada posición.
+    """
+    trie = {}
+    for p in palabras:
+        nodo = trie
+        for c in p:
+            nodo = nodo.setdefault(c, {})
+        nodo[""] = {}
+
+    def patron(nodo):
+        alternativas = []
+        opcional = False
+        for c in sorted(nodo):
+            if c == "":
+                opcional = True
+                continue
+            alternativas.append(re.escape(c) + patron(nodo[c]))
+        if not alternativas:
+            return ""
+        res = alternativas[0] if len(alternativas) == 1 else "(?:" + "|".join(alternativas) + ")"
+        if opcional:
+            res = "(?:" + res + ")?"
+        return res
+
+    return patron(trie)
+
+
+def trigramas(palabra: str) -> set:
+    p = f"  {palabra} "
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+class BuscadorAlias:
+    """
+    Encuentra en un texto cuál de muchas claves se menciona (los pros de
+    PRO_SENS). Todos los alias van a un único regex con \\b precompilado,
+    así un mensaje se revisa en una sola pasada en vez de un `in` por alias.
+
+    Si no hay coincidencia exacta prueba con un índice de trigramas, que
+    tolera errores de tipeo ("peterbott", "mrsavag"). buscar() devuelve
+    (clave, score): 1.0 si fue exacto, el Dice de trigramas si fue aproximado.
+
+    Sólo los alias de `min_largo_alias` letras o más entran al índice
+    aproximado: en uno corto una letra cambia demasiado el Dice y aparecen
+    palabras comunes ("veneno" ~ "veno", "pollos" ~ "pollo"). Ésos se
+    reconocen sólo escritos tal cual.
+    """
+
+    def __init__(self, aliases_por_clave: dict, umbral: float = 0.7, min_largo: int = 4, min_largo_alias: int = 6):
+        self.umbral = umbral
+        self.min_largo = min_largo
+        self.min_largo_alias = min_largo_alias
+        self._clave_de = {}  # alias normalizado -> clave
+        for clave, aliases in aliases_por_clave.items():
+            for alias in aliases:
+                a = _sin_acentos(alias).strip()
+                self._clave_de.setdefault(a, clave)
+                # "tay son" también matchea "tayson"
+                self._clave_de.setdefault(a.replace(" ", ""), clave)
+
+        # Los opcionales del trie son greedy: "epik whale" le gana a "epik"
+        self._regex = re.compile(r"\b" + regex_trie(self._clave_de) + r"\b")
+
+        self._tri_de = {}  # alias sin espacios -> trigramas
+        self._postings = {}  # trigrama -> aliases que lo tienen
+        for a in self._clave_de:
+            if " " in a or len(a) < min_largo_alias:
+                continue
+            tg = trigramas(a)
+            self._tri_de[a] = tg
+            for t in tg:
+                self._postings.setdefault(t, []).append(a)
+        # Un typo agrega a lo sumo un par de letras
+        self._max_largo = max((len(a) for a in self._tri_de), default=0) + 2
+
+    def buscar(self, texto: str):
+        low = _sin_acentos(texto)
+        m = self._regex.search(low)
+        if m:
+            return self._clave_de[m.group(0)], 1.0
+        return self._aproximado(low)
+
+    def _aproximado(self, low: str):
+        palabras = re.findall(r"[a-z0-9]+", low)
+        # Palabras sueltas y pares pegados ("peter bott" -> "peterbott");
+        # nada más largo que el alias más largo admite
+        candidatos = {p for p in palabras if self.min_largo <= len(p) <= self._max_largo}
+        candidatos.update(
+            a + b for a, b in zip(palabras, palabras[1:]) if len(a) + len(b) <= self._max_largo
+        )
+
+        mejor, mejor_score = None, 0.0
+        for palabra in candidatos:
+            tq = trigramas(palabra)
+            n = len(tq)
+            # Filtro por prefijo: con Dice >= umbral hacen falta al menos k
+            # trigramas en común, así que el alias tiene que aparecer en
+            # alguno de los n-k+1 más raros. Los comunes ni se miran.
+            k = math.ceil(self.umbral * n / (2 - self.umbral))
+            raros = sorted(tq, key=lambda t: len(self._postings.get(t, ())))[: n - k + 1]
+            posibles = set(chain.from_iterable(self._postings.get(t, ()) for t in raros))
+            for a in posibles:
+                ta = self._tri_de[a]
+                score = 2 * len(tq & ta) / (n + len(ta))
+                if score > mejor_score:
+                    mejor, mejor_score = a, score
+
+        if mejor is None or mejor_score < self.umbral:
+            return None
+        return self._clave_de[mejor], round(mejor_score, 3)
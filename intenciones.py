@@ -0,0 +1,109 @@
+import re
+import time
+from collections import deque
+
+from indices import regex_trie
+
+# ==========================
+#   ROUTER DE INTENCIONES
+# ==========================
+
+
+class RouterIntenciones:
+    """
+    Clasifica un mensaje contra una tabla de intenciones. Cada intención es
+    un dict con:
+
+        nombre      identificador (para stats)
+        prioridad   menor = gana si matchean varias
+        empieza     frases con las que puede empezar el mensaje
+        contiene    frases que pueden aparecer en cualquier lado
+        detectar    fn(texto) -> dato o None, para lo que no es una lista
+                    de palabras (ej.: el buscador de pros)
+        handler     async fn(update, context, dato) -> bool (False = seguir
+                    de largo hacia la IA)
+
+    Todas las frases se compilan juntas (un regex para "empieza" y otro para
+    "contiene"), así el mensaje se recorre una vez sin importar cuántas
+    intenciones haya. Los `detectar` sólo corren si ninguna intención de más
+    prioridad ya matcheó.
+    """
+
+    def __init__(self, tabla, muestras: int = 1000):
+        self.intenciones = sorted(tabla, key=lambda i: i["prioridad"])
+        # frase -> índice de la intención de más prioridad que la usa
+        self._empieza = {}
+        self._contiene = {}
+        for n, intencion in enumerate(self.intenciones):
+            for frase in intencion.get("empieza", ()):
+                self._empieza.setdefault(frase, n)
+            for frase in intencion.get("contiene", ()):
+                self._contiene.setdefault(frase, n)
+        # Un regex por tipo con los prefijos comunes factorizados (trie). El
+        # de "contiene" va en un lookahead: los matches no consumen texto y
+        # una frase no tapa a otra que empiece adentro suyo.
+        self._re_empieza = re.compile(regex_trie(self._empieza)) if self._empieza else None
+        self._re_contiene = re.compile("(?=(" + regex_trie(self._contiene) + "))") if self._contiene else None
+        self._detectores = [
+            (n, i) for n, i in enumerate(self.intenciones) if i.get("detectar")
+        ]
+
+        self.clasificados = {i["nombre"]: 0 for i in self.intenciones}
+        self.sin_intencion = 0
+        self._latencias = deque(maxlen=muestras)
+        self.latencia_max = 0.0
+
+    def clasificar(self, texto: str):
+        """
+        Devuelve (intencion, dato) o (None, None). `texto` ya en minúsculas.
+        """
+        t0 = time.perf_counter()
+
+        mejor = len(self.intenciones)
+        if self._re_empieza is not None:
+            m = self._re_empieza.match(texto)
+            if m:
+                mejor = self._empieza[m.group(0)]
+        if self._re_contiene is not None and mejor > 0:
+            for m in self._re_contiene.finditer(texto):
+                n = self._contiene[m.group(1)]
+                if n < mejor:
+                    mejor = n
+                    if n == 0:
+                        break
+
+        resultado = None
+        for n, intencion in self._detectores:
+            if n >= mejor:
+                break
+            dato = intencion["detectar"](texto)
+            if dato is not None:
+                resultado = (intencion, dato)
+                break
+        if resultado is None:
+            if mejor < len(self.intenciones):
+                resultado = (self.intenciones[mejor], None)
+            else:
+                resultado = (None, None)
+
+        dt = time.perf_counter() - t0
+        self._latencias.append(dt)
+        if dt > self.latencia_max:
+            self.latencia_max = dt
+        if resultado[0] is None:
+            self.sin_intencion += 1
+        else:
+            self.clasificados[resultado[0]["nombre"]] += 1
+        return resultado
+
+    def latencias(self) -> dict:
+        """p50 / p99 / máx de clasificación en microsegundos (últimas muestras)."""
+        if not self._latencias:
+            return {"p50": 0.0, "p99": 0.0, "max": 0.0, "muestras": 0}
+        orden = sorted(self._latencias)
+        return {
+            "p50": orden[len(orden) // 2] * 1e6,
+            "p99": orden[min(len(orden) - 1, int(len(orden) * 0.99))] * 1e6,
+            "max": self.latencia_max * 1e6,
+            "muestras": len(orden),
+        }
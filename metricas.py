@@ -0,0 +1,233 @@
+import time
+import bisect
+import threading
+import functools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ==========================
+#   MÉTRICAS (FORMATO PROMETHEUS)
+# ==========================
+#
+# Contadores e histogramas en memoria, sin dependencias. Registrar una
+# observación es un bisect sobre los límites de los buckets y un par de
+# sumas: se puede hacer en cada handler sin que se note. El texto para
+# Prometheus se arma recién cuando alguien pide /metrics.
+
+# Límites de los buckets en segundos (los de client_python, más 30 y 60
+# para las respuestas largas de la IA)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _etiquetas(nombres, valores, extra=""):
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(x) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+
+    def sumar(self, *valores, n=1):
+        self._valores[valores] = self._valores.get(valores, 0) + n
+
+    def valor(self, *valores):
+        return self._valores.get(valores, 0)
+
+    def exponer(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        for valores, n in list(self._valores.items()):
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(n)}"
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        # valores de etiquetas -> [conteo por bucket (no acumulado) + +Inf, suma]
+        self._series = {}
+
+    def observar(self, valor: float, *valores):
+        serie = self._series.get(valores)
+        if serie is None:
+            serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+        serie[0][bisect.bisect_left(self.buckets, valor)] += 1
+        serie[1] += valor
+
+    def conteo(self, *valores) -> int:
+        serie = self._series.get(valores)
+        return sum(serie[0]) if serie else 0
+
+    def exponer(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        for valores, (conteos, suma) in list(self._series.items()):
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), list(conteos)):
+                acumulado += n
+                le = 'le="' + _numero(limite) + '"'
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, le)} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}"
+
+
+class Medidor:
+    """Gauge que se lee recién al exponer: fn() -> número o {etiquetas: número}."""
+
+    def __init__(self, nombre: str, ayuda: str, fn, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.fn = fn
+        self.etiquetas = tuple(etiquetas)
+
+    def exponer(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} gauge"
+        try:
+            valor = self.fn()
+        except Exception:
+            return
+        if isinstance(valor, dict):
+            for valores, n in valor.items():
+                if not isinstance(valores, tuple):
+                    valores = (valores,)
+                yield f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(n)}"
+        else:
+            yield f"{self.nombre} {_numero(valor)}"
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = {}
+
+    def _agregar(self, metrica):
+        # Pedir dos veces la misma métrica devuelve la primera
+        return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre, ayuda, etiquetas=()) -> Contador:
+        return self._agregar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS) -> Histograma:
+        return self._agregar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def medidor(self, nombre, ayuda, fn, etiquetas=()) -> Medidor:
+        return self._agregar(Medidor(nombre, ayuda, fn, etiquetas))
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in list(self._metricas.values()):
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+# Registro global: ia.py, almacenamiento.py y bot.py anotan acá
+METRICAS = RegistroMetricas()
+
+handler_segundos = METRICAS.histograma(
+    "bot_handler_segundos", "Duración de cada handler de Telegram", ("handler",)
+)
+handler_llamadas = METRICAS.contador(
+    "bot_handler_llamadas_total", "Updates atendidos por handler", ("handler",)
+)
+handler_errores = METRICAS.contador(
+    "bot_handler_errores_total", "Handlers que terminaron con excepción", ("handler",)
+)
+ia_segundos = METRICAS.histograma(
+    "bot_ia_segundos", "Duración de cada llamada al LLM", ("modelo", "stream")
+)
+ia_tokens = METRICAS.contador(
+    "bot_ia_tokens_total", "Tokens usados según la API (usage)", ("modelo", "tipo")
+)
+ia_errores = METRICAS.contador(
+    "bot_ia_errores_total", "Llamadas al LLM que fallaron", ("modelo",)
+)
+archivo_segundos = METRICAS.histograma(
+    "bot_archivo_segundos",
+    "Lectura/escritura de snapshots (cargar_json / guardar_json)",
+    ("op", "archivo"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+agenda_corridas = METRICAS.contador(
+    "bot_agenda_corridas_total",
+    "Turnos de la agenda por job y resultado (ok, error, duplicado, vencido)",
+    ("job", "resultado"),
+)
+
+
+# ==========================
+#   HANDLERS INSTRUMENTADOS
+# ==========================
+
+
+def medir_handler(callback, nombre=None):
+    """Envuelve un callback async de PTB: tiempo, llamadas y errores."""
+    nombre = nombre or callback.__name__
+
+    @functools.wraps(callback)
+    async def medido(update, context):
+        t0 = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except BaseException:
+            handler_errores.sumar(nombre)
+            raise
+        finally:
+            handler_segundos.observar(time.perf_counter() - t0, nombre)
+            handler_llamadas.sumar(nombre)
+
+    medido.__metricas__ = nombre
+    return medido
+
+
+def instrumentar_app(app):
+    """Mide todos los handlers ya registrados en la Application."""
+    for handlers in app.handlers.values():
+        for h in handlers:
+            if not hasattr(h.callback, "__metricas__"):
+                h.callback = medir_handler(h.callback)
+
+
+# ==========================
+#   ENDPOINT HTTP
+# ==========================
+
+
+def servir_metricas(puerto: int, host: str = "127.0.0.1", registro: RegistroMetricas = METRICAS):
+    """/metrics en un hilo aparte (stdlib); devuelve el servidor."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = registro.exponer().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="metricas").start()
+    return servidor
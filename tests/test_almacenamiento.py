@@ -0,0 +1,200 @@
+import os
+import json
+
+import pytest
+
+from almacenamiento import (
+    AcumuladorXP,
+    AlmacenJSON,
+    AlmacenSQLite,
+    RegistroUsuarios,
+    cargar_json,
+    guardar_json,
+)
+from indices import RankingXP
+
+
+def _almacen(d):
+    return AlmacenJSON(
+        str(d / "premium_users.json"),
+        str(d / "usuarios.json"),
+        str(d / "xp_users.json"),
+        str(d / "referrals.json"),
+    )
+
+
+# ==========================
+#   SNAPSHOTS Y .bak
+# ==========================
+
+
+def test_guardar_y_cargar(tmp_path):
+    path = str(tmp_path / "xp.json")
+    guardar_json(path, {"1": 10, "2": 20})
+    assert cargar_json(path, None) == {"1": 10, "2": 20}
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_json_viejo_sin_cabecera(tmp_path):
+    path = tmp_path / "usuarios.json"
+    path.write_text(json.dumps([1, 2, 3], indent=4), encoding="utf-8")
+    assert cargar_json(str(path), []) == [1, 2, 3]
+
+
+def test_snapshot_corrupto_vuelve_al_bak(tmp_path):
+    path = str(tmp_path / "premium_users.json")
+    guardar_json(path, {"v": 1})
+    guardar_json(path, {"v": 2})
+    # Un byte cambiado: el checksum no coincide
+    with open(path, "r+b") as f:
+        raw = f.read()
+        f.seek(len(raw) - 2)
+        f.write(b"9")
+    assert cargar_json(path, None) == {"v": 1}
+
+
+def test_snapshot_cortado_vuelve_al_bak(tmp_path):
+    path = str(tmp_path / "premium_users.json")
+    guardar_json(path, {"v": 1})
+    guardar_json(path, {"v": 2})
+    with open(path, "r+b") as f:
+        f.truncate(10)
+    assert cargar_json(path, None) == {"v": 1}
+
+
+def test_sin_bak_devuelve_default(tmp_path):
+    path = tmp_path / "xp.json"
+    path.write_bytes(b"#fcs1 json 00000000\n{}")
+    assert cargar_json(str(path), "default") == "default"
+
+
+def test_crash_antes_del_rename_deja_el_viejo(tmp_path):
+    path = str(tmp_path / "xp.json")
+    guardar_json(path, {"v": 1})
+    # Lo que deja un corte en medio de _guardar_json: un .tmp a medio escribir
+    with open(path + ".tmp", "wb") as f:
+        f.write(b"#fcs1 json")
+    assert cargar_json(path, None) == {"v": 1}
+
+
+# ==========================
+#   TRANSACCIONES (JOURNAL)
+# ==========================
+
+
+def test_transaccion_escribe_todo_y_borra_el_journal(tmp_path):
+    store = _almacen(tmp_path)
+    with store.transaccion():
+        store.set_premium(1, {"lifetime": True, "exp": None, "plan": "plus"})
+        store.set_refs({"1": {"ref_by": None, "referred": ["2"], "premios": ["2"]}})
+        # Adentro las lecturas ven lo pendiente, el disco todavía no
+        assert store.get_premium(1)["plan"] == "plus"
+        assert not os.path.exists(store.premium_file)
+    assert cargar_json(store.premium_file, {})["1"]["plan"] == "plus"
+    assert cargar_json(store.ref_file, {})["1"]["premios"] == ["2"]
+    assert not os.path.exists(store.journal)
+
+
+def test_excepcion_descarta_la_transaccion(tmp_path):
+    store = _almacen(tmp_path)
+    store.set_premium(1, "2030-01-01")
+    with pytest.raises(RuntimeError):
+        with store.transaccion():
+            store.set_premium(1, {"lifetime": True, "exp": None, "plan": "plus"})
+            raise RuntimeError("corte")
+    assert store.get_premium(1) == "2030-01-01"
+    assert not os.path.exists(store.journal)
+
+
+def test_journal_a_medias_se_vuelve_a_aplicar(tmp_path):
+    store = _almacen(tmp_path)
+    store.set_premium(1, "2030-01-01")
+    # Crash después de escribir el journal y un solo archivo de los dos
+    pendientes = {
+        store.premium_file: {"1": {"lifetime": True, "exp": None, "plan": "plus"}},
+        store.ref_file: {"1": {"ref_by": None, "referred": [], "premios": ["7"]}},
+    }
+    guardar_json(store.journal, pendientes)
+    guardar_json(store.premium_file, pendientes[store.premium_file])
+
+    store = _almacen(tmp_path)
+    assert store.get_premium(1)["plan"] == "plus"
+    assert store.get_ref(1)["premios"] == ["7"]
+    assert not os.path.exists(store.journal)
+    assert not os.path.exists(store.journal + ".bak")
+
+
+def test_journal_corrupto_no_aplica_nada(tmp_path):
+    store = _almacen(tmp_path)
+    store.set_premium(1, "2030-01-01")
+    # Corte mientras se escribía el journal: la transacción nunca se confirmó
+    with open(store.journal, "wb") as f:
+        f.write(b"#fcs1 json 00000000\n{\"")
+    store = _almacen(tmp_path)
+    assert store.get_premium(1) == "2030-01-01"
+
+
+# ==========================
+#   LOG DE USUARIOS
+# ==========================
+
+
+def test_log_de_usuarios_ignora_la_linea_cortada(tmp_path):
+    store = _almacen(tmp_path)
+    store.guardar_usuarios([1, 2])
+    store.agregar_usuario(3)
+    store.agregar_usuario(2)
+    with open(store.users_log, "a", encoding="utf-8") as f:
+        f.write("4")  # sin \n
+    with open(store.users_log, "a", encoding="utf-8") as f:
+        f.write("x\n")
+    assert store.cargar_usuarios() == [1, 2, 3]
+    store.compactar_usuarios()
+    assert cargar_json(store.users_file, []) == [1, 2, 3]
+    assert os.path.getsize(store.users_log) == 0
+
+
+# ==========================
+#   LOG DE CAMBIOS (SQLITE)
+# ==========================
+
+
+def test_cambios_de_otro_worker_sin_recargar(tmp_path):
+    db = str(tmp_path / "bot.db")
+    otro, store = AlmacenSQLite(db), AlmacenSQLite(db)
+    otro.guardar_usuarios([1, 2])
+    otro.guardar_xp({"1": 10, "2": 20})
+
+    desde = store.ultimo_cambio()
+    registro, xp = RegistroUsuarios(store), AcumuladorXP(store)
+    ranking = RankingXP()
+    ranking.cargar(xp.cargar())
+    xp.sumar(2, 5)
+    ranking.sumar(2, 5)
+
+    otro.agregar_usuario(3)
+    otro.sumar_xp_lote({1: 100, 3: 1})
+    desde, filas = store.cambios_desde(desde)
+    assert filas == {"usuarios": {3: True}, "xp": {1: 110, 3: 1}}
+    registro.sincronizar(filas["usuarios"])
+    for uid, valor in filas["xp"].items():
+        ranking.fijar(uid, valor + xp.pendientes().get(uid, 0))
+    assert 3 in registro
+    assert ranking.top(3) == [(1, 110), (2, 25), (3, 1)]
+
+    # Lo que escribe el mismo worker vuelve igual a como ya está
+    xp.flush()
+    desde, filas = store.cambios_desde(desde)
+    assert filas == {"usuarios": {}, "xp": {2: 25}}
+    assert store.cambios_desde(desde) == (desde, {})
+
+
+def test_cambios_purgados_piden_recargar(tmp_path):
+    store = AlmacenSQLite(str(tmp_path / "bot.db"))
+    for uid in range(10):
+        store.agregar_usuario(uid)
+    assert store.cambios_desde(0, limite=5) is None
+    store.purgar_cambios(conservar=3)
+    assert store.cambios_desde(0) is None
+    desde, filas = store.cambios_desde(store.ultimo_cambio() - 3)
+    assert filas["usuarios"] == {7: True, 8: True, 9: True}
@@ -0,0 +1,102 @@
+import pytest
+
+from ia import CacheRespuestas, MemoriaConversaciones, normalizar_pregunta, pregunta_suelta
+
+# La misma pregunta escrita de otra forma: tienen que compartir entrada
+PARAFRASEADAS = [
+    ("¿Cuál es la MEJOR sens para 800 DPI?", "cual es la mejor sens para 800 dpi"),
+    ("cómo mejoro mis edits", "Como mejoro mis edits?"),
+    ("qué rotación hago en endgame", "Que rotacion hago en endgame?"),
+    ("mejor config con aim assist", "Mejor config con aim assist!!"),
+]
+
+# Cambia una palabra y cambia la respuesta: no pueden compartir entrada
+OPUESTAS = [
+    ("mejor config sin aim assist", "mejor config con aim assist"),
+    ("juego con teclado o con joystick", "juego con teclado y con joystick"),
+    ("sens para pc", "sens sin pc"),
+    ("que hago si no tengo materiales", "que hago si tengo materiales"),
+    ("conviene jugar con mouse", "conviene jugar sin mouse"),
+    ("rutina para box fights", "rutina contra box fights"),
+    ("best settings with controller", "best settings without controller"),
+    ("edits o builds primero", "edits y builds primero"),
+]
+
+
+def test_normalizar():
+    assert normalizar_pregunta("¿Cuál es la MEJOR sens para 800 DPI?") == "mejor sens para 800 dpi"
+    assert normalizar_pregunta("  ¡¡Hola!!  ") == "hola"
+
+
+@pytest.mark.parametrize("a,b", PARAFRASEADAS)
+def test_parafraseadas_misma_clave(a, b):
+    assert normalizar_pregunta(a) == normalizar_pregunta(b)
+
+
+@pytest.mark.parametrize("a,b", OPUESTAS)
+def test_opuestas_claves_distintas(a, b):
+    assert normalizar_pregunta(a) != normalizar_pregunta(b)
+
+
+@pytest.mark.parametrize("fuzzy", [False, True])
+@pytest.mark.parametrize("a,b", OPUESTAS)
+def test_opuestas_no_comparten_respuesta(a, b, fuzzy):
+    for pregunta, otra in ((a, b), (b, a)):
+        cache = CacheRespuestas(fuzzy=fuzzy, umbral=0.7)
+        cache.put(pregunta, "respuesta")
+        assert cache.get(otra) is None
+
+
+@pytest.mark.parametrize("otra", [
+    "que sens uso con mouse de 400 dpi y monitor de 144 hz",
+    "que sens uso con mouse de 800 dpi y monitor de 240 hz",
+    "que sens uso con mouse de 1600 dpi y monitor de 60 hz",
+])
+def test_fuzzy_no_cambia_los_numeros(otra):
+    cache = CacheRespuestas(fuzzy=True, umbral=0.8)
+    cache.put("que sens uso con mouse de 800 dpi y monitor de 144 hz", "respuesta")
+    assert cache.get(otra) is None
+    assert cache.get("Que sens uso con mouse de 800 dpi y monitor de 144hz?") == "respuesta"
+
+
+def test_fuzzy_encuentra_la_casi_igual():
+    cache = CacheRespuestas(fuzzy=True)
+    cache.put("decime una rutina de aim de 30 minutos", "respuesta")
+    assert cache.get("rutina de aim de 30 minutos") == "respuesta"
+
+
+@pytest.mark.parametrize("texto,suelta", [
+    ("cual es la mejor sens para 800 dpi", True),
+    ("y con 400 dpi?", False),
+    ("eso sirve en consola?", False),
+    ("gracias", False),
+    ("que sens me recomendas?", False),
+    ("cual es mi mejor sens", False),
+])
+def test_pregunta_suelta(texto, suelta):
+    assert pregunta_suelta(texto) is suelta
+
+
+@pytest.mark.parametrize("fuzzy", [False, True])
+def test_datos_del_jugador_no_reciben_la_respuesta_de_otro(fuzzy):
+    # Lo que hace handle_message: contexto_cache decide y va en la clave
+    cache = CacheRespuestas(fuzzy=fuzzy)
+    memoria = MemoriaConversaciones()
+
+    # Otro usuario, en su primer mensaje, llena la cache
+    for pregunta in ("que sens me recomendas?", "mejor sens para box fights"):
+        contexto = memoria.contexto_cache(1, pregunta)
+        assert contexto == ""
+        cache.put(pregunta, "respuesta genérica", contexto)
+    memoria.agregar(1, "que sens me recomendas?", "respuesta genérica")
+
+    memoria.agregar(2, "tengo un mouse de 800 dpi y juego en pc", "Anotado.")
+    # Pregunta sobre sí mismo: a la IA, con su historial
+    assert memoria.contexto_cache(2, "que sens me recomendas?") is None
+    # Se entiende sola, pero la respuesta tiene que ser para sus datos
+    contexto = memoria.contexto_cache(2, "mejor sens para box fights")
+    assert contexto == "dpi=800 plataforma=pc"
+    assert cache.get("mejor sens para box fights", contexto) is None
+    cache.put("mejor sens para box fights", "para 800 dpi en pc", contexto)
+    assert cache.get("mejor sens para box fights", contexto) == "para 800 dpi en pc"
+    assert cache.get("mejor sens para box fights", "") == "respuesta genérica"
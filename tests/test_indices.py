@@ -0,0 +1,115 @@
+from indices import IndicePremium, fecha_a_epoch
+
+DIA = 86400
+EXP = fecha_a_epoch("2030-01-10")
+
+
+def _indice(premium, ahora=EXP - 10 * DIA):
+    idx = IndicePremium(aviso_segundos=3 * DIA)
+    idx.cargar(premium, ahora=ahora)
+    return idx
+
+
+def _entry(fecha="2030-01-10", plan="Standard", lifetime=False):
+    return {"lifetime": lifetime, "exp": fecha, "plan": plan}
+
+
+def test_es_premium_y_plus():
+    idx = _indice({
+        "1": _entry(),
+        "2": _entry(plan="plus"),
+        "3": _entry(fecha=None, lifetime=True),
+        "4": "2030-01-20",
+        "5": _entry(fecha="2029-01-01"),
+    })
+    assert idx.es_premium(1, EXP - DIA) and not idx.es_plus(1)
+    assert idx.es_premium(2, EXP - DIA) and idx.es_plus(2)
+    # Vence a las 00:00 del día de exp
+    assert idx.es_premium(1, EXP) and not idx.es_premium(1, EXP + 1)
+    assert idx.es_premium(3, EXP + 365 * DIA)
+    # Formato viejo: sólo la fecha
+    assert idx.es_premium(4, EXP + DIA)
+    assert not idx.es_premium(5, EXP - DIA)
+    assert not idx.es_premium(99, EXP - DIA)
+
+
+def test_aviso_y_vencimiento_salen_una_sola_vez():
+    idx = _indice({"1": _entry()})
+    assert idx.procesar(EXP - 5 * DIA) == ([], [])
+    assert idx.procesar(EXP - 2 * DIA) == ([1], [])
+    assert idx.procesar(EXP - 1 * DIA) == ([], [])
+    assert idx.procesar(EXP + 1) == ([], [1])
+    assert idx.procesar(EXP + DIA) == ([], [])
+
+
+def test_refrescar_no_se_come_los_avisos():
+    # /stats llama a refrescar() entre dos corridas del job
+    idx = _indice({"1": _entry(), "2": _entry(plan="plus")})
+    idx.refrescar(EXP - 2 * DIA)
+    idx.refrescar(EXP + 1)
+    assert idx.total_standard == 0 and idx.total_plus == 0
+    a_avisar, vencidos = idx.procesar(EXP + 2)
+    assert sorted(vencidos) == [1, 2]
+    # El aviso previo llegó tarde (ya venció): no se manda
+    assert a_avisar == []
+
+
+def test_refrescar_antes_del_aviso_lo_deja_pendiente():
+    idx = _indice({"1": _entry()})
+    idx.refrescar(EXP - 2 * DIA)
+    assert idx.procesar(EXP - 2 * DIA + 60) == ([1], [])
+
+
+def test_cargar_no_se_come_lo_pendiente():
+    # guardar_premium() recarga todo entre dos corridas del job
+    premium = {"1": _entry(), "2": _entry(), "3": _entry("2030-01-20")}
+    idx = _indice(premium)
+    idx.cargar(premium, ahora=EXP - 2 * DIA)
+    assert sorted(idx.procesar(EXP - 2 * DIA + 60)[0]) == [1, 2]
+    # El 1 y el 2 vencen entre dos cargar(); el 2 renueva en la segunda
+    idx.cargar(premium, ahora=EXP - DIA)
+    idx.cargar(dict(premium, **{"2": _entry("2030-02-10")}), ahora=EXP + 1)
+    assert idx.total_standard == 2
+    assert idx.procesar(EXP + 2) == ([], [1])
+
+
+def test_renovacion_mientras_espera_no_avisa():
+    idx = _indice({"1": _entry()})
+    idx.refrescar(EXP + 1)
+    assert idx.total_standard == 0
+    idx.actualizar(1, _entry("2030-02-10"), ahora=EXP + 2)
+    assert idx.total_standard == 1
+    assert idx.procesar(EXP + 3) == ([], [])
+    assert idx.es_premium(1, EXP + 3)
+
+
+def test_contadores_y_activos():
+    idx = _indice({
+        "1": _entry(),
+        "2": _entry(plan="plus"),
+        "3": _entry(fecha=None, lifetime=True),
+        "4": _entry(fecha="2029-01-01"),
+        "5": "2030-01-20",
+    })
+    assert (idx.total_standard, idx.total_plus, idx.total_life) == (3, 1, 1)
+    assert sorted(idx.activos(EXP - DIA)) == [1, 2, 3, 5]
+    # activos() sólo lee: filtra los vencidos sin tocar contadores ni avisos
+    assert sorted(idx.activos(EXP + 1)) == [3, 5]
+    assert idx.total_standard == 3
+    assert idx.procesar(EXP + 1) == ([], [1, 2])
+    assert (idx.total_standard, idx.total_plus, idx.total_life) == (2, 0, 1)
+
+
+def test_de_por_vida_no_vence():
+    idx = _indice({"3": _entry(fecha=None, lifetime=True)})
+    assert idx.procesar(EXP + 365 * DIA) == ([], [])
+    assert idx.es_premium(3, EXP + 365 * DIA)
+
+
+def test_sincronizar_conserva_lo_pendiente():
+    idx = _indice({"1": _entry(), "2": _entry()})
+    idx.refrescar(EXP - 2 * DIA)
+    # Otro worker cambió sólo al 2: el aviso del 1 sigue en pie
+    cambios = idx.sincronizar({"1": _entry(), "2": _entry("2030-03-01")}, ahora=EXP - 2 * DIA)
+    assert cambios == 1
+    assert idx.procesar(EXP - 2 * DIA) == ([1], [])
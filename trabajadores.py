@@ -0,0 +1,181 @@
+import os
+import queue
+import signal
+import asyncio
+import multiprocessing as mp
+
+from dotenv import load_dotenv
+from telegram import Bot, Update
+from telegram.error import NetworkError, RetryAfter
+
+from almacenamiento import importar_si_falta
+
+# ==========================
+#   POOL DE WORKERS
+# ==========================
+#
+#   python trabajadores.py
+#   BOT_MODE=pool python bot.py     (lo mismo, desde la entrada del Procfile)
+#
+# Un supervisor trae los updates de Telegram una sola vez (getUpdates) y los
+# reparte entre BOT_WORKERS procesos que corren el bot (bot.correr_trabajador).
+# Cada chat cae siempre en el mismo worker, así sus mensajes se procesan en
+# orden. Los workers comparten el estado por SQLite (STORAGE_BACKEND=sqlite):
+# con los .json cada proceso pisaría lo que escribió el otro.
+
+load_dotenv()
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+DB_FILE = os.getenv("DB_FILE", "bot.db")
+# Procesos que atienden updates (por defecto uno por núcleo)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", str(os.cpu_count() or 1)))
+# Updates esperando por worker antes de que el supervisor frene (backpressure)
+WORKER_QUEUE_MAX = int(os.getenv("WORKER_QUEUE_MAX", "1000"))
+# Segundos de long polling de getUpdates
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", "30"))
+
+
+def worker_de(chat_id: int, n: int) -> int:
+    """
+    Jump consistent hash (Lamping y Veach): reparte parejo y, si cambia la
+    cantidad de workers de n a n+1, sólo se mueven ~1/(n+1) de los chats.
+    """
+    key = chat_id & 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < n:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def chat_de(update: Update) -> int:
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return 0
+
+
+def _proceso_trabajador(indice: int, cola):
+    # El supervisor decide cuándo se termina (manda None por la cola)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # Antes de importar bot: define los archivos propios de este worker
+    os.environ["BOT_WORKER"] = str(indice)
+    import bot
+
+    asyncio.run(bot.correr_trabajador(indice, cola))
+
+
+class Supervisor:
+    def __init__(self, n_workers: int, queue_max: int = WORKER_QUEUE_MAX):
+        self.n = n_workers
+        self._ctx = mp.get_context("spawn")
+        self.colas = [self._ctx.Queue(maxsize=queue_max) for _ in range(n_workers)]
+        self.procesos = [None] * n_workers
+        self.repartidos = [0] * n_workers
+        self.reinicios = 0
+
+    def _lanzar(self, i: int):
+        p = self._ctx.Process(
+            target=_proceso_trabajador,
+            args=(i, self.colas[i]),
+            name=f"bot-worker-{i}",
+        )
+        p.start()
+        self.procesos[i] = p
+
+    def arrancar(self):
+        for i in range(self.n):
+            self._lanzar(i)
+
+    def revisar(self):
+        """Relanza los workers que se cayeron; su cola sigue intacta."""
+        for i, p in enumerate(self.procesos):
+            if p is not None and not p.is_alive():
+                print(f"⚠️ worker {i} terminó (exit {p.exitcode}), relanzando")
+                self.reinicios += 1
+                # Retoma las difusiones que él mismo dejó cortadas
+                self._lanzar(i)
+
+    async def repartir(self, update: Update):
+        i = worker_de(chat_de(update), self.n)
+        data = update.to_dict()
+        try:
+            self.colas[i].put_nowait(data)
+        except queue.Full:
+            # Worker atrasado: esperar lugar sin bloquear el loop
+            await asyncio.get_running_loop().run_in_executor(None, self.colas[i].put, data)
+        self.repartidos[i] += 1
+
+    def detener(self, espera: float = 30):
+        for cola in self.colas:
+            cola.put(None)
+        for p in self.procesos:
+            p.join(espera)
+            if p.is_alive():
+                p.terminate()
+
+
+async def correr_supervisor(n_workers: int = BOT_WORKERS):
+    if n_workers > 1 and STORAGE_BACKEND != "sqlite":
+        raise SystemExit("Con BOT_WORKERS > 1 hace falta STORAGE_BACKEND=sqlite")
+    if STORAGE_BACKEND == "sqlite":
+        # Antes de lanzar los workers: si cada uno importara por su cuenta,
+        # alguno abriría la base vacía mientras otro la llena (mismos
+        # archivos que bot.py)
+        importar_si_falta(DB_FILE, "premium_users.json", "usuarios.json", "xp_users.json", "referrals.json", "entregas.json")
+
+    kwargs = {}
+    if TELEGRAM_API_URL:
+        kwargs = {"base_url": f"{TELEGRAM_API_URL}/bot", "base_file_url": f"{TELEGRAM_API_URL}/file/bot"}
+    supervisor = Supervisor(n_workers)
+    supervisor.arrancar()
+
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, parar.set)
+
+    print(f"🤖 BOT FORTNITE PREMIUM RUNNING ({n_workers} workers)...")
+    offset = None
+    async with Bot(TOKEN, **kwargs) as bot:
+        await bot.delete_webhook()
+        while not parar.is_set():
+            supervisor.revisar()
+            pedido = asyncio.ensure_future(
+                bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES)
+            )
+            espera_parar = asyncio.ensure_future(parar.wait())
+            await asyncio.wait((pedido, espera_parar), return_when=asyncio.FIRST_COMPLETED)
+            espera_parar.cancel()
+            if not pedido.done():
+                pedido.cancel()
+                break
+            try:
+                updates = pedido.result()
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except NetworkError:
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                await supervisor.repartir(update)
+                offset = update.update_id + 1
+        # Confirmar lo ya repartido para que Telegram no lo mande de nuevo
+        if offset is not None:
+            try:
+                await bot.get_updates(offset=offset, timeout=0)
+            except Exception:
+                pass
+
+    print("🛑 Deteniendo workers...")
+    await loop.run_in_executor(None, supervisor.detener)
+    print(f"Updates por worker: {supervisor.repartidos} (reinicios: {supervisor.reinicios})")
+
+
+if __name__ == "__main__":
+    asyncio.run(correr_supervisor())